@@ -2,12 +2,9 @@ import logging
 import json
 import pandas as pd
 import numpy as np
-from itertools import combinations
 import statsmodels.formula.api as smf
 from statsmodels.stats.anova import anova_lm
 from sklearn.preprocessing import StandardScaler
-from patsy import dmatrix
-from statsmodels.stats.outliers_influence import OLSInfluence
 from scipy.stats import f
 import warnings
 import base64
@@ -17,9 +14,82 @@ import requests
 import gzip
 import io
 from urllib.parse import urlparse
+from .profiling import get_column_profile, numeric_columns, has_variation
+from .sampling import SAMPLING_METHODS, design_preserving_sample, detect_factor_columns
+from .regression import (
+    MISSING_POLICIES, collinearity_diagnostics, complete_case_masks, create_rsm_terms, hierarchical_closure,
+    influence_diagnostics, kfold_cross_validation, model_term_table, press_statistics, quote_term, shared_design_fit, top_outliers
+)
+from .admission import model_parameter_count, plan_admission
+from .coalescing import request_fingerprint, single_flight
+from .ingestion import expand_sources, is_local_path, is_multi_source, load_local, load_sources
+from .categorical import (
+    CATEGORICAL_CODINGS, blocked_fit, categorical_term, categorical_term_table, is_categorical_series, type3_tests
+)
+from .bootstrap import BOOTSTRAP_METHODS, bootstrap_fits, bootstrap_logworth, percentile_interval
+from .design import generate_design
+from .optimization import factor_bounds, optimize_desirability, parse_goals
+from .prediction import predict_responses, settings_matrix
+from .incremental import append_rows, build_session_state, session_fit
+from .registry import (
+    build_model_record, column_factors, create_session, load_model, prepare_record, save_model, update_session
+)
+from .surfaces import surface_report
+from .robust import ROBUST_METHODS, robust_fit
+from .transforms import DEFAULT_LAMBDAS, MAX_LAMBDAS, boxcox_search
+from .uncoding import coded_to_uncoded, fitted_design_info
+from .model_selection import (
+    ALL_SUBSETS_MAX_PREDICTORS, MODEL_SELECTION_METHODS, HEREDITY_RULES, SUBSET_CRITERIA,
+    all_subsets_search, backward_eliminate, resolve_model_selection, screen_rsm_terms
+)
 
 warnings.filterwarnings("ignore")
 
+# "summary" replaces the per-row residual arrays with quantiles and the most extreme rows
+RESIDUAL_DETAILS = ("full", "summary")
+SUMMARY_OUTLIERS = 5
+
+# Generic predictor names used by AI Foundry and the dataset columns they may stand for, in order
+AI_FOUNDRY_COLUMNS = {
+    "Dye Concentration": ["dye1", "dye2", "dye", "concentration"],
+    "Temperature": ["Temp", "temperature", "temp"],
+    "Time": ["Time", "time", "Mix_Time", "mix_time"],
+    "pH": ["Dyeing pH", "pH", "ph"],
+    "Pressure": ["Pressure", "pressure"],
+    "Flow Rate": ["Flow", "flow_rate", "flowrate"],
+    # Pharmaceutical formulation mappings
+    "Ingredient A": ["Ingredient_A", "ingredient_a", "component_a"],
+    "Ingredient B": ["Ingredient_B", "ingredient_b", "component_b"],
+    "Mix Time": ["Mix_Time", "mix_time", "mixing_time"],
+    "Mixing Time": ["Mix_Time", "mix_time", "mixing_time"]
+}
+
+def predictor_candidates(predictors):
+    """Every column a requested predictor may match: itself and its AI Foundry aliases"""
+    return list(dict.fromkeys(c for p in predictors for c in [p] + AI_FOUNDRY_COLUMNS.get(p, [])))
+
+def map_ai_foundry_columns(pred_list, actual_columns):
+    """Map AI Foundry generic names to actual column names"""
+    mapped_predictors = []
+    
+    for pred in pred_list:
+        if pred in actual_columns:
+            # Direct match
+            mapped_predictors.append(pred)
+        elif pred in AI_FOUNDRY_COLUMNS:
+            # Try to map AI Foundry name to actual columns
+            for candidate in AI_FOUNDRY_COLUMNS[pred]:
+                if candidate in actual_columns:
+                    mapped_predictors.append(candidate)
+                    logging.info(f"Mapped '{pred}' → '{candidate}'")
+                    break
+            else:
+                logging.warning(f"Could not map AI Foundry column '{pred}' to any actual column")
+        else:
+            logging.warning(f"Unknown predictor column: {pred}")
+    
+    return mapped_predictors
+
 def validate_dataset_size(df, max_rows=5000, max_memory_mb=50):
     """
     Validate dataset size and provide recommendations
@@ -48,69 +118,63 @@ def validate_dataset_size(df, max_rows=5000, max_memory_mb=50):
         "memory_mb": round(memory_usage, 2)
     }
 
-def smart_sample_large_dataset(df, max_rows=1000, preserve_structure=True):
+def smart_sample_large_dataset(df, max_rows=1000, preserve_structure=True, factor_cols=None,
+                               method="design", random_state=42, return_info=False):
     """
     Intelligently sample large datasets while preserving DOE structure
+    
+    Every distinct factor setting is kept and replicates are allocated per
+    setting ("design": proportionally, "d_optimal": to maximize det(X'X) of the
+    RSM model matrix). factor_cols defaults to the categorical and
+    low-cardinality numeric columns. With return_info, also returns the method
+    used and the D-efficiency kept, for sampling_info.
     """
     if len(df) <= max_rows:
-        return df, False
+        return (df, False, None) if return_info else (df, False)
     
     logging.info(f"Sampling large dataset: {len(df)} rows -> {max_rows} rows")
     
-    if preserve_structure:
-        # For DOE data, try to preserve experimental design structure
-        try:
-            # Identify potential factor columns (categorical or low-cardinality numeric)
-            factor_cols = []
-            for col in df.columns:
-                if df[col].dtype == 'object' or df[col].dtype.name == 'category':
-                    factor_cols.append(col)
-                elif df[col].dtype in ['int64', 'float64'] and df[col].nunique() <= 20:
-                    # Likely discrete factor levels
-                    factor_cols.append(col)
-            
-            if factor_cols and len(factor_cols) <= 6:  # Reasonable number of factors
-                # Group by factor combinations and sample proportionally
-                groups = df.groupby(factor_cols)
-                n_groups = groups.ngroups
-                
-                if n_groups > 0 and n_groups <= max_rows:
-                    samples_per_group = max(1, max_rows // n_groups)
-                    sampled_df = groups.apply(
-                        lambda x: x.sample(min(len(x), samples_per_group), random_state=42)
-                    ).reset_index(drop=True)
-                    
-                    if len(sampled_df) <= max_rows * 1.2:  # Allow 20% over-sampling
-                        return sampled_df, True
-        except Exception as e:
-            logging.warning(f"Structured sampling failed: {e}")
+    if not preserve_structure:
+        method = "random"
+    if factor_cols is None:
+        factor_cols = detect_factor_columns(get_column_profile(df))
     
-    # Fallback: stratified random sampling
     try:
-        # Try to stratify by response variables if they exist
-        response_candidates = [col for col in df.columns if 'response' in col.lower() or 'yield' in col.lower() or 'quality' in col.lower()]
-        if response_candidates:
-            # Create quartiles for stratification
-            stratify_col = response_candidates[0]
-            df['_quartile'] = pd.qcut(df[stratify_col], q=4, labels=['Q1', 'Q2', 'Q3', 'Q4'], duplicates='drop')
-            sampled_df = df.groupby('_quartile').apply(
-                lambda x: x.sample(min(len(x), max_rows // 4), random_state=42)
-            ).reset_index(drop=True).drop('_quartile', axis=1)
-            
-            if len(sampled_df) > 0:
-                return sampled_df, True
+        if not factor_cols:
+            method = "random"
+            factor_cols = []
+        if method == "random":
+            keep = np.sort(np.random.default_rng(random_state).choice(len(df), size=max_rows, replace=False))
+            info = {"sampling_method": "random", "factor_columns": factor_cols, "d_efficiency": None}
+        else:
+            keep, info = design_preserving_sample(df, factor_cols, max_rows, method=method, random_state=random_state)
     except Exception as e:
-        logging.warning(f"Stratified sampling failed: {e}")
+        logging.warning(f"Structured sampling failed: {e}")
+        keep = np.sort(np.random.default_rng(random_state).choice(len(df), size=max_rows, replace=False))
+        info = {"sampling_method": "random", "factor_columns": list(factor_cols), "d_efficiency": None}
     
-    # Final fallback: simple random sampling
-    sampled_df = df.sample(n=min(max_rows, len(df)), random_state=42)
-    return sampled_df, True
+    sampled_df = df.iloc[keep].reset_index(drop=True)
+    return (sampled_df, True, info) if return_info else (sampled_df, True)
 
-def get_data_from_source(data_input, max_file_size_mb=10):
+def get_data_from_source(data_input, max_file_size_mb=10, required_columns=(), return_info=False, columns=None):
     """
     Enhanced data loading with support for multiple sources and formats
-    Handles: URLs, base64, raw CSV text, and various file formats
+    Handles: URLs, base64, raw CSV text, local files and various file formats
+    A list of URLs or a brace pattern ("batch_{1..4}.csv") is fetched
+    concurrently and concatenated on a common schema; required_columns must
+    then agree across the sources. An absolute path or file:// URL under one
+    of the DOE_DATA_ROOTS directories is read in place (memory-mapped where
+    the format allows) keeping only the given columns; max_file_size_mb does
+    not apply to it. return_info adds the ingestion details.
     """
+    if is_local_path(data_input):
+        df, info = load_local(data_input, columns)
+        return (df, info) if return_info else df
+    if is_multi_source(data_input):
+        df, info = load_sources(expand_sources(data_input), required_columns, max_file_size_mb)
+        return (df, info) if return_info else df
+    if return_info:
+        return get_data_from_source(data_input, max_file_size_mb), None
     try:
         # Check if input is a URL
         if data_input.startswith('http'):
@@ -203,7 +267,119 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         "threshold": 1.3,
         "min_significant": 2,
         "max_rows": 1000,
-        "force_full_dataset": false
+        "force_full_dataset": false,
+        "sampling_method": "design" | "d_optimal" | "random"
+    }
+    
+    "data" may also list several URLs, or use a brace pattern such as
+    "https://host/runs/day_{01..07}.parquet"; the files are fetched
+    concurrently and concatenated on their common columns. A path such as
+    "/mnt/doe/history.parquet" (CSV, Parquet, Arrow IPC or structured .npy)
+    under one of the DOE_DATA_ROOTS directories is read in place, keeping
+    only the response and predictor columns.
+    
+    Optional model selection (both formats):
+    {
+        "model_selection": "auto" | "threshold" | "screening" | "stepwise" | "all_subsets",
+        "max_terms": 12,
+        "heredity": "weak" | "strong",
+        "criterion": "aicc" | "bic" | "adj_r2",
+        "top_models": 10
+    }
+    
+    Optional categorical factors (both formats); non-numeric predictors are
+    always categorical, categorical_factors also marks numeric codes as such:
+    {
+        "categorical_factors": ["Part", "Config 2"],
+        "categorical_coding": "effect" | "reference"
+    }
+    
+    Optional diagnostics (both formats):
+    {
+        "outlier_top_k": 5,
+        "cv_folds": 5,
+        "box_cox": true or {"lambdas": [-2, -1.5, ..., 2]},
+        "robust": "huber" | "tukey",
+        "residual_detail": "full" | "summary",
+        "missing": "shared" | "per_response"
+    }
+    
+    Rows missing a predictor are always dropped; rows missing a response are
+    dropped for every response ("shared", the default) or only for that
+    response ("per_response"). summary.missing_data reports the counts.
+    
+    Every analysis is costed before fitting against DOE_MAX_SECONDS,
+    DOE_MAX_MEMORY_MB and DOE_MAX_PAYLOAD_MB. Requests over budget are
+    downgraded (summary residuals, collapsed replicates, fewer screened terms)
+    or, with "allow_downgrade": false or when nothing fits, rejected with a
+    400 explaining which budget is exceeded; data_info.admission records the plan.
+    Identical analyses arriving while one is running wait for it and share its
+    response (marked with the X-DOE-Coalesced header).
+    
+    Optional bootstrap intervals (both formats):
+    {
+        "bootstrap": "case" | "residual",
+        "bootstrap_replicates": 1000,
+        "bootstrap_seed": 0,
+        "confidence_level": 0.95
+    }
+    
+    Every analysis registers its simplified model and returns summary.model_id
+    (disable with "register_model": false). Predict from a registered model
+    without the data:
+    {
+        "operation": "predict",
+        "model_id": "3f2a...",
+        "settings": [{"dye1": 0.3, "dye2": 0.05, "Time": 30, "Temp": 60}, ...],
+        "responses": ["Lvalue"],
+        "confidence_level": 0.95
+    }
+    
+    Find the factor settings with the best overall desirability:
+    {
+        "operation": "optimize",
+        "model_id": "3f2a...",
+        "goals": {
+            "Lvalue": {"goal": "target", "target": 86, "lower": 85, "upper": 87},
+            "Avalue": {"goal": "minimize", "upper": 1.5, "importance": 2}
+        },
+        "factor_ranges": {"Temp": [50, 70]},
+        "starts": 32,
+        "seed": 0
+    }
+    
+    Prediction-profiler traces and contour grids of a registered model (the
+    same options as "surfaces" in an analysis request):
+    {
+        "operation": "profile",
+        "model_id": "3f2a...",
+        "pairs": [["dye1", "Temp"]],
+        "hold": {"Time": 30},
+        "resolution": 25
+    }
+    
+    D- or I-optimal design for the next experiment (no data needed):
+    {
+        "operation": "design",
+        "factors": {"dye1": [0.2, 0.3], "dye2": [0.03, 0.05], "Time": [5, 9], "Temp": [14, 16]},
+        "runs": 20,
+        "criterion": "D" | "I",
+        "model": "rsm" | "linear" | "quadratic",
+        "existing_runs": [{"dye1": 0.25, "dye2": 0.04, "Time": 7, "Temp": 15}],
+        "levels": 3,
+        "starts": 8,
+        "time_budget": 5
+    }
+    
+    Registered analyses with "open_session": true also return
+    summary.session_id. Append new runs to that session to update the model
+    without resending the earlier data ("data" as in an analysis request, or
+    "rows" as a list of records); sessions idle for DOE_SESSION_TTL_HOURS
+    (default 168) are deleted:
+    {
+        "operation": "append",
+        "session_id": "9c1d...",
+        "rows": [{"dye1": 0.3, "dye2": 0.05, "Time": 30, "Temp": 60, "Lvalue": 81.2, ...}]
     }
     """
     
@@ -223,49 +399,226 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         logging.info(f"Request body keys: {list(req_body.keys())}")
         logging.info(f"Request size: {len(str(req_body))} characters")
         
-        # Extract parameters with flexible format support
-        data_input = req_body.get('data')
-        
-        # Support both new simplified format and legacy format
-        if 'response_column' in req_body:
-            # New simplified format (for AI Foundry)
-            response_column = req_body.get('response_column', 'DE*cmc')
-            # Handle multiple response variables in comma-separated format
-            if ',' in response_column:
-                response_vars = [col.strip() for col in response_column.split(',')]
-            else:
-                response_vars = [response_column]
-            # Use auto-detection if no predictors specified
-            predictors = req_body.get('predictors', None)  # Changed to None for auto-detection
-            threshold = req_body.get('threshold', 1.3)
-            min_significant = req_body.get('min_significant', 1)
-            max_rows = req_body.get('max_samples', req_body.get('max_rows', 1000))
-            force_full = req_body.get('force_full_dataset', False)
-        else:
-            # Legacy format (backward compatibility)
-            response_vars = req_body.get('response_vars', ["Lvalue", "Avalue", "Bvalue"])
-            predictors = req_body.get('predictors', ["dye1", "dye2", "Time", "Temp"])
-            threshold = req_body.get('threshold', 1.3)
-            min_significant = req_body.get('min_significant', 2)
-            max_rows = req_body.get('max_rows', 1000)
-            force_full = req_body.get('force_full_dataset', False)
-        
-        if not data_input:
-            logging.error("No data provided in request")
+        operation = req_body.get('operation', 'analyze')
+        if operation == 'predict':
+            return handle_predict(req_body)
+        if operation == 'optimize':
+            return handle_optimize(req_body)
+        if operation == 'profile':
+            return handle_profile(req_body)
+        if operation == 'design':
+            return handle_design(req_body)
+        if operation == 'append':
+            return handle_append(req_body)
+        if operation != 'analyze':
             return func.HttpResponse(
-                json.dumps({"error": "No data provided. Please include 'data' field with CSV content, URL, or base64 data."}),
+                json.dumps({"error": f"Unknown operation '{operation}'. Use 'analyze', 'predict', 'optimize', 'profile', 'design' or 'append'."}),
                 status_code=400,
                 mimetype="application/json"
             )
         
-        logging.info(f"Data input type: {'URL' if data_input.startswith('http') else 'CSV/Base64'}")
-        logging.info(f"Data input size: {len(data_input)} characters")
+        return handle_analyze(req_body)
+        
+    except Exception as e:
+        logging.error(f"Error in DOE analysis: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": f"Internal server error: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json"
+        )
+
+def handle_analyze(req_body):
+    """
+    Parse and validate an analysis request, then run it once per set of identical requests
+    
+    Concurrent requests with the same fingerprint (data source, responses,
+    predictors and every option after defaults) share one computation.
+    """
+    # Extract parameters with flexible format support
+    data_input = req_body.get('data')
+    
+    # Support both new simplified format and legacy format
+    if 'response_column' in req_body:
+        # New simplified format (for AI Foundry)
+        response_column = req_body.get('response_column', 'DE*cmc')
+        # Handle multiple response variables in comma-separated format
+        if ',' in response_column:
+            response_vars = [col.strip() for col in response_column.split(',')]
+        else:
+            response_vars = [response_column]
+        # Use auto-detection if no predictors specified
+        predictors = req_body.get('predictors', None)  # Changed to None for auto-detection
+        threshold = req_body.get('threshold', 1.3)
+        min_significant = req_body.get('min_significant', 1)
+        max_rows = req_body.get('max_samples', req_body.get('max_rows', 1000))
+        force_full = req_body.get('force_full_dataset', False)
+    else:
+        # Legacy format (backward compatibility)
+        response_vars = req_body.get('response_vars', ["Lvalue", "Avalue", "Bvalue"])
+        predictors = req_body.get('predictors', ["dye1", "dye2", "Time", "Temp"])
+        threshold = req_body.get('threshold', 1.3)
+        min_significant = req_body.get('min_significant', 2)
+        max_rows = req_body.get('max_rows', 1000)
+        force_full = req_body.get('force_full_dataset', False)
+    
+    # Model selection options (shared by both formats)
+    model_selection = req_body.get('model_selection', 'auto')
+    max_terms = req_body.get('max_terms')
+    heredity = req_body.get('heredity', 'weak')
+    criterion = req_body.get('criterion', 'aicc')
+    top_models = req_body.get('top_models', 10)
+    outlier_top_k = req_body.get('outlier_top_k')
+    cv_folds = req_body.get('cv_folds')
+    bootstrap = req_body.get('bootstrap')
+    bootstrap_replicates = req_body.get('bootstrap_replicates', 1000)
+    bootstrap_seed = req_body.get('bootstrap_seed', 0)
+    confidence_level = req_body.get('confidence_level', 0.95)
+    register_model = req_body.get('register_model', True)
+    open_session = bool(req_body.get('open_session', False))
+    sampling_method = req_body.get('sampling_method', 'design')
+    categorical_factors = req_body.get('categorical_factors')
+    categorical_coding = req_body.get('categorical_coding', 'effect')
+    surfaces = req_body.get('surfaces')
+    box_cox = req_body.get('box_cox')
+    robust = req_body.get('robust')
+    residual_detail = req_body.get('residual_detail', 'full')
+    allow_downgrade = req_body.get('allow_downgrade', True)
+    missing = req_body.get('missing', 'shared')
+    
+    if model_selection not in MODEL_SELECTION_METHODS or heredity not in HEREDITY_RULES or criterion not in SUBSET_CRITERIA:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid model selection options. 'model_selection' must be one of {list(MODEL_SELECTION_METHODS)}, 'heredity' one of {list(HEREDITY_RULES)} and 'criterion' one of {list(SUBSET_CRITERIA)}."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if sampling_method not in SAMPLING_METHODS:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid 'sampling_method'. Must be one of {list(SAMPLING_METHODS)}."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if categorical_coding not in CATEGORICAL_CODINGS or not (
+        categorical_factors is None
+        or (isinstance(categorical_factors, list) and all(isinstance(c, str) for c in categorical_factors))
+    ):
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid categorical options. 'categorical_coding' must be one of {list(CATEGORICAL_CODINGS)} and 'categorical_factors' a list of column names."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    lambdas = box_cox.get('lambdas', DEFAULT_LAMBDAS) if isinstance(box_cox, dict) else DEFAULT_LAMBDAS
+    if not (box_cox is None or isinstance(box_cox, (bool, dict))) or not (
+        isinstance(lambdas, (list, tuple)) and 3 <= len(lambdas) <= MAX_LAMBDAS
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in lambdas)
+    ):
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid 'box_cox'. Use true or {{\"lambdas\": [...]}} with 3 to {MAX_LAMBDAS} numbers."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if residual_detail not in RESIDUAL_DETAILS:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid 'residual_detail'. Must be one of {list(RESIDUAL_DETAILS)}."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if missing not in MISSING_POLICIES:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid 'missing'. Must be one of {list(MISSING_POLICIES)}."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if robust is not None and robust not in ROBUST_METHODS:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid 'robust'. Must be one of {list(ROBUST_METHODS)}."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if bootstrap is not None and (
+        bootstrap not in BOOTSTRAP_METHODS
+        or not isinstance(bootstrap_replicates, int) or bootstrap_replicates < 10
+        or not 0 < float(confidence_level) < 1
+    ):
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid bootstrap options. 'bootstrap' must be one of {list(BOOTSTRAP_METHODS)}, 'bootstrap_replicates' an integer of at least 10 and 'confidence_level' between 0 and 1."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if not data_input:
+        logging.error("No data provided in request")
+        return func.HttpResponse(
+            json.dumps({"error": "No data provided. Please include 'data' field with CSV content, URL, or base64 data."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    if not isinstance(data_input, str) and not (
+        isinstance(data_input, list) and all(isinstance(source, str) for source in data_input)
+    ):
+        return func.HttpResponse(
+            json.dumps({"error": "'data' must be CSV text, base64, a URL, or a list of URLs."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    params = dict(
+        data_input=data_input, response_vars=response_vars, predictors=predictors, threshold=threshold,
+        min_significant=min_significant, max_rows=max_rows, force_full=force_full,
+        model_selection=model_selection, max_terms=max_terms, heredity=heredity, criterion=criterion,
+        top_models=top_models, outlier_top_k=outlier_top_k, cv_folds=cv_folds, bootstrap=bootstrap,
+        bootstrap_replicates=bootstrap_replicates, bootstrap_seed=bootstrap_seed,
+        confidence_level=confidence_level, register_model=register_model, open_session=open_session,
+        sampling_method=sampling_method,
+        categorical_factors=categorical_factors, categorical_coding=categorical_coding, surfaces=surfaces,
+        box_cox=box_cox, robust=robust, residual_detail=residual_detail, allow_downgrade=allow_downgrade,
+        missing=missing
+    )
+    response, shared = single_flight(request_fingerprint(params), lambda: run_analysis(**params))
+    if not shared:
+        return response
+    # Every waiting caller gets its own copy of the shared response
+    return func.HttpResponse(
+        response.get_body(),
+        status_code=response.status_code,
+        mimetype=response.mimetype,
+        headers={"X-DOE-Coalesced": "true"}
+    )
+
+def run_analysis(data_input, response_vars, predictors, threshold, min_significant, max_rows, force_full,
+                 model_selection, max_terms, heredity, criterion, top_models, outlier_top_k, cv_folds,
+                 bootstrap, bootstrap_replicates, bootstrap_seed, confidence_level, register_model,
+                 open_session, sampling_method, categorical_factors, categorical_coding, surfaces, box_cox, robust,
+                 residual_detail, allow_downgrade, missing):
+    """Load, sample, cost and analyze the data of one validated analysis request"""
+    try:
+        if is_multi_source(data_input):
+            logging.info(f"Data input type: multiple URLs ({data_input})")
+        else:
+            logging.info(f"Data input type: {'URL' if data_input.startswith('http') else 'file' if is_local_path(data_input) else 'CSV/Base64'}")
+            logging.info(f"Data input size: {len(data_input)} characters")
         logging.info(f"Response vars: {response_vars}")
         logging.info(f"Predictors: {predictors}")
         
-        # Load data with enhanced error handling
+        # Load data with enhanced error handling; local files are read projected to the columns
+        # the request can use (responses, predictors and their aliases, categorical factors)
+        candidates = predictor_candidates(predictors or [])
+        projection = list(dict.fromkeys(list(response_vars) + candidates + list(categorical_factors or [])))
         try:
-            df_raw = get_data_from_source(data_input)
+            df_raw, ingestion_info = get_data_from_source(
+                data_input, required_columns=list(response_vars) + list(predictors or []), return_info=True,
+                columns=projection if predictors else None
+            )
+            if predictors and is_local_path(data_input) and not any(c in df_raw.columns for c in candidates):
+                # No requested predictor is in the file: read every column for auto-detection
+                df_raw, ingestion_info = get_data_from_source(data_input, return_info=True)
             logging.info(f"Successfully loaded data: {len(df_raw)} rows, {len(df_raw.columns)} columns")
         except ValueError as e:
             return func.HttpResponse(
@@ -289,24 +642,32 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         sampling_info = {}
         
         if not force_full and len(df_raw) > max_rows:
-            df_analysis, was_sampled = smart_sample_large_dataset(df_raw, max_rows)
+            # Sample on the requested predictors (AI Foundry names resolved as for the analysis) when
+            # any match, else on the detected factor columns
+            factor_cols = map_ai_foundry_columns(predictors, df_raw.columns) if predictors else None
+            if not factor_cols:
+                factor_cols = detect_factor_columns(get_column_profile(df_raw), exclude=response_vars)
+            df_analysis, was_sampled, method_info = smart_sample_large_dataset(
+                df_raw, max_rows, factor_cols=factor_cols, method=sampling_method, return_info=True
+            )
             sampling_info = {
                 "original_rows": len(df_raw),
                 "sampled_rows": len(df_analysis),
-                "sampling_method": "intelligent_sampling",
+                **method_info,
                 "note": "Large dataset detected. Using representative sample for analysis."
             }
             logging.info(f"Applied sampling: {len(df_raw)} -> {len(df_analysis)} rows")
         else:
             df_analysis = df_raw
+        
+        # Profile the analysis frame once; all cardinality and dtype checks below read from it
+        profile = get_column_profile(df_analysis)
+        
         # Auto-detect available predictors from the data if not specified
         if predictors is None:
             # Auto-detect all potential predictors (exclude response variables)
             # Prioritize known experimental factors over measurement columns
-            all_numeric_cols = [col for col in df_analysis.columns 
-                              if df_analysis[col].dtype in ['int64', 'float64'] 
-                              and col not in response_vars 
-                              and df_analysis[col].nunique() > 1]
+            all_numeric_cols = numeric_columns(profile, exclude=response_vars)
             
             # Define exact process factor names for textile datasets
             textile_factors = ['dye1', 'dye2', 'Temp', 'Time']
@@ -345,46 +706,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             available_predictors = [col for col in df_analysis.columns if col in predictors]
             if not available_predictors:
                 # Fallback: try to identify numeric columns that could be predictors (exclude response variables)
-                available_predictors = [col for col in df_analysis.columns 
-                                      if df_analysis[col].dtype in ['int64', 'float64'] 
-                                      and col not in response_vars 
-                                      and df_analysis[col].nunique() > 1][:8]  # Increased limit for pharma data
-        
-        # Auto-map common AI Foundry column names to actual column names
-        def map_ai_foundry_columns(pred_list, actual_columns):
-            """Map AI Foundry generic names to actual column names"""
-            mapped_predictors = []
-            column_mapping = {
-                "Dye Concentration": ["dye1", "dye2", "dye", "concentration"],
-                "Temperature": ["Temp", "temperature", "temp"],
-                "Time": ["Time", "time", "Mix_Time", "mix_time"],
-                "pH": ["Dyeing pH", "pH", "ph"],
-                "Pressure": ["Pressure", "pressure"],
-                "Flow Rate": ["Flow", "flow_rate", "flowrate"],
-                # Pharmaceutical formulation mappings
-                "Ingredient A": ["Ingredient_A", "ingredient_a", "component_a"],
-                "Ingredient B": ["Ingredient_B", "ingredient_b", "component_b"],
-                "Mix Time": ["Mix_Time", "mix_time", "mixing_time"],
-                "Mixing Time": ["Mix_Time", "mix_time", "mixing_time"]
-            }
-            
-            for pred in pred_list:
-                if pred in actual_columns:
-                    # Direct match
-                    mapped_predictors.append(pred)
-                elif pred in column_mapping:
-                    # Try to map AI Foundry name to actual columns
-                    for candidate in column_mapping[pred]:
-                        if candidate in actual_columns:
-                            mapped_predictors.append(candidate)
-                            logging.info(f"Mapped '{pred}' → '{candidate}'")
-                            break
-                    else:
-                        logging.warning(f"Could not map AI Foundry column '{pred}' to any actual column")
-                else:
-                    logging.warning(f"Unknown predictor column: {pred}")
-            
-            return mapped_predictors
+                available_predictors = numeric_columns(profile, exclude=response_vars)[:8]  # Increased limit for pharma data
         
         # Apply AI Foundry column mapping
         if predictors is not None:
@@ -394,19 +716,24 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             mapped_predictors = available_predictors
             logging.info(f"Auto-detected predictors: {mapped_predictors}")
         
+        # Named categorical factors are predictors even where auto-detection skips non-numeric columns
+        for col in categorical_factors or []:
+            if col in df_analysis.columns and col not in mapped_predictors and col not in response_vars:
+                mapped_predictors.append(col)
+        
         # Filter out constant predictors (no variation)
         variable_predictors = []
         for pred in mapped_predictors:
-            if pred in df_analysis.columns:
-                if df_analysis[pred].nunique() > 1:  # Has variation
+            if pred in profile:
+                if has_variation(profile, pred):
                     variable_predictors.append(pred)
                 else:
-                    logging.warning(f"Skipping constant predictor: {pred} (only {df_analysis[pred].nunique()} unique value)")
+                    logging.warning(f"Skipping constant predictor: {pred} (only {profile[pred]['nunique']} unique value)")
         
         # If no variable predictors from specified list, auto-detect from available
         if not variable_predictors:
             for pred in available_predictors:
-                if pred in df_analysis.columns and df_analysis[pred].nunique() > 1:
+                if has_variation(profile, pred):
                     variable_predictors.append(pred)
         
         final_predictors = variable_predictors
@@ -435,11 +762,61 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
+        # Admission control: estimate time, memory and payload before any model is fit
+        categorical_levels = {
+            p: profile[p]["nunique"] for p in final_predictors
+            if p in (categorical_factors or []) or is_categorical_series(df_analysis[p])
+        }
+        continuous = [p for p in final_predictors if p not in categorical_levels]
+        admission = plan_admission(
+            len(df_analysis), len(final_predictors), len(response_vars),
+            model_parameter_count(continuous, categorical_levels),
+            settings=df_analysis.groupby(final_predictors, dropna=False).ngroups,
+            bootstrap_replicates=bootstrap_replicates if bootstrap else 0,
+            residual_detail=residual_detail,
+            per_row_extras=int(robust is not None) + int(bool(box_cox)),
+            collapsible=not categorical_levels, screenable=not categorical_levels,
+            allow_downgrade=bool(allow_downgrade)
+        )
+        if admission["decision"] == "reject":
+            return func.HttpResponse(
+                json.dumps({
+                    "error": f"Request exceeds the analysis budget: {admission['reason']}.",
+                    "recommendation": "Reduce the number of predictors or responses, lower max_rows, drop bootstrap, or allow downgrades.",
+                    "admission": admission
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        options = admission["options"]
+        if options["max_terms"] is not None:
+            model_selection, max_terms = "screening", options["max_terms"]
+        
         # Perform DOE analysis
-        result = perform_doe_analysis(df_analysis, response_vars, final_predictors, threshold, min_significant)
+        if options["collapse"]:
+            result = perform_collapsed_analysis(df_analysis, response_vars, final_predictors, threshold, min_significant,
+                                                register_model=register_model, open_session=open_session)
+            if "error" in result:
+                return func.HttpResponse(
+                    json.dumps({**result, "admission": admission}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+        else:
+            result = perform_doe_analysis(df_analysis, response_vars, final_predictors, threshold, min_significant,
+                                          model_selection=model_selection, max_terms=max_terms, heredity=heredity,
+                                          criterion=criterion, top_models=top_models,
+                                          outlier_top_k=outlier_top_k, cv_folds=cv_folds,
+                                          bootstrap=bootstrap, bootstrap_replicates=bootstrap_replicates,
+                                          bootstrap_seed=bootstrap_seed, confidence_level=float(confidence_level),
+                                          register_model=register_model, open_session=open_session, surfaces=surfaces, box_cox=box_cox, robust=robust,
+                                          categorical_factors=categorical_factors, categorical_coding=categorical_coding,
+                                          residual_detail=options["residual_detail"], missing=missing)
         
         # Add metadata about data processing
         result["data_info"] = {
+            "ingestion": ingestion_info,
+            "admission": admission,
             "size_validation": size_validation,
             "was_sampled": was_sampled,
             "sampling_info": sampling_info if was_sampled else None,
@@ -463,8 +840,92 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
-def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_significant):
-    """Perform the DOE analysis and return structured results"""
+def get_simplified_factors(effect_matrix, threshold, min_significant, term_table):
+    """Significant full-model terms plus the lower-order terms they contain (see model_term_table)"""
+    factors = effect_matrix[
+        (effect_matrix["Max_LogWorth"] >= threshold) |
+        (effect_matrix["Appears_Significant"] >= min_significant)
+    ]["Factor"].tolist()
+    if "Intercept" in factors:
+        factors.remove("Intercept")
+    return sorted(hierarchical_closure(factors, term_table))
+
+def summarize_effects(effect_summary, response_vars, threshold):
+    """Add median/max LogWorth and the count of significant responses, strongest first"""
+    effect_summary = effect_summary.fillna(0)
+    effect_summary["Median_LogWorth"] = effect_summary[response_vars].median(axis=1)
+    effect_summary["Max_LogWorth"] = effect_summary[response_vars].max(axis=1)
+    effect_summary["Appears_Significant"] = (effect_summary[response_vars] > threshold).sum(axis=1)
+    return effect_summary.sort_values("Max_LogWorth", ascending=False)
+
+def residual_summary(residuals):
+    """Compact stand-in for the per-row residual arrays of a model"""
+    residuals = np.asarray(residuals, dtype=float)
+    quantiles = np.quantile(residuals, [0.05, 0.25, 0.5, 0.75, 0.95]) if residuals.size else [np.nan] * 5
+    return {
+        "count": int(residuals.size),
+        "mean_absolute": float(np.abs(residuals).mean()) if residuals.size else None,
+        "min": float(residuals.min()) if residuals.size else None,
+        "max": float(residuals.max()) if residuals.size else None,
+        "quantiles": {q: float(v) for q, v in zip(("5%", "25%", "50%", "75%", "95%"), quantiles)}
+    }
+
+def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_significant,
+                         model_selection="auto", max_terms=None, heredity="weak",
+                         criterion="aicc", top_models=10, outlier_top_k=None,
+                         cv_folds=None, bootstrap=None, bootstrap_replicates=1000,
+                         bootstrap_seed=0, confidence_level=0.95, register_model=False,
+                         open_session=False, surfaces=None, categorical_factors=None, categorical_coding="effect",
+                         box_cox=None, robust=None, residual_detail="full", missing="shared"):
+    """
+    Perform the DOE analysis and return structured results
+    
+    model_selection chooses how the full-model effects are found: "threshold"
+    fits the full RSM model per response, "screening" runs staged forward
+    screening with at most max_terms terms, "stepwise" runs hierarchical
+    backward elimination per response, "all_subsets" ranks every hierarchical
+    subset of the RSM terms by criterion (up to 6 predictors), and "auto"
+    screens when there are many predictors or the full RSM model would not fit
+    the run count.
+    
+    Influence diagnostics for every response come from one thin QR of the
+    shared simplified design matrix; outlier_top_k adds a per-response summary
+    of the most extreme rows. PRESS and predicted R-squared are read from the
+    same leverages, and cv_folds adds k-fold cross-validation by downdating
+    that factorization. bootstrap ("case" or "residual") adds percentile
+    intervals for the coded and uncoded parameters and the full-model LogWorths,
+    with every replicate solved in one batched least-squares problem.
+    register_model stores the simplified model in the model registry for
+    later predict requests and reports its id as summary.model_id; with
+    open_session it also opens an append session (summary.session_id) holding
+    the model's sufficient statistics. surfaces
+    (True or a dict of pairs/hold/resolution) adds profiler traces and contour
+    grids of the simplified model as results["surfaces"]. box_cox (True or a
+    dict with a lambda grid) adds each response's Box-Cox profile likelihood,
+    the chosen transform and back-transformed predictions, all scored from the
+    shared factorization. robust ("huber" or "tukey") adds M-estimates of
+    the simplified model by IRLS, all responses reweighted and solved together,
+    with robust LogWorths and the per-row weights next to the OLS output.
+    residual_detail "summary" replaces the per-row arrays with quantiles and
+    the most extreme rows.
+    
+    Rows with missing values are removed once, by one complete-case mask that
+    every design matrix, residual array and lack-of-fit group table reuses.
+    missing "shared" fits every response on the rows complete in all of them;
+    "per_response" fits each response on its own complete rows, and the joint
+    computations (selection, diagnostics, bootstrap, Box-Cox, robust fits)
+    attach only to responses whose rows match the shared ones. Residual
+    arrays carry the row_index of the input rows they belong to, and
+    summary.missing_data reports the dropped rows.
+    
+    Non-numeric predictors and those named in categorical_factors enter the
+    model as categorical terms with effect ("Sum") or reference ("Treatment")
+    coding, with interactions with every continuous predictor for factors of
+    at most MAX_INTERACTION_LEVELS levels. Their effects are screened from the
+    full model by Type III tests on a block-structured fit that keeps the
+    indicator columns sparse; the other selection methods need continuous
+    predictors only. Models with categorical factors are not registered.
+    """
     
     results = {
         "summary": {},
@@ -473,9 +934,10 @@ def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_signi
     }
     
     # Filter predictors to only those with variation
+    profile = get_column_profile(df_raw)
     variable_predictors = []
     for pred in predictors:
-        if pred in df_raw.columns and df_raw[pred].nunique() > 1:
+        if has_variation(profile, pred):
             variable_predictors.append(pred)
         else:
             logging.warning(f"Skipping predictor {pred}: not found or no variation")
@@ -483,128 +945,286 @@ def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_signi
     if len(variable_predictors) < 2:
         return {"error": f"Insufficient variable predictors. Found: {variable_predictors}. Need at least 2 for modeling."}
     
+    # Categorical factors are coded by contrasts instead of being standardized
+    categorical = [
+        p for p in variable_predictors
+        if p in (categorical_factors or []) or is_categorical_series(df_raw[p])
+    ]
+    continuous = [p for p in variable_predictors if p not in categorical]
+    
+    # One complete-case pass; every fit below runs on rows selected by these masks
+    try:
+        masks, shared_mask, missing_report = complete_case_masks(df_raw, variable_predictors, response_vars, missing)
+    except (ValueError, TypeError) as e:
+        return {"error": f"Response columns must be numeric: {str(e)}"}
+    if not shared_mask.any():
+        return {"error": "No rows have values for every predictor and response", "missing_data": missing_report}
+    used = np.logical_or.reduce(list(masks.values()))
+    
     # Standardize data
     scaler = StandardScaler()
-    df = df_raw.copy()
+    df = df_raw[used].copy()
     
     try:
-        df[variable_predictors] = scaler.fit_transform(df[variable_predictors])
+        if continuous:
+            df[continuous] = scaler.fit_transform(df[continuous])
     except Exception as e:
         logging.error(f"Error in data standardization: {e}")
         return {"error": f"Data standardization failed: {str(e)}"}
     
-    # Create RSM terms (simplified for limited data)
-    def create_rsm_terms(terms):
-        # Quote terms with special characters
-        quoted_terms = [f"Q('{t}')" if '*' in t or ' ' in t or '(' in t else t for t in terms]
-        
-        if len(terms) <= 4:
-            # For small number of predictors, use linear + interactions only
-            linear = quoted_terms
-            inter = [f"{a}:{b}" for a, b in combinations(quoted_terms, 2)]
-            return linear + inter
-        else:
-            # Full RSM for larger designs
-            linear = quoted_terms
-            square = [f"I({t}**2)" for t in quoted_terms]
-            inter = [f"{a}:{b}" for a, b in combinations(quoted_terms, 2)]
-            return linear + square + inter
+    # Config combination for lack of fit
+    combo = df_raw.loc[used, variable_predictors].astype(str)
+    df["Config_combo"] = combo.iloc[:, 0].str.cat(combo.iloc[:, 1:], sep="_")
     
-    rsm_terms = create_rsm_terms(variable_predictors)
+    # Frames of the shared rows and of each response's rows (the same frame under "shared")
+    shared_in_used = shared_mask[used]
+    df_shared = df if shared_in_used.all() else df[shared_in_used]
+    response_frames = {y: df_shared if masks[y] is shared_mask else df[masks[y][used]] for y in response_vars}
+    on_shared = {y: int(masks[y].sum()) == len(df_shared) for y in response_vars}
+    
+    # Create RSM terms (simplified for limited data); names are already formula-ready
+    rsm_terms = create_rsm_terms(continuous)
+    categorical_table = categorical_term_table(
+        categorical, continuous, categorical_coding, {c: profile[c]["nunique"] for c in categorical}
+    )
+    rsm_terms += list(categorical_table)
+    term_table = model_term_table(continuous, categorical_table)
+    selection_method = resolve_model_selection(model_selection, len(variable_predictors), len(rsm_terms), len(df_shared))
+    if categorical and selection_method != "threshold":
+        logging.warning("Model selection with categorical factors uses Type III full-model screening")
+        selection_method = "threshold"
+    if selection_method == "all_subsets" and len(variable_predictors) > ALL_SUBSETS_MAX_PREDICTORS:
+        logging.warning(f"All-subsets search supports at most {ALL_SUBSETS_MAX_PREDICTORS} predictors; screening instead")
+        selection_method = "screening"
+    selection_info = {"method": selection_method}
     
-    # Full model LogWorth scanning
     effect_summary_all = pd.DataFrame()
-    for y in response_vars:
+    if selection_method == "screening":
+        # Staged forward screening across all responses instead of the brute-force full RSM
         try:
-            # Use Q() to properly quote column names with special characters
-            y_quoted = f"Q('{y}')" if '*' in y or ' ' in y or '(' in y else y
-            predictor_terms = [f"Q('{term}')" if '*' in term or ' ' in term or '(' in term else term for term in rsm_terms]
-            
-            formula = f"{y_quoted} ~ " + " + ".join(predictor_terms)
-            model = smf.ols(formula, data=df).fit()
-            anova_tbl = anova_lm(model, typ=3).reset_index()
-            anova_tbl = anova_tbl.rename(columns={"index": "Factor"})
-            anova_tbl = anova_tbl[anova_tbl["Factor"] != "Residual"]
-            anova_tbl["LogWorth"] = -np.log10(anova_tbl["PR(>F)"].replace(0, 1e-16))
-            temp = anova_tbl[["Factor", "LogWorth"]].copy()
-            temp.columns = ["Factor", y]
-            effect_summary_all = pd.merge(effect_summary_all, temp, on="Factor", how="outer") if not effect_summary_all.empty else temp
+            effect_summary_all, selection_info = screen_rsm_terms(
+                df_shared, variable_predictors, response_vars, threshold, max_terms=max_terms, heredity=heredity
+            )
+        except Exception as e:
+            logging.warning(f"Error in factor screening: {str(e)}")
+    elif selection_method == "stepwise":
+        # Backward elimination from the RSM model, or from the screened model when the RSM model can't be fit
+        try:
+            start_terms = None
+            if len(rsm_terms) + 1 >= len(df_shared):
+                _, screening_info = screen_rsm_terms(
+                    df_shared, variable_predictors, response_vars, threshold, max_terms=max_terms, heredity=heredity
+                )
+                start_terms = screening_info["selected_terms"]
+            effect_summary_all, selection_info = backward_eliminate(
+                df_shared, variable_predictors, response_vars, threshold, start_terms=start_terms
+            )
+        except Exception as e:
+            logging.warning(f"Error in stepwise elimination: {str(e)}")
+    elif selection_method == "all_subsets":
+        # Branch-and-bound over hierarchical subsets, ranked jointly across responses
+        try:
+            effect_summary_all, selection_info = all_subsets_search(
+                df_shared, variable_predictors, response_vars, criterion=criterion, top_models=top_models
+            )
+        except Exception as e:
+            logging.warning(f"Error in all-subsets search: {str(e)}")
+    elif categorical:
+        # One block-structured fit for all responses; multi-df terms get one Type III test each
+        try:
+            tests = type3_tests(blocked_fit(df_shared, rsm_terms, categorical, continuous, response_vars, categorical_coding))
+            effect_summary_all = pd.DataFrame({"Factor": tests["terms"]})
+            for y_idx, y in enumerate(response_vars):
+                effect_summary_all[y] = tests["logworth"][:, y_idx]
         except Exception as e:
-            logging.warning(f"Error in full model for {y}: {str(e)}")
-            continue
+            logging.warning(f"Error in categorical full model: {str(e)}")
+    else:
+        # Full model LogWorth scanning
+        for y in response_vars:
+            try:
+                # Use Q() to properly quote column names with special characters
+                y_quoted = quote_term(y)
+                formula = f"{y_quoted} ~ " + " + ".join(rsm_terms)
+                model = smf.ols(formula, data=response_frames[y], missing="none").fit()
+                anova_tbl = anova_lm(model, typ=3).reset_index()
+                anova_tbl = anova_tbl.rename(columns={"index": "Factor"})
+                anova_tbl = anova_tbl[anova_tbl["Factor"] != "Residual"]
+                anova_tbl["LogWorth"] = -np.log10(anova_tbl["PR(>F)"].replace(0, 1e-16))
+                temp = anova_tbl[["Factor", "LogWorth"]].copy()
+                temp.columns = ["Factor", y]
+                effect_summary_all = pd.merge(effect_summary_all, temp, on="Factor", how="outer") if not effect_summary_all.empty else temp
+            except Exception as e:
+                logging.warning(f"Error in full model for {y}: {str(e)}")
+                continue
     
     if effect_summary_all.empty:
         return {"error": "Unable to build any models with the provided data"}
     
-    effect_summary_all = effect_summary_all.fillna(0)
-    effect_summary_all["Median_LogWorth"] = effect_summary_all[response_vars].median(axis=1)
-    effect_summary_all["Max_LogWorth"] = effect_summary_all[response_vars].max(axis=1)
-    effect_summary_all["Appears_Significant"] = (effect_summary_all[response_vars] > threshold).sum(axis=1)
-    effect_summary_all = effect_summary_all.sort_values("Max_LogWorth", ascending=False)
-    
-    # Get simplified factors
-    def get_simplified_factors(effect_matrix, threshold, min_significant):
-        factors = effect_matrix[
-            (effect_matrix["Max_LogWorth"] >= threshold) |
-            (effect_matrix["Appears_Significant"] >= min_significant)
-        ]["Factor"].tolist()
-        if "Intercept" in factors:
-            factors.remove("Intercept")
-        hierarchical_terms = set(factors)
-        for f in factors:
-            if ":" in f:
-                parts = f.split(":")
-                hierarchical_terms |= {parts[0].strip(), parts[1].strip()}
-            if "I(" in f:
-                base = f.split("(")[1].split("**")[0].strip()
-                hierarchical_terms.add(base)
-        return sorted(hierarchical_terms)
-    
-    simplified_factors = get_simplified_factors(effect_summary_all, threshold, min_significant)
+    effect_summary_all = summarize_effects(effect_summary_all, response_vars, threshold)
     
-    # Config combination for lack of fit
-    df_raw["Config_combo"] = df_raw[variable_predictors].astype(str).agg("_".join, axis=1)
-    df["Config_combo"] = df_raw["Config_combo"]
+    if model_selection not in ("auto", selection_method):
+        selection_info["requested"] = model_selection
+    
+    if "simplified_factors" in selection_info:
+        # Stepwise and all-subsets already return a hierarchical simplified model
+        simplified_factors = selection_info.pop("simplified_factors")
+    else:
+        simplified_factors = get_simplified_factors(effect_summary_all, threshold, min_significant, term_table)
     
-    # Collinearity check
-    condition_number = None
+    # Simplified factors are model term names, already quoted for the formula;
+    # use linear terms only if no simplified factors identified
+    model_terms = simplified_factors if simplified_factors else [
+        categorical_term(p, categorical_coding) if p in categorical else quote_term(p) for p in variable_predictors
+    ]
+    
+    # One design matrix and thin QR shared by all responses for the collinearity check and diagnostics
+    shared_fit = None
+    diagnostics = None
+    press = None
+    cross_validation = None
+    collinearity = None
     try:
-        if simplified_factors:
-            x = dmatrix(" + ".join(simplified_factors), data=df, return_type="dataframe")
-            xtx = x.T @ x
-            condition_number = float(np.linalg.cond(xtx.values))
+        shared_fit = shared_design_fit(df_shared, model_terms, response_vars)
+        collinearity = collinearity_diagnostics(shared_fit["X"], shared_fit["columns"])
+        diagnostics = influence_diagnostics(shared_fit)
+        press = press_statistics(shared_fit, diagnostics)
+        if cv_folds and 2 <= int(cv_folds) <= len(shared_fit["index"]):
+            cross_validation = kfold_cross_validation(shared_fit, int(cv_folds))
     except Exception as e:
-        logging.warning(f"Error in collinearity check: {str(e)}")
+        logging.warning(f"Error in shared design diagnostics: {str(e)}")
+    
+    # Box-Cox lambda grid of every response, projected with the same thin Q
+    box_cox_reports = None
+    if box_cox:
+        options = box_cox if isinstance(box_cox, dict) else {}
+        try:
+            if shared_fit is None:
+                raise ValueError("Simplified model could not be fit")
+            box_cox_reports = boxcox_search(shared_fit, options.get("lambdas", DEFAULT_LAMBDAS), confidence_level)
+        except Exception as e:
+            logging.warning(f"Error in Box-Cox search: {str(e)}")
+            box_cox_reports = {y: {"error": str(e)} for y in response_vars}
+    
+    # Robust M-estimates of every response by batched IRLS on the shared design matrix
+    robust_result = None
+    robust_error = None
+    if robust:
+        try:
+            if shared_fit is None or shared_fit["rank"] < shared_fit["X"].shape[1]:
+                raise ValueError("Simplified model is rank deficient; no robust fit")
+            robust_result = robust_fit(shared_fit, robust)
+        except Exception as e:
+            logging.warning(f"Error in robust fit: {str(e)}")
+            robust_error = str(e)
     
     # Store summary results
     results["summary"] = {
         "full_model_effects": effect_summary_all.to_dict('records'),
         "simplified_factors": simplified_factors,
-        "condition_number": condition_number,
+        "condition_number": collinearity["condition_number"] if collinearity else None,
+        "collinearity": collinearity,
+        "model_selection": selection_info,
         "parameters": {
             "threshold": threshold,
             "min_significant": min_significant,
             "response_variables": response_vars,
-            "predictors": variable_predictors
-        }
+            "predictors": variable_predictors,
+            "categorical_factors": categorical,
+            "categorical_coding": categorical_coding if categorical else None
+        },
+        "missing_data": missing_report
     }
     
+    # Register the simplified model so predictions don't need the data again
+    record = None
+    if register_model or surfaces:
+        try:
+            if shared_fit is None:
+                raise ValueError("Simplified model could not be fit")
+            if categorical:
+                raise ValueError("Models with categorical factors cannot be registered for prediction")
+            factor_ranges = {p: (profile[p]["min"], profile[p]["max"]) for p in variable_predictors}
+            record = build_model_record(shared_fit, variable_predictors, scaler, factor_ranges)
+        except Exception as e:
+            logging.warning(f"Error building model record: {str(e)}")
+    if register_model:
+        try:
+            results["summary"]["model_id"] = save_model(record) if record is not None else None
+            results["summary"]["session_id"] = None
+            if record is not None and open_session:
+                state = build_session_state(
+                    record, df_raw.loc[shared_fit["index"], variable_predictors].to_numpy(dtype=float), shared_fit["Y"]
+                )
+                results["summary"]["session_id"] = create_session(state)
+        except Exception as e:
+            logging.warning(f"Error registering model: {str(e)}")
+            results["summary"].setdefault("model_id", None)
+            results["summary"]["session_id"] = None
+    
+    # Profiler traces and contour grids of the simplified model
+    if surfaces:
+        options = surfaces if isinstance(surfaces, dict) else {}
+        try:
+            if record is None:
+                raise ValueError("Simplified model could not be fit")
+            prepare_record(record)
+            lower, upper = factor_bounds(record, options.get('factor_ranges'))
+            results["surfaces"] = surface_report(
+                record, lower, upper, hold=options.get('hold'), pairs=options.get('pairs'),
+                resolution=options.get('resolution', 25), confidence_level=confidence_level
+            )
+        except Exception as e:
+            logging.warning(f"Error generating surfaces: {str(e)}")
+            results["surfaces"] = {"error": str(e)}
+    
+    # Bootstrap percentile intervals for the simplified-model parameters and full-model LogWorths
+    coefficient_samples = None
+    if bootstrap:
+        bootstrap_info = {
+            "method": bootstrap,
+            "replicates": bootstrap_replicates,
+            "seed": bootstrap_seed,
+            "confidence_level": confidence_level
+        }
+        try:
+            if shared_fit is not None and shared_fit["rank"] == shared_fit["X"].shape[1]:
+                boot = bootstrap_fits(shared_fit, method=bootstrap, replicates=bootstrap_replicates,
+                                      seed=bootstrap_seed, leverage=diagnostics["leverage"])
+                coefficient_samples = boot
+                coefficient_lower, coefficient_upper = percentile_interval(boot["coefficients"], confidence_level)
+            else:
+                bootstrap_info["note"] = "Simplified model is rank deficient; no parameter intervals"
+            
+            full_terms = [factor for factor in effect_summary_all["Factor"] if factor != "Intercept"]
+            full_fit = shared_design_fit(df_shared, full_terms, response_vars)
+            if full_fit["rank"] == full_fit["X"].shape[1] and full_fit["df_resid"] > 0:
+                full_boot = bootstrap_fits(full_fit, method=bootstrap, replicates=bootstrap_replicates, seed=bootstrap_seed)
+                logworth_lower, logworth_upper = percentile_interval(bootstrap_logworth(full_boot), confidence_level)
+                for effect in results["summary"]["full_model_effects"]:
+                    if effect["Factor"] in full_fit["columns"]:
+                        j = full_fit["columns"].index(effect["Factor"])
+                        effect["bootstrap_ci"] = {
+                            y: [float(logworth_lower[j, y_idx]), float(logworth_upper[j, y_idx])]
+                            for y_idx, y in enumerate(response_vars)
+                        }
+            else:
+                bootstrap_info["full_model_note"] = "Full model is not estimable from the runs; no LogWorth intervals"
+        except Exception as e:
+            logging.warning(f"Error in bootstrap: {str(e)}")
+            bootstrap_info["error"] = str(e)
+        results["summary"]["bootstrap"] = bootstrap_info
+    
     # Build simplified models for each response variable
     simplified_logworth_df = pd.DataFrame()
-    for y in response_vars:
+    uncoding = None
+    for y_idx, y in enumerate(response_vars):
         try:
             # Properly quote column names for statsmodels formula
-            y_quoted = f"Q('{y}')" if '*' in y or ' ' in y or '(' in y else y
-            
-            if not simplified_factors:
-                # Use linear terms only if no simplified factors identified
-                predictor_terms = [f"Q('{p}')" if '*' in p or ' ' in p or '(' in p else p for p in variable_predictors]
-                formula = f"{y_quoted} ~ " + " + ".join(predictor_terms)
-            else:
-                factor_terms = [f"Q('{f}')" if '*' in f or ' ' in f or '(' in f else f for f in simplified_factors]
-                formula = f"{y_quoted} ~ " + " + ".join(factor_terms)
+            y_quoted = quote_term(y)
+            formula = f"{y_quoted} ~ " + " + ".join(model_terms)
             
-            model_fit = smf.ols(formula=formula, data=df).fit()
+            df_y = response_frames[y]
+            model_fit = smf.ols(formula=formula, data=df_y, missing="none").fit()
             
             # ANOVA table
             anova_tbl = anova_lm(model_fit, typ=3).reset_index()
@@ -616,20 +1236,25 @@ def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_signi
             simplified_logworth_df = pd.merge(simplified_logworth_df, temp, on="Factor", how="outer") if not simplified_logworth_df.empty else temp
             
             # Model metrics
-            y_true = df[y]
+            y_true = df_y[y]
             y_pred = model_fit.fittedvalues
             resid = model_fit.resid
             rmse = np.sqrt(model_fit.mse_resid)
             
             # Lack of fit analysis
-            lack_of_fit_results = jmp_lack_of_fit_analysis(y, df_raw.copy(), model_fit)
+            lack_of_fit_results = jmp_lack_of_fit_analysis(y, df_y[[y, "Config_combo"]].copy(), model_fit)
             
             # Parameter estimates
             coef_tbl = model_fit.summary2().tables[1].copy()
             coef_tbl["LogWorth"] = -np.log10(coef_tbl["P>|t|"].replace(0, 1e-16))
             
-            # Uncoded parameter estimates
-            uncoded_estimates = calculate_uncoded_estimates(coef_tbl, scaler, variable_predictors, y_true)
+            # Uncoded parameter estimates; the coded-to-uncoded map is built once for all responses
+            try:
+                uncoding = uncoding or coded_to_uncoded(fitted_design_info(model_fit), term_table, continuous, scaler)
+                uncoded_estimates = calculate_uncoded_estimates(model_fit, uncoding)
+            except Exception as e:
+                logging.warning(f"Error calculating uncoded estimates: {str(e)}")
+                uncoded_estimates = {"error": str(e)}
             
             # Store model results
             results["models"][y] = {
@@ -651,28 +1276,417 @@ def perform_doe_analysis(df_raw, response_vars, predictors, threshold, min_signi
                 "uncoded_parameters": uncoded_estimates,
                 "lack_of_fit": lack_of_fit_results,
                 "residuals": {
+                    "row_index": df_y.index.tolist(),
                     "raw_residuals": [float(x) for x in resid.tolist()],
                     "predicted_values": [float(x) for x in y_pred.tolist()],
                     "actual_values": [float(x) for x in y_true.tolist()]
                 }
             }
             
+            if box_cox_reports is not None and shared_fit is not None and on_shared[y]:
+                results["models"][y]["box_cox"] = box_cox_reports.get(y)
+            
+            if robust_error is not None:
+                results["models"][y]["robust"] = {"method": robust, "error": robust_error}
+            elif robust_result is not None and on_shared[y]:
+                results["models"][y]["robust"] = {
+                    "method": robust,
+                    "scale": float(robust_result["scale"][y_idx]),
+                    "iterations": robust_result["iterations"],
+                    "converged": robust_result["converged"],
+                    "parameters": {term: {
+                        "coefficient": float(robust_result["coefficients"][j, y_idx]),
+                        "std_error": float(robust_result["std_errors"][j, y_idx]),
+                        "z_value": float(robust_result["z_values"][j, y_idx]),
+                        "p_value": float(robust_result["p_values"][j, y_idx]),
+                        "logworth": float(robust_result["logworth"][j, y_idx])
+                    } for j, term in enumerate(shared_fit["columns"])},
+                    "weights": robust_result["weights"][:, y_idx].tolist()
+                }
+            
+            # Influence diagnostics and predictive fit, when this response was fit on the shared rows
+            if diagnostics is not None and on_shared[y]:
+                fit_block = results["models"][y]["summary_of_fit"]
+                fit_block["press"] = float(press["press"][y_idx])
+                fit_block["predicted_r_squared"] = float(press["predicted_r_squared"][y_idx])
+                fit_block["loo_rmse"] = float(press["loo_rmse"][y_idx])
+                if cross_validation is not None:
+                    fit_block["cross_validation"] = {
+                        "folds": cross_validation["folds"],
+                        "rmse": float(cross_validation["rmse"][y_idx]),
+                        "r_squared": float(cross_validation["r_squared"][y_idx])
+                    }
+                
+                residual_block = results["models"][y]["residuals"]
+                residual_block["leverage"] = diagnostics["leverage"].tolist()
+                for name in ("studentized_residuals", "externally_studentized_residuals", "cooks_distance", "dffits"):
+                    residual_block[name] = diagnostics[name][:, y_idx].tolist()
+                if outlier_top_k:
+                    residual_block["outliers"] = top_outliers(
+                        diagnostics, y_idx, shared_fit["index"], shared_fit["rank"], int(outlier_top_k)
+                    )
+                
+                if coefficient_samples is not None:
+                    coded_block = results["models"][y]["coded_parameters"]
+                    for j, term in enumerate(shared_fit["columns"]):
+                        if term in coded_block:
+                            coded_block[term]["bootstrap_ci"] = [
+                                float(coefficient_lower[j, y_idx]), float(coefficient_upper[j, y_idx])
+                            ]
+                    if isinstance(uncoded_estimates, list):
+                        uncoded_samples = uncoded_coefficient_samples(
+                            uncoding, coefficient_samples["coefficients"][:, :, y_idx]
+                        )
+                        for item in uncoded_estimates:
+                            if item["term"] in uncoded_samples:
+                                lower, upper = percentile_interval(uncoded_samples[item["term"]], confidence_level)
+                                item["bootstrap_ci"] = [float(lower), float(upper)]
+            
+            # Summary mode replaces every per-row array with quantiles and the most extreme rows
+            if residual_detail == "summary":
+                model_block = results["models"][y]
+                residual_block = model_block["residuals"]
+                compact = {"summary": residual_summary(residual_block["raw_residuals"])}
+                if "outliers" in residual_block:
+                    compact["outliers"] = residual_block["outliers"]
+                elif "leverage" in residual_block:
+                    compact["outliers"] = top_outliers(
+                        diagnostics, y_idx, shared_fit["index"], shared_fit["rank"], SUMMARY_OUTLIERS
+                    )
+                model_block["residuals"] = compact
+                for block, key in (("box_cox", "predicted_values"), ("robust", "weights")):
+                    if isinstance(model_block.get(block), dict):
+                        model_block[block].pop(key, None)
+            
         except Exception as e:
             logging.error(f"Error processing model for {y}: {str(e)}")
             results["models"][y] = {"error": str(e)}
     
     # Simplified model summary
     if not simplified_logworth_df.empty:
-        simplified_logworth_df = simplified_logworth_df.fillna(0)
-        simplified_logworth_df["Median_LogWorth"] = simplified_logworth_df[response_vars].median(axis=1)
-        simplified_logworth_df["Max_LogWorth"] = simplified_logworth_df[response_vars].max(axis=1)
-        simplified_logworth_df["Appears_Significant"] = (simplified_logworth_df[response_vars] > threshold).sum(axis=1)
-        simplified_logworth_df = simplified_logworth_df.sort_values("Max_LogWorth", ascending=False)
+        simplified_logworth_df = summarize_effects(simplified_logworth_df, response_vars, threshold)
         
         results["summary"]["simplified_model_effects"] = simplified_logworth_df.to_dict('records')
     
     return results
 
+def perform_collapsed_analysis(df_raw, response_vars, predictors, threshold, min_significant,
+                               register_model=False, open_session=False):
+    """
+    Exact full-model screen and simplified fit from the distinct factor settings
+    
+    Replicated runs are collapsed into per-setting counts and sums (the
+    append-session sufficient statistics), so both fits cost one
+    p x p factorization however many rows there are, and lack of fit comes
+    from the same tables. Per-row diagnostics, resampling and the other
+    per-row options are not available on this path.
+    """
+    data = df_raw[list(predictors) + list(response_vars)].apply(pd.to_numeric, errors="coerce").dropna()
+    values = data[predictors].to_numpy(dtype=float)
+    Y = data[response_vars].to_numpy(dtype=float)
+    model = {
+        "predictors": list(predictors),
+        "scaler_mean": values.mean(axis=0).tolist(),
+        "scaler_scale": values.std(axis=0).tolist(),
+        "factor_ranges": {p: [float(values[:, i].min()), float(values[:, i].max())] for i, p in enumerate(predictors)}
+    }
+    
+    def fit_terms(terms):
+        columns = ["Intercept"] + list(terms)
+        record = dict(model, columns=columns, factors=column_factors(columns, predictors), responses=list(response_vars))
+        state = build_session_state(record, values, Y)
+        models, fitted_record = session_fit(state)
+        return models, fitted_record, state
+    
+    try:
+        full_models, _, _ = fit_terms(create_rsm_terms(predictors))
+    except Exception as e:
+        return {"error": f"Unable to fit the full model from the distinct factor settings: {str(e)}"}
+    effect_summary = pd.DataFrame({"Factor": [row["Factor"] for row in full_models[response_vars[0]]["anova_table"]]})
+    for y in response_vars:
+        effect_summary[y] = [row["LogWorth"] for row in full_models[y]["anova_table"]]
+    effect_summary = summarize_effects(effect_summary, response_vars, threshold)
+    simplified_factors = get_simplified_factors(effect_summary, threshold, min_significant, model_term_table(predictors))
+    
+    try:
+        models, record, state = fit_terms(simplified_factors or [quote_term(p) for p in predictors])
+    except Exception as e:
+        return {"error": f"Unable to fit the simplified model from the distinct factor settings: {str(e)}"}
+    
+    results = {
+        "summary": {
+            "full_model_effects": effect_summary.to_dict('records'),
+            "simplified_factors": simplified_factors,
+            "model_selection": {"method": "collapsed", "settings": state["n_groups"]},
+            "parameters": {
+                "threshold": threshold,
+                "min_significant": min_significant,
+                "response_variables": response_vars,
+                "predictors": list(predictors)
+            }
+        },
+        "models": models,
+        "diagnostics": {}
+    }
+    if register_model:
+        try:
+            results["summary"]["model_id"] = save_model(record)
+            results["summary"]["session_id"] = create_session(state) if open_session else None
+        except Exception as e:
+            logging.warning(f"Error registering model: {str(e)}")
+            results["summary"].setdefault("model_id", None)
+            results["summary"]["session_id"] = None
+    return results
+
+def load_registered_model(model_id):
+    """Return (record, None) for a registered model, or (None, error response)"""
+    record = load_model(model_id)
+    if record is None:
+        return None, func.HttpResponse(
+            json.dumps({"error": f"Unknown model_id '{model_id}'. Run an analysis to register a model first."}),
+            status_code=404,
+            mimetype="application/json"
+        )
+    return record, None
+
+def handle_predict(req_body):
+    """Predict from a registered model; never touches the original dataset"""
+    model_id = req_body.get('model_id')
+    settings = req_body.get('settings')
+    if not model_id or not settings:
+        return func.HttpResponse(
+            json.dumps({"error": "Predict requests need 'model_id' and 'settings'."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    record, error_response = load_registered_model(model_id)
+    if error_response is not None:
+        return error_response
+    
+    responses = req_body.get('responses') or list(record["responses"])
+    unknown = [y for y in responses if y not in record["responses"]]
+    confidence_level = float(req_body.get('confidence_level', 0.95))
+    if unknown or not 0 < confidence_level < 1:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid predict options. Model responses are {list(record['responses'])} and 'confidence_level' must be between 0 and 1."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    try:
+        values = settings_matrix(record, settings)
+    except ValueError as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    result = {
+        "model_id": model_id,
+        "predictors": record["predictors"],
+        "confidence_level": confidence_level,
+        "n_settings": int(len(values)),
+        "predictions": predict_responses(record, values, responses, confidence_level)
+    }
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def handle_optimize(req_body):
+    """Maximize the overall desirability of a registered model's responses"""
+    model_id = req_body.get('model_id')
+    if not model_id or not req_body.get('goals'):
+        return func.HttpResponse(
+            json.dumps({"error": "Optimize requests need 'model_id' and 'goals'."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    record, error_response = load_registered_model(model_id)
+    if error_response is not None:
+        return error_response
+    
+    try:
+        goals = parse_goals(record, req_body['goals'])
+        lower, upper = factor_bounds(record, req_body.get('factor_ranges'))
+        starts = int(req_body.get('starts', 32))
+        seed = int(req_body.get('seed', 0))
+        confidence_level = float(req_body.get('confidence_level', 0.95))
+        if starts < 1 or seed < 0 or not 0 < confidence_level < 1:
+            raise ValueError("'starts' must be positive, 'seed' a non-negative integer and 'confidence_level' between 0 and 1")
+        optimum = optimize_desirability(record, goals, lower, upper, starts=starts, seed=seed)
+        responses = [goal["response"] for goal in goals]
+        predictions = predict_responses(record, optimum["settings"][None, :], responses, confidence_level)
+    except (ValueError, TypeError, OverflowError) as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    result = {
+        "model_id": model_id,
+        "optimum": {p: float(v) for p, v in zip(record["predictors"], optimum["settings"])},
+        "desirability": optimum["desirability"],
+        "response_desirability": optimum["response_desirability"],
+        "predictions": {y: {key: values[0] for key, values in pred.items()} for y, pred in predictions.items()},
+        "confidence_level": confidence_level,
+        "factor_ranges": {p: [float(lo), float(hi)] for p, lo, hi in zip(record["predictors"], lower, upper)},
+        "search": optimum["search"]
+    }
+    if optimum["desirability"] == 0:
+        result["note"] = "No setting inside the factor ranges satisfies every goal; desirability is zero everywhere searched."
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def handle_profile(req_body):
+    """Profiler traces and contour grids of a registered model"""
+    model_id = req_body.get('model_id')
+    if not model_id:
+        return func.HttpResponse(
+            json.dumps({"error": "Profile requests need 'model_id'."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    record, error_response = load_registered_model(model_id)
+    if error_response is not None:
+        return error_response
+    
+    try:
+        lower, upper = factor_bounds(record, req_body.get('factor_ranges'))
+        report = surface_report(
+            record, lower, upper, hold=req_body.get('hold'), pairs=req_body.get('pairs'),
+            resolution=req_body.get('resolution', 25), responses=req_body.get('responses'),
+            confidence_level=float(req_body.get('confidence_level', 0.95))
+        )
+    except (ValueError, TypeError) as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    return func.HttpResponse(
+        json.dumps(dict(report, model_id=model_id)),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def handle_design(req_body):
+    """Generate a D- or I-optimal design by coordinate exchange"""
+    factors = req_body.get('factors')
+    runs = req_body.get('runs')
+    if not isinstance(factors, dict) or not factors or runs is None:
+        return func.HttpResponse(
+            json.dumps({"error": "Design requests need 'factors' ({name: [low, high]}) and 'runs'."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    try:
+        result = generate_design(
+            factors, int(runs),
+            criterion=req_body.get('criterion', 'D'),
+            model=req_body.get('model', 'rsm'),
+            existing_runs=req_body.get('existing_runs'),
+            levels=int(req_body.get('levels', 3)),
+            starts=max(1, int(req_body.get('starts', 8))),
+            seed=req_body.get('seed', 0),
+            time_budget=float(req_body.get('time_budget', 5.0))
+        )
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        return func.HttpResponse(
+            json.dumps({"error": f"Invalid design request: {str(e)}"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+def handle_append(req_body):
+    """Append new runs to an analysis session and refit from its sufficient statistics"""
+    session_id = req_body.get('session_id')
+    rows = req_body.get('rows')
+    data_input = req_body.get('data')
+    if not session_id or not (rows or data_input):
+        return func.HttpResponse(
+            json.dumps({"error": "Append requests need 'session_id' and the new runs as 'rows' or 'data'."}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    try:
+        df_new = pd.DataFrame(rows) if rows else get_data_from_source(data_input)
+    except ValueError as e:
+        return func.HttpResponse(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    
+    def update(state, load_groups):
+        columns = state["model"]["predictors"] + state["responses"]
+        missing = [c for c in columns if c not in df_new.columns]
+        if missing:
+            raise ValueError(f"New runs are missing column(s): {missing}")
+        values = df_new[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        complete = np.isfinite(values).all(axis=1)
+        if not complete.any():
+            raise ValueError("None of the new runs has every factor and response value")
+        n_predictors = len(state["model"]["predictors"])
+        append_rows(state, values[complete, :n_predictors], values[complete, n_predictors:], load_groups)
+        models, record = session_fit(state)
+        return int(complete.sum()), int((~complete).sum()), models, record
+    
+    try:
+        outcome = update_session(session_id, update)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        return func.HttpResponse(
+            json.dumps({"error": f"Could not append runs: {str(e)}"}),
+            status_code=400,
+            mimetype="application/json"
+        )
+    if outcome is None:
+        return func.HttpResponse(
+            json.dumps({"error": f"Unknown session_id '{session_id}'. Sessions expire after DOE_SESSION_TTL_HOURS; run an analysis with 'open_session': true to open one."}),
+            status_code=404,
+            mimetype="application/json"
+        )
+    
+    appended, dropped, models, record = outcome
+    effects = pd.DataFrame({
+        y: {row["Factor"]: row["LogWorth"] for row in model["anova_table"] if row["Factor"] != "Intercept"}
+        for y, model in models.items()
+    })
+    effects["Max_LogWorth"] = effects.max(axis=1)
+    effects = effects.sort_values("Max_LogWorth", ascending=False).reset_index().rename(columns={"index": "Factor"})
+    result = {
+        "session_id": session_id,
+        "model_id": save_model(record),
+        "appended_rows": appended,
+        "dropped_rows": dropped,
+        "observations": record["observations"],
+        "simplified_model_effects": effects.to_dict('records'),
+        "models": models
+    }
+    return func.HttpResponse(
+        json.dumps(result),
+        status_code=200,
+        mimetype="application/json"
+    )
+
 def jmp_lack_of_fit_analysis(y, df_raw, model_fit):
     """Perform JMP-style lack of fit analysis"""
     try:
@@ -725,56 +1739,30 @@ def jmp_lack_of_fit_analysis(y, df_raw, model_fit):
         logging.warning(f"Error in lack of fit analysis: {str(e)}")
         return {"error": str(e)}
 
-def calculate_uncoded_estimates(coef_tbl, scaler, predictors, y_true):
-    """Calculate uncoded parameter estimates"""
-    try:
-        X_mean = scaler.mean_
-        X_scale = scaler.scale_
-        uncoded = []
-        
-        for pname in coef_tbl.index:
-            if pname == "Intercept":
-                continue
-            coef_coded = coef_tbl.loc[pname, "Coef."]
-            if pname.startswith("I("):
-                var = pname.split("(")[1].split("**")[0].strip()
-                if var in predictors:
-                    i = predictors.index(var)
-                    beta_uncoded = coef_coded / (X_scale[i] ** 2)
-                else:
-                    continue
-            elif ":" in pname:
-                parts = pname.split(":")
-                var1, var2 = parts[0].strip(), parts[1].strip()
-                if var1 in predictors and var2 in predictors:
-                    i1, i2 = predictors.index(var1), predictors.index(var2)
-                    beta_uncoded = coef_coded / (X_scale[i1] * X_scale[i2])
-                else:
-                    continue
-            else:
-                if pname.strip() in predictors:
-                    i = predictors.index(pname.strip())
-                    beta_uncoded = coef_coded / X_scale[i]
-                else:
-                    continue
-            uncoded.append({"term": pname, "estimate": float(beta_uncoded)})
-        
-        # Calculate intercept
-        mean_Y = y_true.mean()
-        intercept_uncoded = mean_Y
-        for item in uncoded:
-            pname = item["term"]
-            beta_uncoded = item["estimate"]
-            if pname.startswith("I(") or ":" in pname:
-                continue
-            var = pname.strip()
-            if var in predictors:
-                i = predictors.index(var)
-                intercept_uncoded -= beta_uncoded * X_mean[i]
-        
-        uncoded.insert(0, {"term": "Intercept", "estimate": float(intercept_uncoded)})
-        return uncoded
-        
-    except Exception as e:
-        logging.warning(f"Error calculating uncoded estimates: {str(e)}")
-        return {"error": str(e)}
+def calculate_uncoded_estimates(model_fit, uncoding):
+    """
+    Uncoded parameter estimates and standard errors of one fitted model
+    
+    uncoding is the (T, names) map of coded_to_uncoded; the covariance of the
+    uncoded estimates is T cov T', so cross-term corrections carry their
+    share of the uncertainty into the intercept and lower-order terms.
+    """
+    T, names = uncoding
+    estimates = T @ model_fit.params.to_numpy()
+    variances = np.einsum("ij,jk,ik->i", T, model_fit.cov_params().to_numpy(), T)
+    return [
+        {"term": name, "estimate": float(estimate), "std_error": float(np.sqrt(max(variance, 0.0)))}
+        for name, estimate, variance in zip(names, estimates, variances)
+    ]
+
+def uncoded_coefficient_samples(uncoding, coefficients):
+    """
+    Uncoded estimates for many coefficient vectors at once
+    
+    coefficients is (B x p) in the order of the model columns; one product
+    with the coded-to-uncoded map gives {term: (B,)}.
+    """
+    T, names = uncoding
+    samples = coefficients @ T.T
+    return {name: samples[:, i] for i, name in enumerate(names)}
+
@@ -0,0 +1,156 @@
+import os
+
+from .bootstrap import BOOTSTRAP_BATCH
+from .categorical import MAX_INTERACTION_LEVELS
+from .regression import create_rsm_terms
+
+# Default budgets per request; override with DOE_MAX_SECONDS, DOE_MAX_MEMORY_MB, DOE_MAX_PAYLOAD_MB.
+# Azure closes HTTP requests after 230 s whatever functionTimeout says.
+DEFAULT_LIMITS = {"seconds": 120.0, "memory_mb": 1024.0, "payload_mb": 16.0}
+BUDGET_LABELS = {"seconds": ("time", "s"), "memory_mb": ("memory", "MB"), "payload_mb": ("payload", "MB")}
+
+# Fit-time model t = base + per_term * k * p + per_gflop * k * n * p^2 / 1e9 + per_mrow * k * n / 1e6,
+# least-squares calibrated on perform_doe_analysis timings (n 500-50000, 3-20 predictors,
+# 1-4 responses; within about 20%). Bootstrap adds per_boot_gflop per 1e9 * B * n * p * (p + k).
+TIME_COEFFICIENTS = {
+    "base": 0.1,
+    "per_term": 3.0e-3,
+    "per_gflop": 0.53,
+    "per_mrow": 10.2,
+    "per_boot_gflop": 0.17
+}
+
+# Measured JSON sizes: nine per-row arrays per response, and the term-by-term collinearity report
+PAYLOAD_BYTES_PER_ROW = 172
+PAYLOAD_BYTES_PER_TERM = 250
+PAYLOAD_BYTES_PER_PROPORTION = 35
+
+# Copies of the data frame and of the dense design matrix held at the peak of a fit
+FRAME_COPIES = 4
+DESIGN_COPIES = 8
+
+# Collapsing replicates only pays off when there are at most this many settings per row
+COLLAPSE_MAX_SETTINGS_RATIO = 0.5
+
+
+def admission_limits():
+    """Request budgets, from the environment where set"""
+    return {
+        "seconds": float(os.environ.get("DOE_MAX_SECONDS", DEFAULT_LIMITS["seconds"])),
+        "memory_mb": float(os.environ.get("DOE_MAX_MEMORY_MB", DEFAULT_LIMITS["memory_mb"])),
+        "payload_mb": float(os.environ.get("DOE_MAX_PAYLOAD_MB", DEFAULT_LIMITS["payload_mb"]))
+    }
+
+
+def model_parameter_count(continuous, categorical_levels=None):
+    """Columns of the candidate model: intercept, RSM terms and categorical contrasts"""
+    count = 1 + len(create_rsm_terms(continuous))
+    for levels in (categorical_levels or {}).values():
+        count += (levels - 1) * (1 + (len(continuous) if levels <= MAX_INTERACTION_LEVELS else 0))
+    return count
+
+
+def estimate_cost(rows, predictors, responses, terms, model_terms=None, bootstrap_replicates=0,
+                  residual_detail="full", per_row_extras=0):
+    """
+    Estimated fit time, peak memory and JSON payload of one analysis
+
+    rows, predictors and responses describe the data; terms is the number of
+    candidate model parameters (intercept included) and model_terms the size
+    of the fitted simplified model (all candidates when unknown).
+    per_row_extras counts additional per-row arrays per response (robust
+    weights, Box-Cox predictions). Returns a dict of GFLOP, seconds,
+    memory_mb and payload_mb.
+    """
+    n, k, p = rows, responses, terms
+    m = p if model_terms is None else model_terms
+    c = TIME_COEFFICIENTS
+    gflop = k * n * p ** 2 / 1e9 + bootstrap_replicates * n * p * (p + k) / 1e9
+    seconds = (c["base"] + c["per_term"] * k * p + c["per_gflop"] * k * n * p ** 2 / 1e9
+               + c["per_mrow"] * k * n / 1e6 + c["per_boot_gflop"] * bootstrap_replicates * n * p * (p + k) / 1e9)
+
+    memory = FRAME_COPIES * n * (predictors + k) * 8 + DESIGN_COPIES * n * p * 8
+    if bootstrap_replicates:
+        # Case resampling keeps the row-wise outer products (n x p^2) and one batch of counts
+        memory += n * p * p * 8 + BOOTSTRAP_BATCH * n * 8 * (1 + k)
+
+    payload = k * p * PAYLOAD_BYTES_PER_TERM + m * m * PAYLOAD_BYTES_PER_PROPORTION
+    if residual_detail == "full":
+        payload += k * n * (PAYLOAD_BYTES_PER_ROW + 20 * per_row_extras)
+    return {
+        "gflop": round(gflop, 3),
+        "seconds": round(seconds, 2),
+        "memory_mb": round(memory / 2 ** 20, 1),
+        "payload_mb": round(payload / 2 ** 20, 2)
+    }
+
+
+def _over(estimate, limits):
+    return [
+        f"estimated {label} {estimate[name]:g} {unit} exceeds the {limits[name]:g} {unit} limit"
+        for name, (label, unit) in BUDGET_LABELS.items() if estimate[name] > limits[name]
+    ]
+
+
+def plan_admission(rows, predictors, responses, terms, settings=None, bootstrap_replicates=0,
+                   residual_detail="full", per_row_extras=0, collapsible=True, screenable=True,
+                   allow_downgrade=True, limits=None):
+    """
+    Accept, downgrade or reject an analysis before any model is fit
+
+    Downgrades are tried in order of how much of the analysis they keep:
+    summary residuals (per-row arrays replaced by quantiles and the top
+    outliers), the collapsed-replicate path (one exact fit from the
+    sufficient statistics of the distinct factor settings, without per-row
+    diagnostics or resampling; only when there are more distinct settings
+    than candidate parameters, so the model is estimable and keeps residual
+    degrees of freedom for its tests), and finally a term budget for forward
+    screening. collapsible and screenable say whether the last two apply
+    (neither does with categorical factors). Returns a dict with the
+    decision, the estimates, the changes to apply (residual_detail, collapse,
+    max_terms) and a human-readable reason.
+    """
+    limits = limits or admission_limits()
+    options = {"residual_detail": residual_detail, "collapse": False, "max_terms": None}
+    estimate = estimate_cost(rows, predictors, responses, terms, None, bootstrap_replicates, residual_detail, per_row_extras)
+    reasons = _over(estimate, limits)
+    plan = {"decision": "accept", "estimate": estimate, "limits": limits, "actions": [], "options": options}
+    if not reasons:
+        return plan
+    if not allow_downgrade:
+        plan.update(decision="reject", reason="; ".join(reasons))
+        return plan
+
+    plan["decision"] = "downgrade"
+    if residual_detail == "full" and estimate["payload_mb"] > limits["payload_mb"]:
+        options["residual_detail"] = "summary"
+        estimate = estimate_cost(rows, predictors, responses, terms, None, bootstrap_replicates, "summary")
+        plan["actions"].append("per-row residual arrays replaced by a residual summary")
+
+    if (_over(estimate, limits) and collapsible and settings and terms < settings
+            and settings <= COLLAPSE_MAX_SETTINGS_RATIO * rows):
+        collapsed = estimate_cost(settings, predictors, responses, terms, None, 0, "summary")
+        if not _over(collapsed, limits):
+            options["collapse"] = True
+            estimate = collapsed
+            plan["actions"].append(
+                f"replicates collapsed to {settings} distinct factor settings (exact fit from sufficient "
+                "statistics; no per-row diagnostics, resampling or robust fits)"
+            )
+
+    if _over(estimate, limits) and screenable and not options["collapse"]:
+        # Largest screening budget that fits, never below the main effects
+        for max_terms in range(terms - 2, predictors - 1, -1):
+            trial = estimate_cost(rows, predictors, responses, max_terms + 1, None, bootstrap_replicates,
+                                  options["residual_detail"], per_row_extras)
+            if not _over(trial, limits):
+                options["max_terms"] = max_terms
+                estimate = trial
+                plan["actions"].append(f"forward screening limited to {max_terms} model terms")
+                break
+
+    plan["estimate"] = estimate
+    remaining = _over(estimate, limits)
+    if remaining:
+        plan.update(decision="reject", reason="; ".join(remaining) + " even after downgrading")
+    return plan
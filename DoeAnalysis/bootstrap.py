@@ -0,0 +1,120 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from scipy.stats import t as t_dist
+
+BOOTSTRAP_METHODS = ("case", "residual")
+
+# Replicates solved together, bounding the (batch x n) and (n x batch*k) work arrays
+BOOTSTRAP_BATCH = 250
+
+# Case resamples whose weighted Gram matrix is worse conditioned than this are dropped
+MAX_RESAMPLE_CONDITION = 1e12
+
+
+def _case_batches(fit, replicates, rng):
+    """Batched weighted normal equations for multinomial case resampling"""
+    X, Y = fit["X"], fit["Y"]
+    n, p = X.shape
+    k = Y.shape[1]
+    # Row-wise outer products, so every weighted X'WX and X'WY of a batch is one matrix product
+    outer = (X[:, :, None] * X[:, None, :]).reshape(n, p * p)
+    cross = (X[:, :, None] * Y[:, None, :]).reshape(n, p * k)
+    y_squared = Y ** 2
+    uniform = np.full(n, 1.0 / n)
+
+    for start in range(0, replicates, BOOTSTRAP_BATCH):
+        size = min(BOOTSTRAP_BATCH, replicates - start)
+        counts = rng.multinomial(n, uniform, size=size).astype(float)
+        gram = (counts @ outer).reshape(size, p, p)
+        rhs = (counts @ cross).reshape(size, p, k)
+
+        valid = np.linalg.cond(gram) < MAX_RESAMPLE_CONDITION
+        gram[~valid] = np.eye(p)
+        gram_inv = np.linalg.inv(gram)
+        coefficients = gram_inv @ rhs
+        sse = np.maximum(counts @ y_squared - np.einsum("bpk,bpk->bk", coefficients, rhs), 0.0)
+        xtx_inv_diag = np.diagonal(gram_inv, axis1=1, axis2=2).copy()
+
+        coefficients[~valid] = np.nan
+        sse[~valid] = np.nan
+        yield coefficients, sse, xtx_inv_diag, counts @ Y / n
+
+
+def _residual_batches(fit, replicates, rng, leverage):
+    """Multi-column QR solves for residual resampling on the fixed design"""
+    q, r = fit["q"], fit["r"]
+    n, p = q.shape
+    k = fit["Y"].shape[1]
+    # Leverage-adjusted residuals have constant variance; centre them so E[e*] = 0
+    adjusted = fit["residuals"] / np.sqrt(np.maximum(1.0 - leverage, 1e-12))[:, None]
+    adjusted = adjusted - adjusted.mean(axis=0)
+    qty = q.T @ fit["Y"]
+    r_inv = solve_triangular(r, np.eye(p))
+    xtx_inv_diag = (r_inv ** 2).sum(axis=1)
+    fitted_mean = fit["fitted"].mean(axis=0)
+
+    for start in range(0, replicates, BOOTSTRAP_BATCH):
+        size = min(BOOTSTRAP_BATCH, replicates - start)
+        # The same rows are drawn for every response, keeping their correlation
+        errors = adjusted[rng.integers(0, n, size=(size, n))]
+        qte = q.T @ errors.transpose(1, 0, 2).reshape(n, size * k)
+        coefficients = r_inv @ (qty[:, None, :] + qte.reshape(p, size, k)).reshape(p, size * k)
+        # Residuals of Y* = fitted + e* are (I - H) e*, so SSE = |e*|^2 - |Q'e*|^2
+        sse = np.maximum((errors ** 2).sum(axis=1) - (qte.reshape(p, size, k) ** 2).sum(axis=0), 0.0)
+        yield (
+            coefficients.reshape(p, size, k).transpose(1, 0, 2),
+            sse,
+            np.broadcast_to(xtx_inv_diag, (size, p)),
+            fitted_mean + errors.mean(axis=1)
+        )
+
+
+def bootstrap_fits(fit, method="case", replicates=1000, seed=0, leverage=None):
+    """
+    Refit every response of a shared design fit on bootstrap resamples
+
+    Case resampling draws multinomial row counts and solves all replicates as
+    batched weighted normal equations (X'WX) b = X'WY. Residual resampling adds
+    resampled leverage-adjusted residuals to the fitted values and solves all
+    replicates with the existing thin QR as one multi-column triangular solve.
+    The fit must have full column rank.
+
+    Returns a dict with coefficients (B x p x k), sse (B x k), xtx_inv_diag
+    (B x p), y_mean (B x k) and df_resid. Degenerate case resamples are NaN.
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method}")
+    rng = np.random.default_rng(seed)
+    if method == "case":
+        batches = _case_batches(fit, replicates, rng)
+    else:
+        if leverage is None:
+            leverage = (fit["q"] ** 2).sum(axis=1)
+        batches = _residual_batches(fit, replicates, rng, leverage)
+
+    coefficients, sse, xtx_inv_diag, y_mean = (np.concatenate(parts) for parts in zip(*batches))
+    return {
+        "coefficients": coefficients,
+        "sse": sse,
+        "xtx_inv_diag": xtx_inv_diag,
+        "y_mean": y_mean,
+        "df_resid": fit["df_resid"]
+    }
+
+
+def bootstrap_logworth(boot):
+    """LogWorth of every coefficient in every replicate (B x p x k); NaN for dropped replicates"""
+    df_resid = boot["df_resid"]
+    mse = boot["sse"] / df_resid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_values = boot["coefficients"] / np.sqrt(boot["xtx_inv_diag"][:, :, None] * mse[:, None, :])
+    # From the log survival function, so LogWorths of very strong effects are not capped
+    log_p = t_dist.logsf(np.abs(t_values), df_resid) + np.log(2.0)
+    return np.maximum(-log_p / np.log(10.0), 0.0)
+
+
+def percentile_interval(samples, confidence_level=0.95):
+    """Percentile interval over the replicate axis, ignoring dropped replicates"""
+    alpha = 1.0 - confidence_level
+    lower, upper = np.nanpercentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return lower, upper
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from numpy.linalg import LinAlgError
+from patsy import dmatrix
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve
+from scipy.stats import f as f_dist
+
+from .regression import ALIAS_TOLERANCE, logworth_from_p, quote_term
+
+# Request coding name -> patsy contrast; effect coding gives JMP-style Type III tests
+CATEGORICAL_CODINGS = {"effect": "Sum", "reference": "Treatment"}
+
+# Categorical factors with more levels than this enter the model as main effects only
+MAX_INTERACTION_LEVELS = 10
+
+
+def is_categorical_series(series):
+    """True for columns that cannot be standardized (strings, categories, booleans)"""
+    return not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)
+
+
+def categorical_term(name, coding="effect"):
+    """Patsy spelling of a categorical main effect, e.g. "C(Part, Sum)" """
+    return f"C({quote_term(name)}, {CATEGORICAL_CODINGS[coding]})"
+
+
+def categorical_term_table(categorical, continuous, coding="effect", levels=None):
+    """
+    Map categorical model term names to (categorical factor, continuous factor or None)
+
+    Every categorical factor gets a main effect and, when it has at most
+    MAX_INTERACTION_LEVELS levels (levels maps factor -> count), an interaction
+    with every continuous factor.
+    """
+    table = {}
+    for c in categorical:
+        name = categorical_term(c, coding)
+        table[name] = (c, None)
+        if levels is None or levels[c] <= MAX_INTERACTION_LEVELS:
+            for x in continuous:
+                table[f"{name}:{quote_term(x)}"] = (c, x)
+    return table
+
+
+def contrast_block(values, coding="effect"):
+    """
+    Sparse contrast-coded columns (n x L-1) of one categorical factor and their labels
+
+    Levels are sorted as patsy sorts them. Effect coding gives level l < L a +1
+    in column l and the last level -1 in every column; reference coding drops
+    the first level. Only the rows of the last level (effect coding) are dense.
+    """
+    codes, levels = pd.factorize(values, sort=True)
+    n, L = len(codes), len(levels)
+    rows = np.arange(n)
+    if coding == "effect":
+        last = codes == L - 1
+        last_rows = rows[last]
+        r = np.concatenate([rows[~last], np.repeat(last_rows, L - 1)])
+        c = np.concatenate([codes[~last], np.tile(np.arange(L - 1), len(last_rows))])
+        v = np.concatenate([np.ones((~last).sum()), -np.ones(len(last_rows) * (L - 1))])
+        labels = [f"S.{level}" for level in levels[:-1]]
+    else:
+        kept = codes > 0
+        r, c, v = rows[kept], codes[kept] - 1, np.ones(kept.sum())
+        labels = [f"T.{level}" for level in levels[1:]]
+    return sparse.csr_matrix((v, (r, c)), shape=(n, max(L - 1, 0))), labels
+
+
+def blocked_fit(df, terms, categorical, continuous, response_vars, coding="effect"):
+    """
+    Fit every response on a model with categorical terms without a dense indicator matrix
+
+    X = [Z | D] with Z the dense continuous terms and D the sparse contrast
+    blocks of the categorical main effects and their interactions. X'X is
+    assembled block by block (Z'Z, D'Z and the nearly diagonal D'D) and solved
+    with one Cholesky factorization for all responses, so memory grows with
+    the number of levels rather than rows x levels. Column names follow patsy.
+    Raises ValueError when the model is not estimable from the complete rows.
+    """
+    levels = {c: df[c].nunique() for c in categorical}
+    table = categorical_term_table(categorical, continuous, coding, levels)
+    dense_terms = [t for t in terms if t not in table]
+    block_terms = [t for t in terms if t in table]
+    used = list(dict.fromkeys(list(categorical) + list(continuous) + list(response_vars)))
+    data = df.loc[df[used].notna().all(axis=1)]
+
+    Z = dmatrix(" + ".join(dense_terms) if dense_terms else "1", data=data, return_type="dataframe")
+    Y = data[response_vars].to_numpy(dtype=float)
+    contrasts = {c: contrast_block(data[c].to_numpy(), coding) for c in categorical}
+    blocks = []
+    columns = list(Z.columns)
+    term_columns = {name: list(range(len(columns)))[span] for name, span in Z.design_info.term_name_slices.items()}
+    for name in block_terms:
+        c, x = table[name]
+        block, labels = contrasts[c]
+        suffix = ""
+        if x is not None:
+            block = sparse.csr_matrix(block.multiply(data[x].to_numpy(dtype=float)[:, None]))
+            suffix = f":{quote_term(x)}"
+        blocks.append(block)
+        start = len(columns)
+        columns += [f"{categorical_term(c, coding)}[{label}]{suffix}" for label in labels]
+        term_columns[name] = list(range(start, len(columns)))
+
+    Zv = Z.to_numpy(dtype=float)
+    D = sparse.hstack(blocks, format="csr") if blocks else sparse.csr_matrix((len(Zv), 0))
+    DtZ = np.asarray(D.T @ Zv)
+    xtx = np.block([[Zv.T @ Zv, DtZ.T], [DtZ, (D.T @ D).toarray()]])
+    xty = np.vstack([Zv.T @ Y, np.asarray(D.T @ Y)])
+
+    n, p = len(Y), len(columns)
+    try:
+        factor = cho_factor(xtx)
+    except LinAlgError:
+        raise ValueError("Model with categorical factors is not estimable from the runs")
+    # A pivot this small relative to its column's sum of squares means the column is aliased
+    if (np.diag(factor[0]) ** 2 <= ALIAS_TOLERANCE * np.maximum(np.diag(xtx), 1e-300)).any() or n <= p:
+        raise ValueError("Model with categorical factors is not estimable from the runs")
+    coefficients = cho_solve(factor, xty)
+    residuals = Y - Zv @ coefficients[:Zv.shape[1]] - D @ coefficients[Zv.shape[1]:]
+    return {
+        "columns": columns,
+        "term_columns": term_columns,
+        "coefficients": coefficients,
+        "xtx_inv": cho_solve(factor, np.eye(p)),
+        "sse": (residuals ** 2).sum(axis=0),
+        "df_resid": n - p,
+        "observations": n
+    }
+
+
+def type3_tests(fit):
+    """
+    Type III F tests of every model term, multi-degree-of-freedom terms included
+
+    The sum of squares of a term with columns T is the Wald form
+    b_T' [(X'X)^-1]_TT^-1 b_T, which equals the extra sum of squares of
+    dropping the term under effect coding. Returns per-term arrays (terms x k).
+    """
+    mse = fit["sse"] / fit["df_resid"]
+    names, dfs, sum_sq = [], [], []
+    for name, idx in fit["term_columns"].items():
+        if not idx:
+            continue
+        b = fit["coefficients"][idx]
+        V = fit["xtx_inv"][np.ix_(idx, idx)]
+        names.append(name)
+        dfs.append(len(idx))
+        sum_sq.append((b * np.linalg.solve(V, b)).sum(axis=0))
+    dfs = np.array(dfs, dtype=float)
+    sum_sq = np.array(sum_sq)
+    F = sum_sq / dfs[:, None] / mse
+    p_values = f_dist.sf(F, dfs[:, None], fit["df_resid"])
+    return {
+        "terms": names,
+        "df": dfs,
+        "sum_sq": sum_sq,
+        "F": F,
+        "p_values": p_values,
+        "logworth": logworth_from_p(p_values)
+    }
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import threading
+
+# Analyses currently running in this worker, by request fingerprint
+_IN_FLIGHT = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def request_fingerprint(params):
+    """
+    SHA-256 of a normalized analysis request
+
+    params holds the parsed request with every default filled in, so an
+    omitted option and its default spelled out give the same fingerprint.
+    The data source (inline CSV, base64 or URL) enters as its own hash.
+    """
+    canonical = dict(params)
+    data = canonical.get("data_input")
+    if isinstance(data, str):
+        canonical["data_input"] = hashlib.sha256(data.encode("utf-8")).hexdigest()
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def single_flight(key, compute):
+    """
+    Run compute() once for all concurrent callers with the same key
+
+    The first caller computes; callers arriving while it runs wait for it and
+    receive the same result (or the same exception). The entry is dropped as
+    soon as the computation finishes, so only overlapping requests are
+    coalesced and nothing is cached. Returns (result, shared) with shared
+    True for the waiting callers.
+    """
+    with _IN_FLIGHT_LOCK:
+        flight = _IN_FLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _IN_FLIGHT[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    try:
+        flight.result = compute()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            del _IN_FLIGHT[key]
+        flight.done.set()
+    return flight.result, False
+
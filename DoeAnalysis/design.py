@@ -0,0 +1,214 @@
+import time
+
+import numpy as np
+
+from .regression import build_term_table, create_rsm_terms, quote_term
+
+DESIGN_CRITERIA = ("D", "I")
+DESIGN_MODELS = ("rsm", "linear", "quadratic")
+
+# Ridge keeping random starting designs invertible; it is dropped when designs are scored
+DESIGN_RIDGE = 1e-6
+
+
+def design_model_terms(factors, model="rsm"):
+    """
+    Term names and factor-index tuples of the model a design is built for
+
+    "rsm" is the model create_rsm_terms fits, "linear" main effects only and
+    "quadratic" the full second-order model.
+    """
+    table = build_term_table(factors)
+    if model == "linear":
+        names = [quote_term(f) for f in factors]
+    elif model == "quadratic":
+        names = list(table)
+    else:
+        names = create_rsm_terms(factors)
+    return names, [tuple(factors.index(f) for f in table[name]) for name in names]
+
+
+def model_expansion(points, index_lists):
+    """Model rows (..., 1 + n_terms) of coded points (..., n_factors), intercept first"""
+    columns = [np.ones(points.shape[:-1])]
+    for indices in index_lists:
+        column = points[..., indices[0]]
+        for i in indices[1:]:
+            column = column * points[..., i]
+        columns.append(column)
+    return np.stack(columns, axis=-1)
+
+
+def region_moments(index_lists, n_factors):
+    """
+    Moment matrix of the model terms over the uniform coded cube [-1, 1]^k
+
+    Entry (a, b) is the average of f_a(x) f_b(x); for monomials this is the
+    product over factors of 1 / (e + 1) for even total exponent e, else 0.
+    """
+    exponents = np.zeros((len(index_lists) + 1, n_factors), dtype=int)
+    for j, indices in enumerate(index_lists, start=1):
+        for i in indices:
+            exponents[j, i] += 1
+    total = exponents[:, None, :] + exponents[None, :, :]
+    return np.where(total % 2 == 0, 1.0 / (total + 1), 0.0).prod(axis=2)
+
+
+def design_efficiency(F, moments):
+    """D-efficiency (%), log|X'X| and the average prediction variance of a model matrix"""
+    n, p = F.shape
+    sign, logdet = np.linalg.slogdet(F.T @ F)
+    if sign <= 0:
+        return {"d_efficiency": 0.0, "log_determinant": None, "average_prediction_variance": None}
+    inverse = np.linalg.inv(F.T @ F)
+    return {
+        "d_efficiency": float(100.0 * np.exp(logdet / p) / n),
+        "log_determinant": float(logdet),
+        "average_prediction_variance": float(np.trace(inverse @ moments))
+    }
+
+
+def coordinate_exchange(index_lists, n_factors, runs, criterion="D", existing=None, levels=3,
+                        starts=8, seed=0, time_budget=5.0, max_passes=50):
+    """
+    D- or I-optimal design by coordinate exchange, all random starts in parallel
+
+    Each start is a random design on a grid of `levels` coded levels. For every
+    run and factor the candidate levels are scored against the current
+    (X'X)^-1 with the rank-one exchange formulas: the determinant ratio
+    (1 + d(c))(1 - d(x)) + d(x, c)^2 for D, and two Sherman-Morrison updates
+    of trace((X'X)^-1 W) for I. Every start is scored in the same batched
+    product and the best improving exchange is applied with the same two
+    rank-one updates to (X'X)^-1. Passes repeat until no start improves or
+    time_budget seconds have passed. Existing runs are kept fixed.
+
+    Returns (coded new runs, info) for the best start.
+    """
+    rng = np.random.default_rng(seed)
+    grid = np.linspace(-1.0, 1.0, levels)
+    existing = np.zeros((0, n_factors)) if existing is None else np.asarray(existing, dtype=float)
+    n_fixed = len(existing)
+    moments = region_moments(index_lists, n_factors)
+
+    X = np.concatenate([
+        np.broadcast_to(existing, (starts, n_fixed, n_factors)),
+        grid[rng.integers(0, levels, size=(starts, runs, n_factors))]
+    ], axis=1)
+    F = model_expansion(X, index_lists)
+    p = F.shape[2]
+    s_idx = np.arange(starts)
+    deadline = time.perf_counter() + time_budget
+
+    passes = 0
+    exchanges = 0
+    timed_out = False
+    for passes in range(1, max_passes + 1):
+        # Refresh the inverse every pass so rank-one round-off never accumulates
+        M_inv = np.linalg.inv(np.einsum("snp,snq->spq", F, F) + DESIGN_RIDGE * np.eye(p))
+        if criterion == "I":
+            trace = np.einsum("spq,sqp->s", M_inv, moments[None, :, :])
+        improved_any = False
+        for i in range(n_fixed, n_fixed + runs):
+            for j in range(n_factors):
+                candidates = np.repeat(X[:, i, None, :], levels, axis=1)
+                candidates[:, :, j] = grid
+                fc = model_expansion(candidates, index_lists)
+                fx = F[:, i]
+                u = np.einsum("spq,slq->slp", M_inv, fc)
+                v = np.einsum("spq,sq->sp", M_inv, fx)
+                d_c = (fc * u).sum(axis=2)
+                d_x = (fx * v).sum(axis=1)[:, None]
+                d_xc = (u * fx[:, None, :]).sum(axis=2)
+                a = 1.0 + d_c
+                if criterion == "D":
+                    gain = np.log(np.maximum(a * (1.0 - d_x) + d_xc ** 2, 1e-300))
+                    best = gain.argmax(axis=1)
+                    improve = gain[s_idx, best] > 1e-10
+                else:
+                    w1 = v[:, None, :] - u * (d_xc / a)[:, :, None]
+                    denom = 1.0 - d_x + d_xc ** 2 / a
+                    change = (-np.einsum("slp,pq,slq->sl", u, moments, u) / a
+                              + np.einsum("slp,pq,slq->sl", w1, moments, w1) / denom)
+                    best = change.argmin(axis=1)
+                    improve = change[s_idx, best] < -1e-10 * np.abs(trace)
+                if not improve.any():
+                    continue
+
+                s = s_idx[improve]
+                b = best[improve]
+                u_s = u[s, b]
+                a_s = a[s, b]
+                # Add the candidate row, then remove the old one
+                M_inv[s] -= u_s[:, :, None] * u_s[:, None, :] / a_s[:, None, None]
+                w1_s = np.einsum("spq,sq->sp", M_inv[s], fx[s])
+                M_inv[s] += w1_s[:, :, None] * w1_s[:, None, :] / (1.0 - (fx[s] * w1_s).sum(axis=1))[:, None, None]
+                if criterion == "I":
+                    trace[s] += change[s, b]
+                X[s, i] = candidates[s, b]
+                F[s, i] = fc[s, b]
+                exchanges += len(s)
+                improved_any = True
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+        if not improved_any or timed_out:
+            break
+
+    scores = [design_efficiency(F[s], moments) for s in range(starts)]
+    if criterion == "D":
+        winner = max(range(starts), key=lambda s: scores[s]["log_determinant"] if scores[s]["log_determinant"] is not None else -np.inf)
+    else:
+        winner = min(range(starts), key=lambda s: scores[s]["average_prediction_variance"] if scores[s]["average_prediction_variance"] is not None else np.inf)
+    return X[winner, n_fixed:], dict(scores[winner], passes=passes, exchanges=exchanges, timed_out=timed_out, starts=starts)
+
+
+def generate_design(factors, runs, criterion="D", model="rsm", existing_runs=None, levels=3,
+                    starts=8, seed=0, time_budget=5.0):
+    """
+    Build a D- or I-optimal design for factors {name: [low, high]}
+
+    existing_runs (a list of {factor: value} rows) are augmented rather than
+    replaced. Returns a JSON-ready dict with the new runs in uncoded units and
+    the efficiency of the whole design. Raises ValueError for invalid input.
+    """
+    names = list(factors)
+    if len(names) < 1:
+        raise ValueError("At least one factor is required")
+    lower = np.array([float(factors[f][0]) for f in names])
+    upper = np.array([float(factors[f][1]) for f in names])
+    if not (upper > lower).all():
+        raise ValueError("Every factor range must be [low, high] with low < high")
+    if criterion not in DESIGN_CRITERIA or model not in DESIGN_MODELS:
+        raise ValueError(f"'criterion' must be one of {list(DESIGN_CRITERIA)} and 'model' one of {list(DESIGN_MODELS)}")
+
+    term_names, index_lists = design_model_terms(names, model)
+    existing = None
+    if existing_runs:
+        rows = np.array([[float(row[f]) for f in names] for row in existing_runs])
+        existing = 2.0 * (rows - lower) / (upper - lower) - 1.0
+    n_total = runs + (0 if existing is None else len(existing))
+    if runs < 1 or n_total < len(term_names) + 1:
+        raise ValueError(f"The {model} model has {len(term_names) + 1} parameters; the design needs at least that many runs")
+    if not 2 <= levels <= 21:
+        raise ValueError("'levels' must be between 2 and 21")
+    squared = [name for name, index in zip(term_names, index_lists) if len(set(index)) < len(index)]
+    if squared and levels < 3:
+        raise ValueError(f"The {model} model has squared terms {squared}; the design needs 'levels' of at least 3")
+
+    coded, info = coordinate_exchange(index_lists, len(names), runs, criterion=criterion, existing=existing,
+                                      levels=levels, starts=starts, seed=seed, time_budget=time_budget)
+    uncoded = lower + (coded + 1.0) / 2.0 * (upper - lower)
+    return {
+        "factors": {f: [float(lo), float(hi)] for f, lo, hi in zip(names, lower, upper)},
+        "model_terms": term_names,
+        "criterion": criterion,
+        "runs": int(runs),
+        "existing_runs": 0 if existing is None else int(len(existing)),
+        "design": [dict(zip(names, (float(v) for v in row))) for row in uncoded],
+        "efficiency": {
+            "d_efficiency": info["d_efficiency"],
+            "log_determinant": info["log_determinant"],
+            "average_prediction_variance": info["average_prediction_variance"]
+        },
+        "search": {key: info[key] for key in ("starts", "passes", "exchanges", "timed_out")}
+    }
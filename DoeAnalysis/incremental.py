@@ -0,0 +1,237 @@
+import json
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.stats import f as f_dist
+from scipy.stats import t as t_dist
+
+from .prediction import coded_design
+from .regression import logworth_from_p
+
+# Model-record fields an analysis session carries over unchanged
+SESSION_MODEL_FIELDS = ("predictors", "scaler_mean", "scaler_scale", "columns", "factors", "factor_ranges")
+
+
+def group_key(values):
+    """Lack-of-fit group key of one run's uncoded factor settings"""
+    return json.dumps([float(v) for v in values])
+
+
+def _accumulate(state, values, Y, load_groups=None):
+    """
+    Add rows (uncoded factor values m x d, responses m x k) to the sufficient statistics
+
+    Rows are collapsed to their distinct factor settings first, so X'X and X'Y
+    cost one product over the settings weighted by their replicate counts.
+    load_groups(keys) returns the stored [count, sums...] entries of those
+    settings (None: a new state with no groups). Only the touched groups are
+    read and updated; they are left in state["groups"] for the caller to store.
+    """
+    Ys = Y - np.asarray(state["shift"])
+    k = Ys.shape[1]
+    settings, inverse = np.unique(values, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(settings))
+    sums = np.zeros((len(settings), k))
+    np.add.at(sums, inverse, Ys)
+
+    X = coded_design(state["model"], settings)
+    state["n"] += len(Y)
+    state["xtx"] = (np.asarray(state["xtx"]) + X.T @ (X * counts[:, None])).tolist()
+    state["xty"] = (np.asarray(state["xty"]) + X.T @ sums).tolist()
+    state["yty"] = (np.asarray(state["yty"]) + (Ys ** 2).sum(axis=0)).tolist()
+    state["ysum"] = (np.asarray(state["ysum"]) + sums.sum(axis=0)).tolist()
+    state["y_min"] = np.minimum(state["y_min"], Y.min(axis=0)).tolist()
+    state["y_max"] = np.maximum(state["y_max"], Y.max(axis=0)).tolist()
+    ranges = state["model"]["factor_ranges"]
+    for i, p in enumerate(state["model"]["predictors"]):
+        ranges[p] = [min(ranges[p][0], float(values[:, i].min())), max(ranges[p][1], float(values[:, i].max()))]
+
+    # Groups hold [count, sum y...] per distinct factor setting; between = sum over groups of
+    # (sum y)^2 / count is all lack of fit needs, and changes only through the touched groups
+    keys = [group_key(setting) for setting in settings]
+    stored = load_groups(keys) if load_groups is not None else {}
+    between = np.asarray(state["between"], dtype=float)
+    groups = {}
+    for g, key in enumerate(keys):
+        entry = stored.get(key)
+        if entry is None:
+            entry = [0] + [0.0] * k
+            state["n_groups"] += 1
+        else:
+            between -= np.asarray(entry[1:]) ** 2 / entry[0]
+        entry = [entry[0] + int(counts[g])] + [a + float(b) for a, b in zip(entry[1:], sums[g])]
+        between += np.asarray(entry[1:]) ** 2 / entry[0]
+        groups[key] = entry
+    state["between"] = between.tolist()
+    state["groups"] = groups
+
+
+def build_session_state(record, values, Y):
+    """
+    Sufficient statistics of a registered model's data, for incremental updates
+
+    Keeps X'X, X'Y, the response sums and sums of squares and the lack-of-fit
+    group sums (state["groups"], stored apart from the rest). Responses are
+    stored shifted by their initial means so Y'Y stays well conditioned.
+    values are the uncoded factor settings (n x d) and Y the responses (n x k)
+    of the rows the model was fit on.
+    """
+    Y = np.asarray(Y, dtype=float)
+    p = len(record["columns"])
+    k = Y.shape[1]
+    state = {
+        "model": {field: json.loads(json.dumps(record[field])) for field in SESSION_MODEL_FIELDS},
+        "responses": list(record["responses"]),
+        "shift": Y.mean(axis=0).tolist(),
+        "n": 0,
+        "xtx": np.zeros((p, p)).tolist(),
+        "xty": np.zeros((p, k)).tolist(),
+        "yty": np.zeros(k).tolist(),
+        "ysum": np.zeros(k).tolist(),
+        "y_min": Y.min(axis=0).tolist(),
+        "y_max": Y.max(axis=0).tolist(),
+        "n_groups": 0,
+        "between": np.zeros(k).tolist(),
+        "groups": {}
+    }
+    _accumulate(state, np.asarray(values, dtype=float), Y)
+    return state
+
+
+def append_rows(state, values, Y, load_groups):
+    """
+    Add new runs to a session state in place, in time proportional to the new rows
+
+    load_groups(keys) returns the stored entries of the touched factor
+    settings; the updated entries are left in state["groups"].
+    """
+    _accumulate(state, np.asarray(values, dtype=float), np.asarray(Y, dtype=float), load_groups)
+
+
+def _lack_of_fit(state, sse, df_model):
+    """
+    JMP-style lack-of-fit tables for every response from the group sums
+
+    Pure error is sum y^2 - sum over groups of (sum y)^2 / count and lack of
+    fit the rest of the SSE, so no pass over the groups is needed.
+    """
+    k = len(state["responses"])
+    n_groups = state["n_groups"]
+    ss_pure = np.maximum(np.asarray(state["yty"]) - np.asarray(state["between"]), 0.0)
+    ss_lack = np.maximum(sse - ss_pure, 0.0)
+    df_lack = n_groups - df_model - 1
+    df_pure = state["n"] - n_groups
+
+    out = []
+    for j in range(k):
+        ms_lack = ms_pure = F_lof = p_lof = None
+        if df_lack > 0 and df_pure > 0:
+            ms_lack = ss_lack[j] / df_lack
+            ms_pure = ss_pure[j] / df_pure
+            F_lof = ms_lack / ms_pure if ms_pure > 0 else None
+            p_lof = float(f_dist.sf(F_lof, df_lack, df_pure)) if F_lof is not None else None
+        out.append({
+            "lack_of_fit": {
+                "df": int(df_lack) if df_lack > 0 else None,
+                "ss": float(ss_lack[j]),
+                "ms": float(ms_lack) if ms_lack is not None else None
+            },
+            "pure_error": {
+                "df": int(df_pure) if df_pure > 0 else None,
+                "ss": float(ss_pure[j]),
+                "ms": float(ms_pure) if ms_pure is not None else None
+            },
+            "total_error": {
+                "df": int(df_lack + df_pure) if df_lack > 0 and df_pure > 0 else None,
+                "ss": float(ss_lack[j] + ss_pure[j])
+            },
+            "f_ratio": float(F_lof) if F_lof is not None else None,
+            "prob_f": p_lof
+        })
+    return out
+
+
+def session_fit(state):
+    """
+    Refit every response from the sufficient statistics alone
+
+    Costs one p x p Cholesky factorization, independent of the number of runs
+    and of distinct factor settings. Returns the model blocks per response
+    (summary of fit, Type III ANOVA, coded parameters, lack of fit) and a
+    model record for the registry.
+    """
+    xtx = np.asarray(state["xtx"])
+    xty = np.asarray(state["xty"])
+    shift = np.asarray(state["shift"])
+    n = state["n"]
+    p = xtx.shape[0]
+    columns = state["model"]["columns"]
+
+    factor = cho_factor(xtx)
+    coefficients = cho_solve(factor, xty)
+    xtx_inv = cho_solve(factor, np.eye(p))
+    sse = np.maximum(np.asarray(state["yty"]) - (coefficients * xty).sum(axis=0), 0.0)
+    ysum = np.asarray(state["ysum"])
+    tss = np.asarray(state["yty"]) - ysum ** 2 / n
+    df_resid = n - p
+    df_model = p - 1
+    mse = sse / df_resid if df_resid > 0 else np.full(sse.shape, np.nan)
+
+    # Report coefficients on the original response scale; only the intercept moves
+    reported = coefficients.copy()
+    if columns and columns[0] == "Intercept":
+        reported[0] += shift
+    xtx_inv_diag = np.diag(xtx_inv)
+    std_errors = np.sqrt(np.outer(xtx_inv_diag, mse))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_values = reported / std_errors
+    p_values = 2 * t_dist.sf(np.abs(t_values), df_resid) if df_resid > 0 else np.full(t_values.shape, np.nan)
+    logworth = logworth_from_p(np.nan_to_num(p_values, nan=1.0))
+    lack_of_fit = _lack_of_fit(state, sse, df_model)
+
+    models = {}
+    for j, y in enumerate(state["responses"]):
+        r_squared = 1.0 - sse[j] / tss[j] if tss[j] > 0 else None
+        models[y] = {
+            "summary_of_fit": {
+                "r_squared": float(r_squared) if r_squared is not None else None,
+                "adjusted_r_squared": float(1.0 - (1.0 - r_squared) * (n - 1) / df_resid) if r_squared is not None and df_resid > 0 else None,
+                "rmse": float(np.sqrt(mse[j])),
+                "mean_response": float(shift[j] + ysum[j] / n),
+                "observations": int(n)
+            },
+            # Every term has one degree of freedom, so the Type III F test is t squared
+            "anova_table": [{
+                "Factor": term,
+                "sum_sq": float(reported[i, j] ** 2 / xtx_inv_diag[i]),
+                "df": 1.0,
+                "F": float(t_values[i, j] ** 2),
+                "PR(>F)": float(p_values[i, j]),
+                "LogWorth": float(logworth[i, j])
+            } for i, term in enumerate(columns)],
+            "coded_parameters": {term: {
+                "coefficient": float(reported[i, j]),
+                "std_error": float(std_errors[i, j]),
+                "t_value": float(t_values[i, j]),
+                "p_value": float(p_values[i, j]),
+                "logworth": float(logworth[i, j])
+            } for i, term in enumerate(columns)},
+            "lack_of_fit": lack_of_fit[j]
+        }
+
+    record = dict(
+        {field: state["model"][field] for field in SESSION_MODEL_FIELDS},
+        xtx_inv=xtx_inv.tolist(),
+        df_resid=int(df_resid),
+        observations=int(n),
+        responses={
+            y: {
+                "coefficients": reported[:, j].tolist(),
+                "mse": float(mse[j]) if df_resid > 0 else None,
+                "observed_range": [state["y_min"][j], state["y_max"][j]]
+            }
+            for j, y in enumerate(state["responses"])
+        }
+    )
+    return models, record
@@ -0,0 +1,308 @@
+import gzip
+import io
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Upper bound on the files one request may name, after brace expansion
+MAX_SOURCES = 256
+
+# Concurrent downloads per request; also the connection pool size per host
+MAX_FETCH_WORKERS = 8
+
+# Read size when streaming a download against its byte cap
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Transient failures (connection errors, 429 and 5xx) are retried with exponential backoff
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.2
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Directories (e.g. blob-storage mounts) that local file paths may be read from, separated
+# by os.pathsep; local paths are refused while DOE_DATA_ROOTS is unset
+DATA_ROOTS_ENV = "DOE_DATA_ROOTS"
+LOCAL_FORMATS = {
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow",
+    ".npy": "npy",
+    ".csv": "csv", ".csv.gz": "csv"
+}
+
+_BRACE = re.compile(r"\{([^{}]*)\}")
+_RANGE = re.compile(r"(-?\d+)\.\.(-?\d+)")
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _http_session():
+    """Process-wide pooled session, so repeated fetches reuse connections"""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            retry = Retry(
+                total=FETCH_RETRIES, backoff_factor=FETCH_BACKOFF, status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET",), raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=MAX_FETCH_WORKERS, pool_maxsize=MAX_FETCH_WORKERS,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSION = session
+        return _SESSION
+
+
+def expand_braces(pattern):
+    """
+    Expand shell-style braces: "day_{01..03}.csv" and "{a,b}.parquet"
+
+    Numeric ranges keep the zero padding of their first bound; braces without a
+    range or a comma are left as they are.
+    """
+    match = _BRACE.search(pattern)
+    if not match:
+        return [pattern]
+    prefix, body, suffix = pattern[:match.start()], match.group(1), pattern[match.end():]
+    bounds = _RANGE.fullmatch(body)
+    if bounds:
+        first, last = int(bounds.group(1)), int(bounds.group(2))
+        width = len(bounds.group(1)) if bounds.group(1).startswith("0") else 0
+        step = 1 if last >= first else -1
+        options = [str(i).zfill(width) for i in range(first, last + step, step)]
+    elif "," in body:
+        options = body.split(",")
+    else:
+        return [prefix + "{" + body + "}" + rest for rest in expand_braces(suffix)]
+    return [url for option in options for url in expand_braces(prefix + option + suffix)]
+
+
+def expand_sources(data):
+    """List of URLs named by a URL, a brace pattern or a list of either, without duplicates"""
+    patterns = [data] if isinstance(data, str) else list(data)
+    urls = list(dict.fromkeys(url for pattern in patterns for url in expand_braces(pattern)))
+    if len(urls) > MAX_SOURCES:
+        raise ValueError(f"Too many data sources: {len(urls)} > {MAX_SOURCES}")
+    bad = [url for url in urls if urlparse(url).scheme not in ("http", "https")]
+    if bad:
+        raise ValueError(f"Multi-source data must be http(s) URLs; got {bad[:3]}")
+    return urls
+
+
+def is_multi_source(data):
+    """True for a list of sources or a URL with a brace pattern"""
+    if isinstance(data, (list, tuple)):
+        return True
+    return isinstance(data, str) and data.startswith("http") and len(expand_braces(data)) > 1
+
+
+def read_frame(content, url):
+    """Parse downloaded bytes by the extension of the URL path (Parquet, gzip CSV or CSV)"""
+    path = urlparse(url).path.lower()
+    if path.endswith((".parquet", ".pq")):
+        return pd.read_parquet(io.BytesIO(content))
+    if path.endswith(".gz"):
+        with gzip.open(io.BytesIO(content), "rb") as f:
+            return pd.read_csv(f, encoding="utf-8-sig")
+    return pd.read_csv(io.BytesIO(content), encoding="utf-8-sig")
+
+
+def fetch_frame(url, max_file_size_mb=10, timeout=30):
+    """
+    Download and parse one source with the pooled, retrying session
+
+    The body is streamed in DOWNLOAD_CHUNK_BYTES chunks against a running byte
+    cap, after checking Content-Length when the server sends one, so an
+    oversized file is rejected without being held in memory.
+    """
+    max_bytes = max_file_size_mb * 1024 * 1024
+    try:
+        with _http_session().get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ValueError(f"File too large: {url} is {int(content_length) / (1024 * 1024):.1f}MB "
+                                 f"> {max_file_size_mb}MB")
+            chunks, received = [], 0
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ValueError(f"File too large: {url} is over {max_file_size_mb}MB")
+                chunks.append(chunk)
+    except requests.exceptions.RequestException as e:
+        raise ValueError(f"Failed to fetch data from URL {url}: {str(e)}")
+    try:
+        return read_frame(b"".join(chunks), url)
+    except Exception as e:
+        raise ValueError(f"Failed to parse data from URL {url}: {str(e)}")
+
+
+def align_frames(frames, urls, required_columns=()):
+    """
+    Concatenate per-source frames on a common schema
+
+    Keeps the columns every source has; a required column (a requested
+    predictor or response) that some sources have and others lack is an
+    error rather than silently dropped. Columns whose
+    numeric dtypes differ between sources are widened to float once, before
+    the single concatenation. Returns (frame, columns dropped).
+    """
+    required = [c for c in required_columns if any(c in frame.columns for frame in frames)]
+    missing = {url: [c for c in required if c not in frame.columns] for frame, url in zip(frames, urls)}
+    missing = {url: cols for url, cols in missing.items() if cols}
+    if missing:
+        url, cols = next(iter(missing.items()))
+        raise ValueError(f"Data source {url} is missing column(s) {cols} ({len(missing)} source(s) affected)")
+
+    common = [c for c in frames[0].columns if all(c in frame.columns for frame in frames[1:])]
+    dropped = sorted({c for frame in frames for c in frame.columns} - set(common))
+    widen = [
+        col for col in common
+        if len({frame[col].dtype for frame in frames}) > 1
+        and all(pd.api.types.is_numeric_dtype(frame[col]) for frame in frames)
+    ]
+    if widen:
+        frames = [frame.astype({col: float for col in widen}) for frame in frames]
+    df = pd.concat(frames, join="inner", ignore_index=True)
+    return (df if list(df.columns) == common else df[common]), dropped
+
+
+def load_sources(urls, required_columns=(), max_file_size_mb=10):
+    """
+    Fetch every source concurrently and concatenate them on a common schema
+
+    Downloads run on up to MAX_FETCH_WORKERS threads sharing one connection
+    pool, so the total latency is close to that of the slowest file. Returns
+    (frame, info) with the per-source row counts and the dropped columns.
+    """
+    start = time.perf_counter()
+    workers = min(MAX_FETCH_WORKERS, len(urls))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(lambda url: fetch_frame(url, max_file_size_mb), urls))
+    df, dropped = align_frames(frames, urls, required_columns)
+    if dropped:
+        logging.warning(f"Columns not present in every source were dropped: {dropped}")
+    return df, {
+        "sources": len(urls),
+        "rows_per_source": [len(frame) for frame in frames],
+        "columns_dropped": dropped,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+def data_roots():
+    """Resolved allow-listed directories for local file input"""
+    value = os.environ.get(DATA_ROOTS_ENV, "")
+    return [os.path.realpath(root) for root in value.split(os.pathsep) if root.strip()]
+
+
+def is_local_path(data):
+    """True for an absolute file path or a file:// URL (never for CSV text)"""
+    return isinstance(data, str) and "\n" not in data and data.startswith(("/", "file://"))
+
+
+def resolve_local_path(data, roots=None):
+    """
+    Validate a local path against the allow-list and return (real path, format)
+
+    Symlinks and ".." are resolved before the check, so a path cannot leave
+    its root. Raises ValueError for paths outside every root, missing files
+    and unsupported extensions.
+    """
+    roots = data_roots() if roots is None else roots
+    if not roots:
+        raise ValueError(f"Local file input is disabled; set {DATA_ROOTS_ENV} to the permitted directories")
+    path = os.path.realpath(data[len("file://"):] if data.startswith("file://") else data)
+    if not any(os.path.commonpath([path, root]) == root for root in roots):
+        raise ValueError(f"Path {data} is outside the permitted data roots")
+    if not os.path.isfile(path):
+        raise ValueError(f"Data file not found: {data}")
+    return path, local_format(path)
+
+
+def local_format(path):
+    """Reader of a local file ("parquet", "arrow", "npy" or "csv") from its extension"""
+    suffix = next((s for s in sorted(LOCAL_FORMATS, key=len, reverse=True) if path.lower().endswith(s)), None)
+    if suffix is None:
+        raise ValueError(f"Unsupported data file type: {path}. Use one of {sorted(LOCAL_FORMATS)}")
+    return LOCAL_FORMATS[suffix]
+
+
+def local_columns(path, fmt):
+    """Column names of a local file, read from its schema or header only"""
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path, memory_map=True).names
+    if fmt == "arrow":
+        import pyarrow as pa
+        return pa.ipc.open_file(pa.memory_map(path, "r")).schema.names
+    if fmt == "npy":
+        names = np.load(path, mmap_mode="r").dtype.names
+        if names is None:
+            raise ValueError(f"{path} must hold a structured array whose field names are the column names")
+        return list(names)
+    return list(pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns)
+
+
+def read_local_frame(path, fmt, columns=None):
+    """
+    Read the given columns (all when None) of a local file
+
+    Arrow IPC and .npy files are memory-mapped: only the projected columns are
+    paged in, and numeric columns without nulls are used in place rather than
+    copied. Parquet reads decode only the projected column chunks of a mapped
+    file; CSV files are parsed from a memory map keeping only those columns.
+    """
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if fmt == "arrow":
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas(split_blocks=True)
+    if fmt == "npy":
+        array = np.load(path, mmap_mode="r")
+        return pd.DataFrame({name: array[name] for name in (columns or array.dtype.names)}, copy=False)
+    return pd.read_csv(path, usecols=columns, encoding="utf-8-sig", memory_map=not path.lower().endswith(".gz"))
+
+
+def load_local(data, columns=None, roots=None):
+    """
+    Read an allow-listed local or mounted file, projected to the given columns
+
+    The file never passes through a Python string and only those of the
+    given columns that the file has are materialized, so files far larger
+    than memory can be analysed as long as their predictor and response
+    columns fit. Names the file lacks are skipped; the caller validates the
+    columns as it does for any other source. Returns (frame, info) with the
+    format, file size and the columns read.
+    """
+    start = time.perf_counter()
+    path, fmt = resolve_local_path(data, roots)
+    available = local_columns(path, fmt)
+    if columns is not None:
+        wanted = set(columns)
+        columns = [c for c in available if c in wanted]
+    try:
+        df = read_local_frame(path, fmt, columns)
+    except Exception as e:
+        raise ValueError(f"Failed to read data file {data}: {str(e)}")
+    return df, {
+        "sources": 1,
+        "format": fmt,
+        "file_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+        "columns_read": len(df.columns),
+        "columns_available": len(available),
+        "seconds": round(time.perf_counter() - start, 3)
+    }
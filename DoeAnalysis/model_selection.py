@@ -0,0 +1,580 @@
+import heapq
+import logging
+import numpy as np
+import pandas as pd
+from scipy.stats import f as f_dist
+from scipy.stats import t as t_dist
+from scipy.linalg import LinAlgError, cho_factor, cho_solve, solve_triangular
+
+from .regression import (
+    ALIAS_TOLERANCE, build_term_table, coefficient_tests, create_rsm_terms, design_matrix,
+    logworth_from_p, qr_fit, quote_term, term_matrix
+)
+
+MODEL_SELECTION_METHODS = ("auto", "threshold", "screening", "stepwise", "all_subsets")
+HEREDITY_RULES = ("strong", "weak")
+SUBSET_CRITERIA = ("aicc", "bic", "adj_r2")
+
+# All-subsets search is only offered for designs up to this many predictors
+ALL_SUBSETS_MAX_PREDICTORS = 6
+
+# Above this many predictors "auto" screens instead of fitting the full RSM
+AUTO_SCREENING_PREDICTORS = 6
+
+
+def resolve_model_selection(method, n_predictors, n_terms, n_obs):
+    """Pick the concrete model-selection method for "auto" requests"""
+    if method != "auto":
+        return method
+    if n_predictors > AUTO_SCREENING_PREDICTORS or n_terms + 1 >= n_obs:
+        return "screening"
+    return "threshold"
+
+
+def term_parents(term, term_table):
+    """Linear parent term names of a second-order term (empty for linear terms)"""
+    factors = term_table[term]
+    if len(factors) == 1:
+        return []
+    return list(dict.fromkeys(quote_term(p) for p in factors))
+
+
+class _ForwardBasis:
+    """
+    Orthonormal basis of the current model, grown one column at a time
+
+    Adding a term is a rank-one update of the thin QR factorization (one
+    Gram-Schmidt step with re-orthogonalization): the response residuals and
+    every remaining candidate column are projected off the new direction, so
+    scoring all candidates for all responses is one (m x n) @ (n x k) product.
+    """
+
+    def __init__(self, Y, candidates):
+        n = Y.shape[0]
+        q0 = np.full(n, 1.0 / np.sqrt(n))
+        self.n = n
+        self.basis = q0[:, None]
+        self.residuals = Y - np.outer(q0, q0 @ Y)
+        self.candidates = candidates - np.outer(q0, q0 @ candidates)
+        self.candidate_norms = np.maximum((candidates ** 2).sum(axis=0), 1e-300)
+        self.active = []
+
+    @property
+    def n_params(self):
+        return self.basis.shape[1]
+
+    def aliased(self, idx):
+        norms = (self.candidates[:, idx] ** 2).sum(axis=0)
+        return norms <= ALIAS_TOLERANCE * self.candidate_norms[idx]
+
+    def score(self, idx, parent_idx=None):
+        """
+        LogWorth of adding each candidate in idx, for every response (len(idx) x k)
+
+        parent_idx optionally names, per candidate, one missing parent (-1 for
+        none); the candidate is then scored given that parent, as it would be
+        once both have entered.
+        """
+        cols = self.candidates[:, idx]
+        extra = 0
+        if parent_idx is not None and (np.asarray(parent_idx) >= 0).any():
+            parent_idx = np.asarray(parent_idx)
+            has_parent = parent_idx >= 0
+            parents = self.candidates[:, parent_idx[has_parent]]
+            parent_norms = np.maximum((parents ** 2).sum(axis=0), 1e-300)
+            coef = (parents * cols[:, has_parent]).sum(axis=0) / parent_norms
+            cols = cols.copy()
+            cols[:, has_parent] -= parents * coef
+            extra = 1
+        norms = (cols ** 2).sum(axis=0)
+        df_new = self.n - self.n_params - 1 - extra
+        if df_new < 1:
+            return np.zeros((len(idx), self.residuals.shape[1]))
+        sse = (self.residuals ** 2).sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            reduction = (cols.T @ self.residuals) ** 2 / norms[:, None]
+            f_values = reduction / np.maximum(sse - reduction, 1e-300) * df_new
+        logworth = logworth_from_p(f_dist.sf(np.nan_to_num(f_values), 1, df_new))
+        logworth[self.aliased(idx)] = 0.0
+        return logworth
+
+    def add(self, j):
+        col = self.candidates[:, j].copy()
+        # Second Gram-Schmidt pass keeps the basis orthonormal in floating point
+        col -= self.basis @ (self.basis.T @ col)
+        col /= np.linalg.norm(col)
+        self.basis = np.hstack([self.basis, col[:, None]])
+        self.residuals -= np.outer(col, col @ self.residuals)
+        self.candidates -= np.outer(col, col @ self.candidates)
+        self.candidates[:, j] = 0.0
+        self.active.append(j)
+
+
+def _complete_case_arrays(df, predictors, response_vars):
+    """Predictor columns and response matrix restricted to rows complete in all of them"""
+    columns = {p: df[p].to_numpy(dtype=float) for p in predictors}
+    Y = df[response_vars].to_numpy(dtype=float)
+    mask = np.isfinite(Y).all(axis=1)
+    for col in columns.values():
+        mask &= np.isfinite(col)
+    columns = {p: col[mask] for p, col in columns.items()}
+    return columns, Y[mask], int(mask.sum())
+
+
+def _admissible(term, active_terms, term_table, heredity):
+    factors = term_table[term]
+    if len(factors) == 1:
+        return True
+    parents = term_parents(term, term_table)
+    present = [p in active_terms for p in parents]
+    if heredity == "strong":
+        return all(present)
+    # Weak heredity: interactions need one active parent, squares may enter with their parent
+    return any(present) or len(parents) == 1
+
+
+def screen_rsm_terms(df, predictors, response_vars, threshold, max_terms=None, heredity="weak"):
+    """
+    Staged forward screening of second-order terms across all responses
+
+    Stage 1 screens main effects only; stage 2 screens squares and two-factor
+    interactions admitted by the heredity rule. A term enters when its best
+    partial-F LogWorth over the responses reaches `threshold` after a Bonferroni
+    adjustment for the number of candidates and responses competing at that
+    step; missing parents enter with it so the model stays hierarchical. At
+    most `max_terms` terms (excluding the intercept) are admitted.
+
+    Returns (effect_table, info) where effect_table has one row per term of the
+    screened model (plus Intercept) and one LogWorth column per response.
+    """
+    term_table = build_term_table(predictors)
+    names = list(term_table)
+    index = {name: j for j, name in enumerate(names)}
+
+    columns, Y, n = _complete_case_arrays(df, predictors, response_vars)
+
+    if max_terms is None:
+        max_terms = max(len(predictors), (n - 1) // 2)
+    budget = int(max(1, min(max_terms, len(names), n - 2)))
+
+    candidates = term_matrix(columns, [term_table[t] for t in names])
+    basis = _ForwardBasis(Y, candidates)
+    active_terms = []
+    path = []
+
+    def run_stage(stage, stage_terms):
+        while len(active_terms) < budget:
+            pool = []
+            for term in stage_terms:
+                if term in active_terms or not _admissible(term, active_terms, term_table, heredity):
+                    continue
+                missing = [p for p in term_parents(term, term_table) if p not in active_terms]
+                if len(active_terms) + len(missing) + 1 > budget:
+                    continue
+                if basis.n - basis.n_params - len(missing) - 1 < 1:
+                    continue
+                pool.append(term)
+            if not pool:
+                return
+            missing_parent = []
+            for term in pool:
+                missing = [p for p in term_parents(term, term_table) if p not in active_terms]
+                missing_parent.append(index[missing[0]] if len(missing) == 1 else -1)
+            logworth = basis.score([index[t] for t in pool], missing_parent)
+            best_per_term = logworth.max(axis=1)
+            best = int(np.argmax(best_per_term))
+            # Bonferroni over the candidates and responses competing for this step
+            entry_logworth = threshold + np.log10(len(pool) * Y.shape[1])
+            if best_per_term[best] < entry_logworth:
+                return
+            term = pool[best]
+            for parent in term_parents(term, term_table):
+                if parent not in active_terms:
+                    basis.add(index[parent])
+                    active_terms.append(parent)
+                    path.append({"term": parent, "stage": stage, "reason": "heredity"})
+            basis.add(index[term])
+            active_terms.append(term)
+            path.append({
+                "term": term,
+                "stage": stage,
+                "reason": "entered",
+                "max_logworth": float(best_per_term[best]),
+                "entry_logworth": float(entry_logworth),
+                "significant_responses": int((logworth[best] > threshold).sum())
+            })
+
+    linear_terms = [t for t in names if len(term_table[t]) == 1]
+    second_order = [t for t in names if len(term_table[t]) == 2]
+    run_stage("main_effects", linear_terms)
+    stage1_active = list(active_terms)
+    run_stage("second_order", second_order)
+
+    if not active_terms:
+        logging.warning("Screening admitted no terms; falling back to main effects")
+        active_terms = linear_terms[:max(1, min(len(linear_terms), n - 2))]
+
+    X = design_matrix(columns, [term_table[t] for t in active_terms])
+    fit = qr_fit(X, Y)
+    tests = coefficient_tests(fit)
+
+    effect_table = pd.DataFrame({"Factor": ["Intercept"] + active_terms})
+    for k, y in enumerate(response_vars):
+        effect_table[y] = tests["logworth"][:, k]
+
+    info = {
+        "method": "screening",
+        "heredity": heredity,
+        "max_terms": budget,
+        "candidate_terms": len(names),
+        "observations": n,
+        "main_effects_active": stage1_active,
+        "selected_terms": active_terms,
+        "path": path
+    }
+    return effect_table, info
+
+
+def _delete_column(r, z, k):
+    """
+    Downdate a thin QR factorization after deleting column k
+
+    Only R and z = Q'y are kept: deleting the column leaves R upper Hessenberg
+    from column k on, and Givens rotations restore the triangle in O(p^2). The
+    component of z rotated out of the model is returned, since its square is the
+    increase in the residual sum of squares.
+    """
+    h = np.delete(r, k, axis=1)
+    z = z.copy()
+    p = h.shape[1]
+    for j in range(k, p):
+        a, b = h[j, j], h[j + 1, j]
+        radius = np.hypot(a, b)
+        if radius == 0.0:
+            continue
+        c, s = a / radius, b / radius
+        rows = h[[j, j + 1], j:]
+        h[j, j:] = c * rows[0] + s * rows[1]
+        h[j + 1, j:] = -s * rows[0] + c * rows[1]
+        z[j], z[j + 1] = c * z[j] + s * z[j + 1], -s * z[j] + c * z[j + 1]
+    return h[:p, :], z[:p], z[p]
+
+
+def _term_logworth(r, z, sse, df_resid):
+    """LogWorth of every coefficient of a triangular least-squares system"""
+    coefficients = solve_triangular(r, z)
+    r_inv = solve_triangular(r, np.eye(r.shape[0]))
+    std_errors = np.sqrt((r_inv ** 2).sum(axis=1) * sse / df_resid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_values = np.abs(coefficients / std_errors)
+    return logworth_from_p(2 * t_dist.sf(np.nan_to_num(t_values), df_resid))
+
+
+def _protected_terms(terms, term_table):
+    """Terms that are parents of another term still in the model"""
+    protected = set()
+    for term in terms:
+        protected.update(term_parents(term, term_table))
+    return protected
+
+
+def backward_eliminate(df, predictors, response_vars, threshold, start_terms=None):
+    """
+    Hierarchical stepwise backward elimination, run separately for each response
+
+    Starting from the RSM model (or start_terms), less any term aliased with
+    earlier ones, the least significant term that is not a parent of a
+    remaining term is removed while its LogWorth is below `threshold`. The
+    starting design is factorized once; each removal downdates that
+    response's R and Q'y with Givens rotations instead of refitting.
+
+    Returns (effect_table, info): effect_table holds the starting-model
+    LogWorths per response; info holds each response's removal path and final
+    terms, and the hierarchical union of the final terms as simplified_factors.
+    """
+    term_table = build_term_table(predictors)
+    terms = list(start_terms) if start_terms is not None else create_rsm_terms(predictors)
+    columns, Y, n = _complete_case_arrays(df, predictors, response_vars)
+
+    # Start terms aliased with earlier columns (e.g. squares of 2-level factors, which equal the
+    # intercept) are dropped; a column's R diagonal is its distance from the span of those before it
+    X = design_matrix(columns, [term_table[t] for t in terms])
+    diag = np.abs(np.diag(np.linalg.qr(X, mode="r")))
+    independent = diag > ALIAS_TOLERANCE * max(diag.max() if diag.size else 0.0, 1.0)
+    aliased = [term for term, keep in zip(terms, independent[1:]) if not keep]
+    if aliased:
+        terms = [term for term in terms if term not in aliased]
+        X = design_matrix(columns, [term_table[t] for t in terms])
+    if n <= X.shape[1]:
+        raise ValueError(f"Stepwise elimination needs more runs ({n}) than starting model parameters ({X.shape[1]})")
+    q, r = np.linalg.qr(X)
+    if np.abs(np.diag(r)).min() <= ALIAS_TOLERANCE * max(np.abs(np.diag(r)).max(), 1.0):
+        raise ValueError("Starting model for stepwise elimination is rank deficient")
+    qty = q.T @ Y
+    sse0 = ((Y - q @ qty) ** 2).sum(axis=0)
+
+    effect_table = pd.DataFrame({"Factor": ["Intercept"] + terms})
+    responses = {}
+    for k, y in enumerate(response_vars):
+        r_k, z_k, sse = r.copy(), qty[:, k].copy(), float(sse0[k])
+        current = list(terms)
+        path = []
+        logworth = _term_logworth(r_k, z_k, sse, n - len(current) - 1)
+        effect_table[y] = logworth
+
+        while current:
+            protected = _protected_terms(current, term_table)
+            eligible = [j for j, term in enumerate(current) if term not in protected]
+            if not eligible:
+                break
+            worst = min(eligible, key=lambda j: logworth[j + 1])
+            if logworth[worst + 1] >= threshold:
+                break
+            path.append({
+                "step": len(path) + 1,
+                "removed": current[worst],
+                "logworth": float(logworth[worst + 1])
+            })
+            r_k, z_k, rotated_out = _delete_column(r_k, z_k, worst + 1)
+            sse += float(rotated_out ** 2)
+            del current[worst]
+            logworth = _term_logworth(r_k, z_k, sse, n - len(current) - 1)
+
+        responses[y] = {
+            "removal_path": path,
+            "final_terms": current,
+            "final_logworth": {term: float(lw) for term, lw in zip(current, logworth[1:])}
+        }
+
+    retained = set()
+    for summary in responses.values():
+        retained.update(summary["final_terms"])
+        retained.update(_protected_terms(summary["final_terms"], term_table))
+
+    info = {
+        "method": "stepwise",
+        "starting_terms": terms,
+        "aliased_terms": aliased,
+        "observations": n,
+        "responses": responses,
+        "simplified_factors": sorted(retained)
+    }
+    return effect_table, info
+
+
+def _subset_criterion(criterion, rss, p, n, tss):
+    """
+    Model criterion summed over responses (smaller is better)
+
+    rss and tss are per-response arrays, p counts terms excluding the
+    intercept. Every criterion is non-decreasing in rss and in p, which is what
+    makes the branch-and-bound lower bounds valid.
+    """
+    rss = np.maximum(rss, 1e-300)
+    if criterion == "adj_r2":
+        if n - p - 1 <= 0:
+            return np.inf
+        return float(np.sum(rss / (n - p - 1) / (tss / (n - 1)) - 1.0))
+    k = p + 2  # coefficients plus intercept and error variance
+    if criterion == "bic":
+        return float(np.sum(n * np.log(rss / n) + k * np.log(n)))
+    if n - k - 1 <= 0:
+        return np.inf
+    return float(np.sum(n * np.log(rss / n) + 2 * k + 2 * k * (k + 1) / (n - k - 1)))
+
+
+def all_subsets_search(df, predictors, response_vars, criterion="aicc", top_models=10):
+    """
+    Branch-and-bound search over every hierarchical subset of the RSM terms
+
+    Candidate models are scored jointly over all responses from one shared
+    centered Gram matrix: the depth-first search grows a Cholesky factor of
+    the included terms by one row per decision, so each candidate's residual
+    sums of squares cost one triangular solve. A branch is pruned when the
+    criterion evaluated at its lowest possible RSS (every admissible remaining
+    term added) and its smallest possible size cannot beat the current
+    top_models-th best model.
+
+    Returns (effect_table, info) where effect_table holds the LogWorths of the
+    best model's terms per response and info ranks the best models.
+    """
+    if len(predictors) > ALL_SUBSETS_MAX_PREDICTORS:
+        raise ValueError(f"All-subsets search supports at most {ALL_SUBSETS_MAX_PREDICTORS} predictors")
+
+    term_table = build_term_table(predictors)
+    terms = create_rsm_terms(predictors)
+    position = {term: i for i, term in enumerate(terms)}
+    parents = [[position[p] for p in term_parents(term, term_table)] for term in terms]
+    columns, Y, n = _complete_case_arrays(df, predictors, response_vars)
+
+    T = term_matrix(columns, [term_table[t] for t in terms])
+    Tc = T - T.mean(axis=0)
+    Yc = Y - Y.mean(axis=0)
+    gram = Tc.T @ Tc
+    cross = Tc.T @ Yc
+    tss = (Yc ** 2).sum(axis=0)
+    m = len(terms)
+
+    best = []  # max-heap on criterion via negation: (-score, counter, terms, rss)
+    stats = {"evaluated": 0, "pruned": 0}
+    seen = set()
+
+    def completion_rss(included, start):
+        """RSS with every remaining term whose parents may still be included"""
+        chosen = set(included)
+        for i in range(start, m):
+            if all(p in chosen for p in parents[i]):
+                chosen.add(i)
+        idx = sorted(chosen)
+        if not idx:
+            return tss
+        g = gram[np.ix_(idx, idx)]
+        c = cross[idx]
+        try:
+            coef = cho_solve(cho_factor(g), c)
+        except LinAlgError:
+            coef = np.linalg.lstsq(g, c, rcond=None)[0]
+        return tss - (c * coef).sum(axis=0)
+
+    def exclude(completion, i):
+        """
+        Drop term i (and the children that lose their parent) from a completion
+
+        The completion is (terms, inverse Gram, coefficients, rss); dropping a
+        block g raises the RSS by b_g' [A_gg]^-1 b_g and downdates the inverse
+        with its Schur complement, so no factorization is repeated.
+        """
+        comp, inverse, coef, comp_rss = completion
+        drop = [k for k, j in enumerate(comp) if j == i or (j > i and i in parents[j])]
+        keep = [k for k in range(len(comp)) if k not in drop]
+        a_gg = inverse[drop][:, drop]
+        a_rg = inverse[keep][:, drop]
+        b_g = coef[drop]
+        solved = np.linalg.solve(a_gg, np.hstack([a_rg.T, b_g]))
+        gain = solved[:, len(keep):]
+        new_inverse = inverse[keep][:, keep] - a_rg @ solved[:, :len(keep)]
+        new_coef = coef[keep] - a_rg @ gain
+        new_rss = comp_rss + (b_g * gain).sum(axis=0)
+        return [comp[k] for k in keep], new_inverse, new_coef, new_rss
+
+    def record(included, rss):
+        if tuple(included) in seen:
+            return
+        stats["evaluated"] += 1
+        score = _subset_criterion(criterion, rss, len(included), n, tss)
+        if not np.isfinite(score):
+            return
+        entry = (-score, stats["evaluated"], tuple(included), rss.copy())
+        if len(best) < top_models:
+            heapq.heappush(best, entry)
+        elif score < -best[0][0]:
+            heapq.heapreplace(best, entry)
+
+    def cutoff():
+        return -best[0][0] if len(best) >= top_models else np.inf
+
+    def include(i, included, chol, weights, rss):
+        """Grow the Cholesky factor of the included terms by term i (None if aliased)"""
+        g = gram[included, i]
+        l = solve_triangular(chol, g, lower=True) if included else np.zeros(0)
+        d2 = gram[i, i] - l @ l
+        if d2 <= ALIAS_TOLERANCE * max(gram[i, i], 1e-300):
+            return None
+        d = np.sqrt(d2)
+        w = (cross[i] - l @ weights) / d
+        size = len(included)
+        new_chol = np.zeros((size + 1, size + 1))
+        new_chol[:size, :size] = chol
+        new_chol[size, :size] = l
+        new_chol[size, size] = d
+        return new_chol, np.vstack([weights, w]), rss - w ** 2
+
+    # Penalized criteria favour small models, so explore exclusions first to tighten the cutoff early
+    exclude_first = criterion != "adj_r2"
+
+    def search(i, included, chol, weights, rss, completion):
+        if i == m:
+            record(included, rss)
+            return
+        lowest_rss = completion[3] if completion is not None else completion_rss(included, i)
+        if _subset_criterion(criterion, lowest_rss, len(included), n, tss) >= cutoff():
+            stats["pruned"] += 1
+            return
+
+        branches = []
+        if all(p in included for p in parents[i]):
+            grown = include(i, included, chol, weights, rss)
+            if grown is not None:
+                # Including a term leaves the completion unchanged
+                branches.append((included + [i],) + grown + (completion,))
+        branches.insert(0 if exclude_first else len(branches), "exclude")
+
+        for branch in branches:
+            if branch == "exclude":
+                dropped = exclude(completion, i) if completion is not None else None
+                search(i + 1, included, chol, weights, rss, dropped)
+            else:
+                search(i + 1, *branch)
+
+    # Seed the cutoff with the hierarchical greedy forward path so pruning starts strong
+    included, chol, weights, rss = [], np.zeros((0, 0)), np.zeros((0, Y.shape[1])), tss.astype(float).copy()
+    while True:
+        options = []
+        for i in range(m):
+            if i in included or not all(p in included for p in parents[i]):
+                continue
+            grown = include(i, included, chol, weights, rss)
+            if grown is not None:
+                options.append((grown[2].sum(), i, grown))
+        if not options:
+            break
+        _, i, (chol, weights, rss) = min(options, key=lambda option: option[0])
+        included = included + [i]
+        record(sorted(included), rss)
+        seen.add(tuple(sorted(included)))
+
+    root = None
+    try:
+        inverse = np.linalg.inv(gram)
+        if np.isfinite(inverse).all() and np.linalg.cond(gram) < 1e12:
+            coef = inverse @ cross
+            root = (list(range(m)), inverse, coef, tss - (cross * coef).sum(axis=0))
+    except np.linalg.LinAlgError:
+        pass
+    if root is None:
+        logging.info("Full RSM Gram matrix is ill-conditioned; bounding branches with direct solves")
+    search(0, [], np.zeros((0, 0)), np.zeros((0, Y.shape[1])), tss.astype(float).copy(), root)
+    if not best:
+        raise ValueError("No hierarchical subset could be scored with the available runs")
+
+    ranked = sorted(best, key=lambda entry: -entry[0])
+    models = []
+    for neg_score, _, included, rss in ranked:
+        p = len(included)
+        r2 = 1 - rss / tss
+        adj = 1 - (rss / max(n - p - 1, 1)) / (tss / (n - 1))
+        models.append({
+            "terms": [terms[i] for i in included],
+            "criterion": -neg_score,
+            "responses": {y: {"rss": float(rss[k]), "r_squared": float(r2[k]), "adjusted_r_squared": float(adj[k])}
+                          for k, y in enumerate(response_vars)}
+        })
+
+    best_terms = models[0]["terms"]
+    X = design_matrix(columns, [term_table[t] for t in best_terms])
+    tests = coefficient_tests(qr_fit(X, Y))
+    effect_table = pd.DataFrame({"Factor": ["Intercept"] + best_terms})
+    for k, y in enumerate(response_vars):
+        effect_table[y] = tests["logworth"][:, k]
+
+    info = {
+        "method": "all_subsets",
+        "criterion": criterion,
+        "candidate_terms": m,
+        "observations": n,
+        "models_evaluated": stats["evaluated"],
+        "branches_pruned": stats["pruned"],
+        "best_models": models,
+        "simplified_factors": sorted(best_terms)
+    }
+    return effect_table, info
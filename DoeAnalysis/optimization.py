@@ -0,0 +1,151 @@
+import numpy as np
+
+from .prediction import coded_design
+
+DESIRABILITY_GOALS = ("maximize", "minimize", "target")
+
+
+def factor_bounds(record, factor_ranges=None):
+    """
+    Lower and upper uncoded bounds for every predictor of a registered model
+
+    Defaults to the observed factor ranges; factor_ranges overrides them per
+    predictor with [low, high]. Raises ValueError for unknown or empty ranges.
+    """
+    ranges = dict(record["factor_ranges"])
+    for name, bounds in (factor_ranges or {}).items():
+        if name not in ranges:
+            raise ValueError(f"Unknown factor in factor_ranges: '{name}'")
+        ranges[name] = bounds
+    lower = np.array([float(ranges[p][0]) for p in record["predictors"]])
+    upper = np.array([float(ranges[p][1]) for p in record["predictors"]])
+    if not (np.isfinite(lower).all() and np.isfinite(upper).all()) or (upper < lower).any():
+        raise ValueError("Factor ranges must be finite [low, high] pairs")
+    return lower, upper
+
+
+def parse_goals(record, goals):
+    """
+    Validate per-response desirability goals against a registered model
+
+    Each goal is {"goal": "maximize" | "minimize" | "target", "lower", "upper",
+    "target", "weight", "importance"}. lower/upper default to the observed
+    response range and target to its midpoint. Returns a list of dicts.
+    """
+    if not goals:
+        raise ValueError("At least one response goal is required")
+    parsed = []
+    for response, spec in goals.items():
+        if response not in record["responses"]:
+            raise ValueError(f"Unknown response in goals: '{response}'. Model responses are {list(record['responses'])}")
+        goal = spec.get("goal", "target")
+        if goal not in DESIRABILITY_GOALS:
+            raise ValueError(f"Goal for '{response}' must be one of {list(DESIRABILITY_GOALS)}")
+        observed = record["responses"][response].get("observed_range") or [None, None]
+        lower = spec.get("lower", observed[0])
+        upper = spec.get("upper", observed[1])
+        if lower is None or upper is None or float(upper) <= float(lower):
+            raise ValueError(f"Goal for '{response}' needs lower < upper")
+        lower, upper = float(lower), float(upper)
+        target = float(spec.get("target", (lower + upper) / 2))
+        if goal == "target" and not lower < target < upper:
+            raise ValueError(f"Target for '{response}' must lie strictly between lower and upper")
+        parsed.append({
+            "response": response,
+            "index": list(record["responses"]).index(response),
+            "goal": goal,
+            "lower": lower,
+            "upper": upper,
+            "target": target,
+            "weight": float(spec.get("weight", 1.0)),
+            "importance": float(spec.get("importance", 1.0))
+        })
+    return parsed
+
+
+def response_desirability(predicted, goal):
+    """Derringer-Suich desirability in [0, 1] of one response's predictions"""
+    lower, upper, weight = goal["lower"], goal["upper"], goal["weight"]
+    if goal["goal"] == "maximize":
+        d = (predicted - lower) / (upper - lower)
+    elif goal["goal"] == "minimize":
+        d = (upper - predicted) / (upper - lower)
+    else:
+        target = goal["target"]
+        d = np.where(predicted <= target,
+                     (predicted - lower) / (target - lower),
+                     (upper - predicted) / (upper - target))
+    return np.clip(d, 0.0, 1.0) ** weight
+
+
+def overall_desirability(record, goals, points):
+    """
+    Overall desirability at uncoded points (m x n_predictors)
+
+    Returns (D, d) where D is the importance-weighted geometric mean (m,) and d
+    the individual desirabilities (m x n_goals).
+    """
+    indices = [goal["index"] for goal in goals]
+    predicted = coded_design(record, points) @ record["_coefficients"][:, indices]
+    d = np.column_stack([response_desirability(predicted[:, j], goal) for j, goal in enumerate(goals)])
+    importance = np.array([goal["importance"] for goal in goals])
+    with np.errstate(divide="ignore"):
+        log_d = np.log(d)
+    overall = np.exp((log_d * importance).sum(axis=1) / importance.sum())
+    return overall, d
+
+
+def optimize_desirability(record, goals, lower, upper, starts=32, candidates=2048, seed=0,
+                          tolerance=1e-4, max_iterations=200):
+    """
+    Maximize overall desirability inside the factor box by multi-start compass search
+
+    A random candidate pool is scored in one batch and its best points seed
+    the starts. Every iteration then scores all 2 x n_predictors compass moves
+    of every start together; a start moves to its best improving neighbour or
+    halves its step, until all steps fall below tolerance of the factor ranges.
+    """
+    rng = np.random.default_rng(seed)
+    n_factors = len(lower)
+    width = np.where(upper > lower, upper - lower, 0.0)
+
+    pool = lower + width * rng.random((candidates, n_factors))
+    pool = np.vstack([pool, (lower + upper) / 2])
+    pool_scores, _ = overall_desirability(record, goals, pool)
+    order = np.argsort(-pool_scores)[:starts]
+    x = pool[order]
+    scores = pool_scores[order]
+    evaluations = len(pool)
+
+    step = np.tile(0.25 * width, (len(x), 1))
+    directions = np.vstack([np.eye(n_factors), -np.eye(n_factors)])
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        active = (step > tolerance * np.maximum(width, 1e-300)).any(axis=1)
+        if not active.any():
+            break
+        trials = np.clip(x[:, None, :] + directions[None, :, :] * step[:, None, :], lower, upper)
+        trial_scores, _ = overall_desirability(record, goals, trials.reshape(-1, n_factors))
+        trial_scores = trial_scores.reshape(len(x), len(directions))
+        evaluations += trial_scores.size
+
+        best = trial_scores.argmax(axis=1)
+        best_scores = trial_scores[np.arange(len(x)), best]
+        improved = active & (best_scores > scores + 1e-12)
+        x[improved] = trials[improved, best[improved]]
+        scores[improved] = best_scores[improved]
+        step[active & ~improved] *= 0.5
+
+    winner = int(scores.argmax())
+    _, individual = overall_desirability(record, goals, x[winner:winner + 1])
+    return {
+        "settings": x[winner],
+        "desirability": float(scores[winner]),
+        "response_desirability": {goal["response"]: float(individual[0, j]) for j, goal in enumerate(goals)},
+        "search": {
+            "starts": int(len(x)),
+            "candidates": int(candidates),
+            "iterations": iterations,
+            "evaluations": int(evaluations)
+        }
+    }
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import t as t_dist
+
+from .regression import term_matrix
+
+
+def settings_matrix(record, settings):
+    """
+    Uncoded factor settings as an (m x n_predictors) array in the model's predictor order
+
+    settings may be a list of {predictor: value} rows, a {predictor: [values]}
+    mapping or a DataFrame. Raises ValueError for missing or non-numeric predictors.
+    """
+    frame = settings if isinstance(settings, pd.DataFrame) else pd.DataFrame(settings)
+    missing = [p for p in record["predictors"] if p not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing factor setting(s): {missing}")
+    values = frame[record["predictors"]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    if not np.isfinite(values).all():
+        raise ValueError("Factor settings must be finite numbers")
+    return values
+
+
+def coded_design(record, values):
+    """Design matrix (m x p) of the model columns at uncoded settings (m x n_predictors)"""
+    coded = (values - np.asarray(record["scaler_mean"])) / np.asarray(record["scaler_scale"])
+    columns = {p: coded[:, i] for i, p in enumerate(record["predictors"])}
+    design = np.ones((len(values), len(record["columns"])))
+    terms = [j for j, factors in enumerate(record["factors"]) if factors]
+    if terms:
+        design[:, terms] = term_matrix(columns, [record["factors"][j] for j in terms])
+    return design
+
+
+def predict_responses(record, values, responses=None, confidence_level=0.95):
+    """
+    Predictions with confidence and prediction intervals at many settings at once
+
+    The predictions of every response are one (m x p) @ (p x k) product, and
+    the standard error of the fitted mean is sqrt(mse * d'(X'X)^-1 d) for every
+    design row d, evaluated together as a row-wise quadratic form.
+    """
+    names = list(record["responses"])
+    responses = names if responses is None else responses
+    design = coded_design(record, values)
+    predicted = design @ record["_coefficients"]
+    leverage = np.einsum("ij,jk,ik->i", design, record["_xtx_inv"], design)
+    df_resid = record["df_resid"]
+    t_crit = t_dist.ppf(0.5 + confidence_level / 2, df_resid) if df_resid > 0 else np.nan
+
+    out = {}
+    for y in responses:
+        k = names.index(y)
+        mse = record["responses"][y]["mse"]
+        result = {"predicted": predicted[:, k].tolist()}
+        if mse is not None:
+            half_ci = t_crit * np.sqrt(mse * leverage)
+            half_pi = t_crit * np.sqrt(mse * (1.0 + leverage))
+            result.update({
+                "ci_lower": (predicted[:, k] - half_ci).tolist(),
+                "ci_upper": (predicted[:, k] + half_ci).tolist(),
+                "pi_lower": (predicted[:, k] - half_pi).tolist(),
+                "pi_upper": (predicted[:, k] + half_pi).tolist()
+            })
+        out[y] = result
+    return out
@@ -0,0 +1,156 @@
+import logging
+import warnings
+import weakref
+import numpy as np
+import pandas as pd
+
+# Columns with at most this many distinct values get a level table
+MAX_PROFILE_LEVELS = 20
+
+# Rows of each non-numeric column hashed into the profile cache fingerprint
+FINGERPRINT_SAMPLE_ROWS = 64
+
+_PROFILE_CACHE = {}
+
+
+def _is_numeric_dtype(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def build_column_profile(df, max_levels=MAX_PROFILE_LEVELS):
+    """
+    Build a column profile for a dataset in a single pass over the data
+
+    All numeric columns are profiled together from one sorted float block, so
+    cardinality, null count, min/max/mean/std and the level table come out of
+    the same scan. Non-numeric columns are profiled from one value_counts each.
+    """
+    profile = {}
+    columns = list(df.columns)
+    numeric_cols = [col for col in columns if _is_numeric_dtype(df[col].dtype)]
+
+    if numeric_cols:
+        block = df[numeric_cols].to_numpy(dtype=float, copy=True)
+        valid = ~np.isnan(block)
+        null_counts = len(block) - valid.sum(axis=0)
+        # All-NaN columns warn here; their statistics are reported as None below
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means = np.nanmean(block, axis=0) if len(block) else np.full(len(numeric_cols), np.nan)
+            stds = np.nanstd(block, axis=0, ddof=1) if len(block) > 1 else np.full(len(numeric_cols), np.nan)
+        # NaNs sort to the end, so distinct values are the non-NaN value changes
+        block.sort(axis=0)
+        n_valid = len(block) - null_counts
+        if len(block):
+            changes = (block[1:] != block[:-1]) & ~np.isnan(block[1:])
+            nunique = (n_valid > 0).astype(int) + changes.sum(axis=0)
+        else:
+            nunique = np.zeros(len(numeric_cols), dtype=int)
+
+        for j, col in enumerate(numeric_cols):
+            count = int(n_valid[j])
+            info = {
+                "dtype": str(df[col].dtype),
+                "is_numeric": True,
+                "is_categorical": False,
+                "nunique": int(nunique[j]),
+                "null_count": int(null_counts[j]),
+                "min": float(block[0, j]) if count else None,
+                "max": float(block[count - 1, j]) if count else None,
+                "mean": float(means[j]) if count else None,
+                "std": float(stds[j]) if count > 1 else None,
+                "levels": None
+            }
+            if 0 < info["nunique"] <= max_levels:
+                values, counts = np.unique(block[:count, j], return_counts=True)
+                info["levels"] = {float(v): int(c) for v, c in zip(values, counts)}
+            profile[col] = info
+
+    for col in columns:
+        if col in profile:
+            continue
+        series = df[col]
+        counts = series.value_counts(dropna=True, sort=False)
+        info = {
+            "dtype": str(series.dtype),
+            "is_numeric": False,
+            "is_categorical": (pd.api.types.is_object_dtype(series.dtype)
+                               or pd.api.types.is_string_dtype(series.dtype)
+                               or isinstance(series.dtype, pd.CategoricalDtype)),
+            "nunique": int(len(counts)),
+            "null_count": int(series.isna().sum()),
+            "min": None,
+            "max": None,
+            "mean": None,
+            "std": None,
+            "levels": None
+        }
+        if 0 < info["nunique"] <= max_levels:
+            info["levels"] = {str(k): int(v) for k, v in counts.items()}
+        profile[col] = info
+
+    return profile
+
+
+def content_fingerprint(df):
+    """
+    Cheap per-column checksum of a DataFrame's values
+
+    Fixed-width numeric columns are summed as unsigned integers of their raw
+    bits (one pass, no hashing or sorting), so changing any single numeric
+    value changes the checksum. Hashing text costs far more, so other columns
+    only hash FINGERPRINT_SAMPLE_ROWS evenly spaced rows: an in-place edit of
+    an unsampled text value is not detected.
+    """
+    rows = np.unique(np.linspace(0, len(df) - 1, min(len(df), FINGERPRINT_SAMPLE_ROWS)).astype(int))
+    sums = []
+    for _, series in df.items():
+        values = series.to_numpy() if isinstance(series.dtype, np.dtype) else None
+        if values is not None and values.dtype.kind in "biufmM" and values.dtype.itemsize in (1, 2, 4, 8):
+            values = np.ascontiguousarray(values)
+            sums.append(int(values.view(f"u{values.dtype.itemsize}").sum(dtype=np.uint64)))
+        else:
+            sums.append(int(pd.util.hash_pandas_object(series.iloc[rows], index=False).to_numpy().sum()))
+    return tuple(sums)
+
+
+def get_column_profile(df):
+    """
+    Return the cached column profile for a DataFrame, building it on first use
+
+    The profile is cached alongside the frame (keyed by object identity and
+    dropped when the frame is garbage collected), so predictor detection,
+    sampling and validation all read the same single-pass statistics. The
+    cache entry also records the shape, columns, dtypes and
+    content_fingerprint, so a frame edited in place (df.loc[...] = ...) is
+    profiled again; edits to unsampled rows of text columns are the exception.
+    """
+    key = id(df)
+    signature = (df.shape, tuple(df.columns), tuple(map(str, df.dtypes)), content_fingerprint(df))
+    cached = _PROFILE_CACHE.get(key)
+    if cached is not None:
+        ref, cached_signature, profile = cached
+        if ref() is df and cached_signature == signature:
+            return profile
+
+    profile = build_column_profile(df)
+    try:
+        ref = weakref.ref(df)
+        weakref.finalize(df, _PROFILE_CACHE.pop, key, None)
+    except TypeError:
+        logging.warning("Column profile cannot be cached for this object")
+        return profile
+    _PROFILE_CACHE[key] = (ref, signature, profile)
+    return profile
+
+
+def numeric_columns(profile, exclude=(), min_unique=2):
+    """Numeric columns with at least min_unique distinct values, in column order"""
+    return [col for col, info in profile.items()
+            if info["is_numeric"] and col not in exclude and info["nunique"] >= min_unique]
+
+
+def has_variation(profile, col):
+    """True when the column exists and holds more than one distinct value"""
+    info = profile.get(col)
+    return info is not None and info["nunique"] > 1
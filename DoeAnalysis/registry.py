@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from scipy.linalg import solve_triangular
+
+from .regression import build_term_table
+
+# SQLite file holding the fitted-model registry; override with DOE_MODEL_REGISTRY
+DEFAULT_REGISTRY_PATH = os.path.join(tempfile.gettempdir(), "doe_model_registry.sqlite")
+
+# Parsed model records kept in memory so repeated predictions skip SQLite and JSON
+MAX_CACHED_MODELS = 64
+
+# Models not registered again for longer than this are deleted; override with DOE_MODEL_TTL_HOURS
+DEFAULT_MODEL_TTL_HOURS = 720
+
+# Append sessions idle for longer than this are deleted; override with DOE_SESSION_TTL_HOURS
+DEFAULT_SESSION_TTL_HOURS = 168
+
+# Group keys per SELECT, below SQLite's bound-parameter limit
+GROUP_QUERY_BATCH = 500
+
+_MODEL_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def registry_path():
+    return os.environ.get("DOE_MODEL_REGISTRY", DEFAULT_REGISTRY_PATH)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS models ("
+        "model_id TEXT PRIMARY KEY, created TEXT NOT NULL, record TEXT NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "session_id TEXT PRIMARY KEY, updated TEXT NOT NULL, state TEXT NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS session_groups ("
+        "session_id TEXT NOT NULL, setting TEXT NOT NULL, entry TEXT NOT NULL, "
+        "PRIMARY KEY (session_id, setting))"
+    )
+    return conn
+
+
+def model_ttl_hours():
+    return float(os.environ.get("DOE_MODEL_TTL_HOURS", DEFAULT_MODEL_TTL_HOURS))
+
+
+def session_ttl_hours():
+    return float(os.environ.get("DOE_SESSION_TTL_HOURS", DEFAULT_SESSION_TTL_HOURS))
+
+
+def column_factors(columns, predictors):
+    """
+    Map design-matrix column names to the predictors they multiply
+
+    Returns a list of factor tuples ((,) for the intercept) in column order.
+    Raises ValueError for columns that are not first- or second-order terms.
+    """
+    table = build_term_table(predictors)
+    by_factors = {tuple(sorted(factors)): factors for factors in table.values()}
+    factor_lists = []
+    for column in columns:
+        if column == "Intercept":
+            factor_lists.append(())
+        elif column in table:
+            factor_lists.append(table[column])
+        else:
+            # Interactions may be spelled in either factor order
+            parts = column.split(":")
+            reversed_name = ":".join(reversed(parts))
+            if len(parts) == 2 and reversed_name in table:
+                factor_lists.append(tuple(reversed(table[reversed_name])))
+            else:
+                raise ValueError(f"Cannot map model term '{column}' onto the predictors")
+    return factor_lists
+
+
+def build_model_record(fit, predictors, scaler, factor_ranges):
+    """
+    Everything needed to predict from a shared design fit without the data
+
+    Stores the coded coefficients, the scaler mean/scale, the design columns
+    with the predictors each one multiplies, (X'X)^-1 from the R factor and the
+    per-response residual mean square for confidence and prediction intervals,
+    plus the observed factor and response ranges used as optimizer defaults.
+    """
+    p = len(fit["columns"])
+    if fit["rank"] < p:
+        raise ValueError("Model is rank deficient; it cannot be registered for prediction")
+    r_inv = solve_triangular(fit["r"], np.eye(p))
+    df_resid = int(fit["df_resid"])
+    return {
+        "predictors": list(predictors),
+        "scaler_mean": [float(v) for v in scaler.mean_],
+        "scaler_scale": [float(v) for v in scaler.scale_],
+        "columns": list(fit["columns"]),
+        "factors": [list(factors) for factors in column_factors(fit["columns"], predictors)],
+        "factor_ranges": {p_name: [float(lo), float(hi)] for p_name, (lo, hi) in factor_ranges.items()},
+        "xtx_inv": (r_inv @ r_inv.T).tolist(),
+        "df_resid": df_resid,
+        "observations": int(fit["X"].shape[0]),
+        "responses": {
+            y: {
+                "coefficients": fit["coefficients"][:, k].tolist(),
+                "mse": float(fit["sse"][k] / df_resid) if df_resid > 0 else None,
+                "observed_range": [float(fit["Y"][:, k].min()), float(fit["Y"][:, k].max())]
+            }
+            for k, y in enumerate(fit["responses"])
+        }
+    }
+
+
+def purge_models(conn, now=None):
+    """Delete models registered longer ago than the TTL, and their in-memory copies"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(hours=model_ttl_hours())).isoformat()
+    expired = [row[0] for row in conn.execute("SELECT model_id FROM models WHERE created < ?", (cutoff,))]
+    if expired:
+        conn.execute("DELETE FROM models WHERE created < ?", (cutoff,))
+        with _CACHE_LOCK:
+            for model_id in expired:
+                _MODEL_CACHE.pop(model_id, None)
+        logging.info(f"Deleted {len(expired)} expired model(s)")
+    return len(expired)
+
+
+def save_model(record, path=None):
+    """
+    Store a model record and return its id
+
+    The id is a hash of the record, so refitting the same data and model
+    returns the same id (and restarts its TTL) instead of piling up
+    duplicates. Models past their TTL are purged first.
+    """
+    payload = json.dumps(record, sort_keys=True)
+    model_id = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+    created = datetime.now(timezone.utc).isoformat()
+    conn = _connect(path or registry_path())
+    try:
+        with conn:
+            purge_models(conn)
+            conn.execute(
+                "INSERT INTO models (model_id, created, record) VALUES (?, ?, ?) "
+                "ON CONFLICT (model_id) DO UPDATE SET created = excluded.created",
+                (model_id, created, payload)
+            )
+    finally:
+        conn.close()
+    _cache_model(model_id, dict(record, model_id=model_id))
+    return model_id
+
+
+def load_model(model_id, path=None):
+    """Return the model record for model_id, or None when it is not registered or has expired"""
+    with _CACHE_LOCK:
+        record = _MODEL_CACHE.get(model_id)
+    if record is not None:
+        return record
+
+    conn = _connect(path or registry_path())
+    try:
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=model_ttl_hours())).isoformat()
+        row = conn.execute(
+            "SELECT record FROM models WHERE model_id = ? AND created >= ?", (model_id, cutoff)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    record = dict(json.loads(row[0]), model_id=model_id)
+    _cache_model(model_id, record)
+    return record
+
+
+def prepare_record(record):
+    """Materialize a record's arrays once so predictions are pure matrix products"""
+    record["_coefficients"] = np.array([record["responses"][y]["coefficients"] for y in record["responses"]]).T
+    record["_xtx_inv"] = np.array(record["xtx_inv"])
+    return record
+
+
+def _cache_model(model_id, record):
+    prepare_record(record)
+    with _CACHE_LOCK:
+        if len(_MODEL_CACHE) >= MAX_CACHED_MODELS:
+            _MODEL_CACHE.pop(next(iter(_MODEL_CACHE)))
+        _MODEL_CACHE[model_id] = record
+    logging.debug(f"Cached model {model_id}")
+
+
+def _store_groups(conn, session_id, groups):
+    conn.executemany(
+        "INSERT OR REPLACE INTO session_groups (session_id, setting, entry) VALUES (?, ?, ?)",
+        [(session_id, key, json.dumps(entry)) for key, entry in groups.items()]
+    )
+
+
+def _load_groups(conn, session_id, keys):
+    groups = {}
+    for i in range(0, len(keys), GROUP_QUERY_BATCH):
+        batch = keys[i:i + GROUP_QUERY_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT setting, entry FROM session_groups WHERE session_id = ? AND setting IN ({placeholders})",
+            [session_id] + batch
+        ).fetchall()
+        groups.update((key, json.loads(entry)) for key, entry in rows)
+    return groups
+
+
+def purge_sessions(conn, now=None):
+    """Delete sessions idle for longer than the TTL, with their group tables"""
+    now = now or datetime.now(timezone.utc)
+    cutoff = (now - timedelta(hours=session_ttl_hours())).isoformat()
+    expired = conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+    if expired:
+        conn.execute("DELETE FROM session_groups WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+        logging.info(f"Deleted {expired} expired append session(s)")
+    return expired
+
+
+def create_session(state, path=None):
+    """
+    Store a new analysis session state and return its id
+
+    The lack-of-fit group sums (state["groups"]) go to their own table, one
+    row per factor setting, so appends read and write only the settings they
+    touch. Sessions past their TTL are purged first.
+    """
+    session_id = uuid.uuid4().hex[:16]
+    state = dict(state)
+    groups = state.pop("groups", {})
+    conn = _connect(path or registry_path())
+    try:
+        with conn:
+            purge_sessions(conn)
+            conn.execute(
+                "INSERT INTO sessions (session_id, updated, state) VALUES (?, ?, ?)",
+                (session_id, datetime.now(timezone.utc).isoformat(), json.dumps(state))
+            )
+            _store_groups(conn, session_id, groups)
+    finally:
+        conn.close()
+    return session_id
+
+
+def update_session(session_id, update, path=None):
+    """
+    Read-modify-write a session state in one write transaction
+
+    update(state, load_groups) changes the state in place and returns a
+    result; load_groups(keys) reads the stored group entries of those factor
+    settings, and the entries the update leaves in state["groups"] are
+    written back. Concurrent appends to the same session are serialized by
+    SQLite's write lock. Returns None when the session does not exist or has
+    expired.
+    """
+    conn = _connect(path or registry_path())
+    try:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(hours=session_ttl_hours())).isoformat()
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ? AND updated >= ?", (session_id, cutoff)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            state = json.loads(row[0])
+            result = update(state, lambda keys: _load_groups(conn, session_id, list(keys)))
+            _store_groups(conn, session_id, state.pop("groups", {}))
+            conn.execute(
+                "UPDATE sessions SET updated = ?, state = ? WHERE session_id = ?",
+                (datetime.now(timezone.utc).isoformat(), json.dumps(state), session_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return result
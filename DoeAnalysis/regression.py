@@ -0,0 +1,398 @@
+import numpy as np
+from itertools import combinations
+from scipy.stats import t as t_dist
+from scipy.linalg import qr, solve_triangular
+from patsy import dmatrix
+
+# Relative tolerance below which an (orthogonalized) column counts as aliased
+ALIAS_TOLERANCE = 1e-8
+
+# Belsley's rule: a condition index above 30 with two or more terms holding more
+# than half of their variance on that dimension marks a damaging near-dependency
+CONDITION_INDEX_THRESHOLD = 30.0
+VARIANCE_PROPORTION_THRESHOLD = 0.5
+
+# Rows fit per response: complete in every response ("shared") or in its own ("per_response")
+MISSING_POLICIES = ("shared", "per_response")
+
+
+def quote_term(name):
+    """Quote a column name for use in a patsy formula"""
+    return f"Q('{name}')" if '*' in name or ' ' in name or '(' in name else name
+
+
+def create_rsm_terms(predictors):
+    """
+    Create RSM model terms (simplified for limited data)
+
+    Term names use patsy's canonical spelling (e.g. "I(x ** 2)") so they match
+    the factor names reported by anova_lm and can be reused in formulas as is.
+    """
+    quoted_terms = [quote_term(t) for t in predictors]
+
+    if len(predictors) <= 4:
+        # For small number of predictors, use linear + interactions only
+        linear = quoted_terms
+        inter = [f"{a}:{b}" for a, b in combinations(quoted_terms, 2)]
+        return linear + inter
+    else:
+        # Full RSM for larger designs
+        linear = quoted_terms
+        square = [f"I({t} ** 2)" for t in quoted_terms]
+        inter = [f"{a}:{b}" for a, b in combinations(quoted_terms, 2)]
+        return linear + square + inter
+
+
+def build_term_table(predictors):
+    """
+    Map every candidate second-order term name to the predictors it multiplies
+
+    Linear terms map to (x,), squares to (x, x) and interactions to (a, b).
+    """
+    quoted = {p: quote_term(p) for p in predictors}
+    table = {}
+    for p in predictors:
+        table[quoted[p]] = (p,)
+    for p in predictors:
+        table[f"I({quoted[p]} ** 2)"] = (p, p)
+    for a, b in combinations(predictors, 2):
+        table[f"{quoted[a]}:{quoted[b]}"] = (a, b)
+    return table
+
+
+def model_term_table(continuous, categorical_table=None):
+    """
+    Map every candidate term name, continuous or categorical, to the factors it multiplies
+
+    Extends build_term_table with the categorical terms of categorical_term_table:
+    main effects map to (c,) and their interactions to (c, x).
+    """
+    table = build_term_table(continuous)
+    for name, (c, x) in (categorical_table or {}).items():
+        table[name] = (c,) if x is None else (c, x)
+    return table
+
+
+def hierarchical_closure(terms, term_table):
+    """
+    The terms plus every lower-order candidate term whose factors they contain
+
+    Factors are compared as multisets, so I(x ** 2) brings in x and a:b brings
+    in a and b whatever the quoting of the names. Terms missing from the table
+    are kept without parents.
+    """
+    closed = set(terms)
+    for term in terms:
+        factors = term_table.get(term)
+        if not factors:
+            continue
+        for name, sub in term_table.items():
+            if len(sub) < len(factors) and all(sub.count(f) <= factors.count(f) for f in sub):
+                closed.add(name)
+    return closed
+
+
+def term_matrix(columns, factor_lists):
+    """
+    Evaluate model terms as products of predictor columns
+
+    columns maps predictor name -> 1-D array; returns an (n, len(factor_lists)) array.
+    """
+    n = len(next(iter(columns.values()))) if columns else 0
+    out = np.empty((n, len(factor_lists)))
+    for j, factors in enumerate(factor_lists):
+        col = np.array(columns[factors[0]], dtype=float)
+        for factor in factors[1:]:
+            col = col * columns[factor]
+        out[:, j] = col
+    return out
+
+
+def design_matrix(columns, factor_lists):
+    """Design matrix with a leading intercept column followed by the given terms"""
+    terms = term_matrix(columns, factor_lists)
+    return np.hstack([np.ones((terms.shape[0], 1)), terms])
+
+
+def logworth_from_p(p_values):
+    """LogWorth = -log10(p), with p floored at 1e-16 as in the ANOVA tables"""
+    return -np.log10(np.maximum(np.asarray(p_values, dtype=float), 1e-16))
+
+
+def qr_fit(X, Y):
+    """
+    Least-squares fit of every column of Y on X from one thin QR factorization
+
+    Returns a dict with q, r, coefficients (p x k), residuals (n x k), sse (k,),
+    df_resid and rank. Rank-deficient designs are reported through `rank`; the
+    caller decides whether to proceed. They are refactorized with column
+    pivoting, so the first `rank` columns of q span the column space of X
+    whichever columns are aliased; r is then in the pivoted column order
+    given by `pivot`.
+    """
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    q, r = np.linalg.qr(X)
+    pivot = None
+    diag = np.abs(np.diag(r))
+    scale = diag.max() if diag.size else 0.0
+    rank = int((diag > ALIAS_TOLERANCE * max(scale, 1.0)).sum())
+    if rank < X.shape[1]:
+        q, r, pivot = qr(X, mode="economic", pivoting=True)
+        diag = np.abs(np.diag(r))
+        rank = int((diag > ALIAS_TOLERANCE * max(diag[0] if diag.size else 0.0, 1.0)).sum())
+    qty = q.T @ Y
+    if pivot is None:
+        coefficients = solve_triangular(r, qty)
+    else:
+        coefficients = np.linalg.lstsq(X, Y, rcond=None)[0]
+    fitted = q[:, :rank] @ qty[:rank]
+    residuals = Y - fitted
+    return {
+        "q": q,
+        "r": r,
+        "pivot": pivot,
+        "coefficients": coefficients,
+        "fitted": fitted,
+        "residuals": residuals,
+        "sse": (residuals ** 2).sum(axis=0),
+        "df_resid": X.shape[0] - rank,
+        "rank": rank
+    }
+
+
+def coefficient_tests(fit):
+    """
+    Standard errors, t values, p values and LogWorths of every coefficient
+
+    diag((X'X)^-1) is read from the row norms of R^-1, so no p x p inverse of
+    X'X is ever formed. Arrays are (p x k) for k responses.
+    """
+    df_resid = fit["df_resid"]
+    r_inv = solve_triangular(fit["r"], np.eye(fit["r"].shape[0]))
+    xtx_inv_diag = (r_inv ** 2).sum(axis=1)
+    if fit.get("pivot") is not None:
+        xtx_inv_diag = xtx_inv_diag[np.argsort(fit["pivot"])]
+    mse = fit["sse"] / df_resid if df_resid > 0 else np.full(fit["sse"].shape, np.nan)
+    std_errors = np.sqrt(np.outer(xtx_inv_diag, mse))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_values = fit["coefficients"] / std_errors
+    p_values = 2 * t_dist.sf(np.abs(t_values), df_resid) if df_resid > 0 else np.full(t_values.shape, np.nan)
+    return {
+        "std_errors": std_errors,
+        "t_values": t_values,
+        "p_values": p_values,
+        "logworth": logworth_from_p(np.nan_to_num(p_values, nan=1.0))
+    }
+
+
+def complete_case_masks(df, predictors, response_vars, policy="shared"):
+    """
+    Row masks of the rows each response is fit on, from one vectorized pass
+
+    A row needs every predictor present (finite when numeric) and, under
+    "shared", a finite value of every response, else only of its own. The
+    shared mask (complete in everything) is the row set of every joint
+    computation. Returns ({response: mask}, shared mask, report of the
+    dropped row counts).
+    """
+    n = len(df)
+    present = np.ones(n, dtype=bool)
+    for p in predictors:
+        values = df[p].to_numpy()
+        present &= np.isfinite(values) if values.dtype.kind in "fiub" else df[p].notna().to_numpy()
+    finite = np.isfinite(df[response_vars].to_numpy(dtype=float))
+    shared = present & finite.all(axis=1)
+    masks = {
+        y: shared if policy == "shared" else present & finite[:, j]
+        for j, y in enumerate(response_vars)
+    }
+    report = {
+        "policy": policy,
+        "rows": n,
+        "shared_rows": int(shared.sum()),
+        "dropped_missing_predictors": int(n - present.sum()),
+        "dropped_rows": {y: int(n - mask.sum()) for y, mask in masks.items()}
+    }
+    return masks, shared, report
+
+
+def shared_design_fit(df, terms, response_vars):
+    """
+    Fit every response on one design matrix built once from the model terms
+
+    The design is built with patsy so column names match the statsmodels
+    parameter names. Rows with a missing predictor or response are left out so
+    all responses share the same rows and the same thin QR factorization.
+    """
+    X = dmatrix(" + ".join(terms) if terms else "1", data=df, return_type="dataframe")
+    Y = df.loc[X.index, response_vars].to_numpy(dtype=float)
+    mask = np.isfinite(Y).all(axis=1)
+    X_values = X.to_numpy(dtype=float)[mask]
+    fit = qr_fit(X_values, Y[mask])
+    fit.update({
+        "X": X_values,
+        "Y": Y[mask],
+        "columns": list(X.columns),
+        "design_info": X.design_info,
+        "index": X.index[mask],
+        "responses": list(response_vars)
+    })
+    return fit
+
+
+def influence_diagnostics(fit):
+    """
+    Leverage, studentized residuals, Cook's distance and DFFITS for all responses
+
+    Leverages are the row sums of squares of the thin Q factor, so the n x n hat
+    matrix is never formed; every other statistic is an elementwise function of
+    the leverages and the (n x k) residual matrix.
+    """
+    q = fit["q"][:, :fit["rank"]]
+    leverage = (q ** 2).sum(axis=1)
+    residuals = fit["residuals"]
+    p = fit["rank"]
+    df_resid = fit["df_resid"]
+    one_minus_h = np.maximum(1.0 - leverage, 1e-12)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mse = fit["sse"] / df_resid
+        internal = residuals / np.sqrt(mse * one_minus_h)
+        # Deleted-row variance from the PRESS residual identity, without refitting
+        mse_deleted = (fit["sse"] - residuals ** 2 / one_minus_h) / (df_resid - 1)
+        external = residuals / np.sqrt(np.maximum(mse_deleted, 1e-300) * one_minus_h)
+        cooks = internal ** 2 * leverage[:, None] / (p * one_minus_h)
+        dffits = external * np.sqrt(leverage[:, None] / one_minus_h)
+
+    return {
+        "leverage": leverage,
+        "studentized_residuals": internal,
+        "externally_studentized_residuals": external,
+        "cooks_distance": cooks,
+        "dffits": dffits
+    }
+
+
+def top_outliers(diagnostics, k, index, n_params, top_k):
+    """Rows with the largest |externally studentized residual| for response k"""
+    external = diagnostics["externally_studentized_residuals"][:, k]
+    order = np.argsort(-np.abs(np.nan_to_num(external)))[:top_k]
+    leverage_cutoff = 2 * n_params / len(external)
+    return [{
+        "row": index[i].item() if hasattr(index[i], "item") else index[i],
+        "externally_studentized_residual": float(external[i]),
+        "leverage": float(diagnostics["leverage"][i]),
+        "high_leverage": bool(diagnostics["leverage"][i] > leverage_cutoff),
+        "cooks_distance": float(diagnostics["cooks_distance"][i, k]),
+        "dffits": float(diagnostics["dffits"][i, k])
+    } for i in order]
+
+
+def press_statistics(fit, diagnostics):
+    """
+    PRESS, predicted R-squared and leave-one-out RMSE for every response
+
+    Leave-one-out residuals are e_i / (1 - h_i), so no refits are needed.
+    Returns a dict of (k,) arrays.
+    """
+    one_minus_h = np.maximum(1.0 - diagnostics["leverage"], 1e-12)[:, None]
+    press = ((fit["residuals"] / one_minus_h) ** 2).sum(axis=0)
+    tss = ((fit["Y"] - fit["Y"].mean(axis=0)) ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        predicted_r2 = 1.0 - press / tss
+    return {
+        "press": press,
+        "predicted_r_squared": predicted_r2,
+        "loo_rmse": np.sqrt(press / fit["residuals"].shape[0])
+    }
+
+
+def kfold_cross_validation(fit, n_folds, seed=0):
+    """
+    k-fold cross-validated RMSE and R-squared from the full-data factorization
+
+    Held-out residuals of fold S are (I - H_SS)^-1 e_S with H_SS = Q_S Q_S'.
+    By the Woodbury identity this is e_S + Q_S (I - Q_S'Q_S)^-1 Q_S'e_S, so each
+    fold costs one p x p solve (a rank-|S| downdate of the fit) instead of a refit.
+    """
+    q = fit["q"][:, :fit["rank"]]
+    residuals = fit["residuals"]
+    n, p = q.shape
+    folds = np.array_split(np.random.default_rng(seed).permutation(n), n_folds)
+    cv_residuals = np.empty_like(residuals)
+    for rows in folds:
+        q_s = q[rows]
+        e_s = residuals[rows]
+        downdate = np.eye(p) - q_s.T @ q_s
+        try:
+            correction = np.linalg.solve(downdate, q_s.T @ e_s)
+        except np.linalg.LinAlgError:
+            # The fold holds every run supporting some term; the model is not estimable without it
+            correction = np.linalg.lstsq(downdate, q_s.T @ e_s, rcond=None)[0]
+        cv_residuals[rows] = e_s + q_s @ correction
+    sse_cv = (cv_residuals ** 2).sum(axis=0)
+    tss = ((fit["Y"] - fit["Y"].mean(axis=0)) ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2_cv = 1.0 - sse_cv / tss
+    return {
+        "folds": len(folds),
+        "rmse": np.sqrt(sse_cv / n),
+        "r_squared": r2_cv
+    }
+
+
+def collinearity_diagnostics(X, columns):
+    """
+    Belsley collinearity report from one SVD of the column-scaled design matrix
+
+    Condition indices are s_max / s_j of the unit-length-scaled X (not of X'X,
+    which would square them). Variance-decomposition proportions split each
+    coefficient variance across the singular dimensions, and the VIFs come from
+    the same SVD as diag((X'X)^-1) times the centred column sums of squares.
+    Dimensions of aliased terms have no condition index and aliased terms no VIF.
+    """
+    X = np.asarray(X, dtype=float)
+    norms = np.sqrt((X ** 2).sum(axis=0))
+    norms[norms == 0] = 1.0
+    _, singular_values, vt = np.linalg.svd(X / norms, full_matrices=False)
+    s_max = singular_values.max() if singular_values.size else 0.0
+    estimable = singular_values > ALIAS_TOLERANCE * max(s_max, 1.0)
+
+    with np.errstate(divide="ignore"):
+        condition_indices = np.where(estimable, s_max / singular_values, np.inf)
+        # phi[j, d] = v_jd^2 / s_d^2 over the estimable dimensions
+        phi = np.where(estimable, vt.T ** 2 / singular_values ** 2, 0.0)
+    variance = phi.sum(axis=1)
+    proportions = phi / np.where(variance > 0, variance, 1.0)[:, None]
+
+    centred_ss = ((X - X.mean(axis=0)) ** 2).sum(axis=0)
+    vif = variance * centred_ss / norms ** 2
+    # Terms loading on a zero singular value are aliased with the others
+    loads_on_null = np.abs(vt) > np.sqrt(ALIAS_TOLERANCE)
+    aliased = (loads_on_null & ~estimable[:, None]).any(axis=0)
+
+    dimensions = []
+    for d in np.argsort(condition_indices):
+        if estimable[d]:
+            involved = [columns[j] for j in np.flatnonzero(proportions[:, d] > VARIANCE_PROPORTION_THRESHOLD)]
+            flagged = condition_indices[d] > CONDITION_INDEX_THRESHOLD and len(involved) >= 2
+        else:
+            involved = [columns[j] for j in np.flatnonzero(loads_on_null[d])]
+            flagged = True
+        dimensions.append({
+            "condition_index": float(condition_indices[d]) if estimable[d] else None,
+            "variance_proportions": {columns[j]: float(proportions[j, d]) for j in range(len(columns))},
+            "collinear_terms": involved if flagged else []
+        })
+
+    return {
+        "condition_number": float(condition_indices[estimable].max()) if estimable.any() else None,
+        "rank": int(estimable.sum()),
+        "dimensions": dimensions,
+        "vif": {
+            columns[j]: (None if aliased[j] else float(vif[j]))
+            for j in range(len(columns)) if columns[j] != "Intercept"
+        }
+    }
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from .design import design_model_terms, model_expansion
+
+SAMPLING_METHODS = ("design", "d_optimal", "random")
+
+# Numeric columns with at most this many levels are treated as design factors
+MAX_FACTOR_LEVELS = 20
+
+# Ridge keeping the information matrix invertible while the first design points are chosen
+SAMPLING_RIDGE = 1e-6
+
+
+def detect_factor_columns(profile, exclude=()):
+    """Categorical and low-cardinality numeric columns, the likely design factors"""
+    return [
+        col for col, info in profile.items()
+        if col not in exclude and info["nunique"] > 1 and (
+            info["is_categorical"] or (info["is_numeric"] and info["nunique"] <= MAX_FACTOR_LEVELS)
+        )
+    ]
+
+
+def design_point_groups(df, factor_cols):
+    """Group id of every row's factor setting (n,), numbered 0..G-1"""
+    return df.groupby(factor_cols, sort=False, dropna=False).ngroup().to_numpy()
+
+
+def proportional_allocation(counts, budget):
+    """
+    Rows to keep per design point: one each, then the rest proportional to replication
+
+    Uses largest remainders so the total is exactly the budget (or every row).
+    """
+    alloc = np.minimum(counts, 1)
+    remaining = budget - alloc.sum()
+    spare = counts - alloc
+    if remaining > 0 and spare.sum() > 0:
+        share = spare / spare.sum() * min(remaining, spare.sum())
+        extra = np.floor(share).astype(int)
+        leftover = int(min(remaining, spare.sum()) - extra.sum())
+        extra[np.argsort(-(share - extra), kind="stable")[:leftover]] += 1
+        alloc = alloc + np.minimum(extra, spare)
+    return alloc
+
+
+def d_optimal_allocation(F, counts, budget, keep_every_point=True):
+    """
+    Rows to keep per design point, added one at a time to maximize det(X'X)
+
+    Adding a row at point g multiplies det(X'X) by 1 + d_g with d_g = f_g'(X'X)^-1 f_g,
+    so each step takes the available point of largest d (Wynn's sequential
+    D-optimal rule) and updates (X'X)^-1 with one Sherman-Morrison step.
+    """
+    p = F.shape[1]
+    alloc = np.minimum(counts, 1) if keep_every_point else np.zeros_like(counts)
+    M_inv = np.linalg.inv(F.T @ (F * alloc[:, None]) + SAMPLING_RIDGE * np.eye(p))
+    for _ in range(int(budget - alloc.sum())):
+        d = np.einsum("gp,pq,gq->g", F, M_inv, F)
+        d[alloc >= counts] = -np.inf
+        g = int(d.argmax())
+        if not np.isfinite(d[g]):
+            break
+        alloc[g] += 1
+        u = M_inv @ F[g]
+        M_inv -= np.outer(u, u) / (1.0 + F[g] @ u)
+    return alloc
+
+
+def select_within_groups(groups, alloc, rng):
+    """Row positions keeping a random alloc[g] rows of every group g, fully vectorized"""
+    order = np.lexsort((rng.random(len(groups)), groups))
+    sorted_groups = groups[order]
+    starts = np.searchsorted(sorted_groups, np.arange(len(alloc)))
+    position = np.arange(len(groups)) - starts[sorted_groups]
+    return np.sort(order[position < alloc[sorted_groups]])
+
+
+def relative_d_efficiency(F, counts, alloc):
+    """D-efficiency (%) per run of the kept rows relative to all rows"""
+    p = F.shape[1]
+    sign_full, logdet_full = np.linalg.slogdet(F.T @ (F * (counts / counts.sum())[:, None]))
+    sign_kept, logdet_kept = np.linalg.slogdet(F.T @ (F * (alloc / max(alloc.sum(), 1))[:, None]))
+    if sign_full <= 0:
+        return None
+    if sign_kept <= 0:
+        return 0.0
+    return float(100.0 * np.exp((logdet_kept - logdet_full) / p))
+
+
+def design_preserving_sample(df, factor_cols, max_rows, method="design", random_state=42):
+    """
+    Choose at most max_rows rows of df without losing design points
+
+    "design" keeps every distinct factor setting and spreads the remaining
+    budget over settings in proportion to their replication. "d_optimal"
+    keeps every setting and adds the replicates that most increase det(X'X)
+    of the RSM model matrix. "random" is a plain random sample. When there
+    are more settings than rows allowed, settings are picked D-optimally.
+
+    Returns (row positions, info) with the method used and the D-efficiency
+    of the kept rows relative to the full data (None without numeric factors).
+    """
+    rng = np.random.default_rng(random_state)
+    groups = design_point_groups(df, factor_cols)
+    counts = np.bincount(groups)
+    n_groups = len(counts)
+
+    numeric = [c for c in factor_cols if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    F = None
+    if numeric:
+        first_rows = np.unique(groups, return_index=True)[1]
+        values = df[numeric].to_numpy(dtype=float)
+        scale = values.std(axis=0)
+        coded = (values[first_rows] - values.mean(axis=0)) / np.where(scale > 0, scale, 1.0)
+        _, index_lists = design_model_terms(numeric, "rsm")
+        F = model_expansion(coded, index_lists)
+
+    usable = F is not None and bool(np.isfinite(F).all())
+    used = method
+    if method != "random" and n_groups > max_rows:
+        used = "d_optimal" if usable else "random"
+    elif method == "d_optimal" and not usable:
+        used = "design"
+
+    if used == "random":
+        keep = np.sort(rng.choice(len(df), size=max_rows, replace=False))
+        alloc = np.bincount(groups[keep], minlength=n_groups)
+    else:
+        if used == "design":
+            alloc = proportional_allocation(counts, max_rows)
+        else:
+            alloc = d_optimal_allocation(F, counts, max_rows, keep_every_point=n_groups <= max_rows)
+        keep = select_within_groups(groups, alloc, rng)
+
+    efficiency = relative_d_efficiency(F, counts, alloc) if usable else None
+    return keep, _sampling_info(used, factor_cols, n_groups, alloc, efficiency)
+
+
+def _sampling_info(method, factor_cols, n_groups, alloc, efficiency):
+    return {
+        "sampling_method": method,
+        "factor_columns": list(factor_cols),
+        "design_points": int(n_groups),
+        "design_points_kept": int((alloc > 0).sum()),
+        "d_efficiency": efficiency
+    }
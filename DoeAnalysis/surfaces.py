@@ -0,0 +1,111 @@
+from itertools import combinations
+
+import numpy as np
+
+from .prediction import coded_design, predict_responses
+
+DEFAULT_RESOLUTION = 25
+MAX_RESOLUTION = 201
+
+
+def hold_levels(record, lower, upper, hold=None):
+    """
+    Levels for the factors not being varied, in the model's predictor order
+
+    Defaults to the centre of each factor range; hold overrides it per factor.
+    """
+    levels = (lower + upper) / 2
+    for name, value in (hold or {}).items():
+        if name not in record["predictors"]:
+            raise ValueError(f"Unknown factor in hold: '{name}'")
+        levels[record["predictors"].index(name)] = float(value)
+    return levels
+
+
+def profiler_traces(record, lower, upper, levels, resolution=DEFAULT_RESOLUTION,
+                    responses=None, confidence_level=0.95):
+    """
+    Prediction-profiler traces: each factor swept over its range, the others held
+
+    All traces of all factors are stacked into one (n_factors * resolution)
+    batch and evaluated with a single prediction call.
+    """
+    n_factors = len(levels)
+    sweeps = np.linspace(lower, upper, resolution)
+    points = np.tile(levels, (n_factors, resolution, 1))
+    for i in range(n_factors):
+        points[i, :, i] = sweeps[:, i]
+    predictions = predict_responses(record, points.reshape(-1, n_factors), responses, confidence_level)
+
+    traces = {}
+    for i, factor in enumerate(record["predictors"]):
+        rows = slice(i * resolution, (i + 1) * resolution)
+        traces[factor] = {
+            "x": sweeps[:, i].tolist(),
+            "responses": {
+                y: {key: values[rows] for key, values in pred.items() if key in ("predicted", "ci_lower", "ci_upper")}
+                for y, pred in predictions.items()
+            }
+        }
+    return traces
+
+
+def contour_grids(record, lower, upper, levels, pairs=None, resolution=DEFAULT_RESOLUTION, responses=None):
+    """
+    Predicted-response grids over factor pairs, the other factors held
+
+    Every grid point of every pair is evaluated in one design-matrix product.
+    z[response][i][j] is the prediction at (x[j], y[i]), the row-major layout
+    contour plotting libraries expect.
+    """
+    predictors = record["predictors"]
+    if pairs is None:
+        pairs = list(combinations(predictors, 2))
+    for pair in pairs:
+        if len(pair) != 2 or pair[0] == pair[1] or any(p not in predictors for p in pair):
+            raise ValueError(f"Contour pairs must name two different model factors; got {list(pair)}")
+    names = list(record["responses"])
+    responses = names if responses is None else responses
+    if not pairs:
+        return []
+
+    n_factors = len(levels)
+    points = np.tile(levels, (len(pairs), resolution, resolution, 1))
+    axes = []
+    for k, (x_name, y_name) in enumerate(pairs):
+        ix, iy = predictors.index(x_name), predictors.index(y_name)
+        x_axis = np.linspace(lower[ix], upper[ix], resolution)
+        y_axis = np.linspace(lower[iy], upper[iy], resolution)
+        points[k, :, :, ix] = x_axis[None, :]
+        points[k, :, :, iy] = y_axis[:, None]
+        axes.append((x_axis, y_axis))
+
+    indices = [names.index(y) for y in responses]
+    predicted = coded_design(record, points.reshape(-1, n_factors)) @ record["_coefficients"][:, indices]
+    predicted = predicted.reshape(len(pairs), resolution, resolution, len(indices))
+
+    return [{
+        "x_factor": x_name,
+        "y_factor": y_name,
+        "x": axes[k][0].tolist(),
+        "y": axes[k][1].tolist(),
+        "z": {y: predicted[k, :, :, j].tolist() for j, y in enumerate(responses)}
+    } for k, (x_name, y_name) in enumerate(pairs)]
+
+
+def surface_report(record, lower, upper, hold=None, pairs=None, resolution=DEFAULT_RESOLUTION,
+                   responses=None, confidence_level=0.95):
+    """Profiler traces and contour grids for a model record, as one JSON-ready dict"""
+    resolution = int(resolution)
+    if not 2 <= resolution <= MAX_RESOLUTION:
+        raise ValueError(f"'resolution' must be between 2 and {MAX_RESOLUTION}")
+    unknown = [y for y in (responses or []) if y not in record["responses"]]
+    if unknown:
+        raise ValueError(f"Unknown response(s): {unknown}. Model responses are {list(record['responses'])}")
+    levels = hold_levels(record, lower, upper, hold)
+    return {
+        "hold": {p: float(v) for p, v in zip(record["predictors"], levels)},
+        "resolution": resolution,
+        "profiler": profiler_traces(record, lower, upper, levels, resolution, responses, confidence_level),
+        "contours": contour_grids(record, lower, upper, levels, pairs, resolution, responses)
+    }
@@ -0,0 +1,121 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from scipy.stats import chi2
+
+from .regression import coefficient_tests
+
+# Default Box-Cox grid: -2 to 2 in steps of 0.1
+DEFAULT_LAMBDAS = tuple(np.round(np.linspace(-2.0, 2.0, 41), 2))
+MAX_LAMBDAS = 401
+
+# Powers with a conventional name, preferred over the exact maximum when inside the confidence interval
+CONVENIENT_LAMBDAS = {1.0: "none", 0.5: "sqrt", 0.0: "log", -0.5: "reciprocal sqrt", -1.0: "reciprocal",
+                      2.0: "square", -2.0: "reciprocal square"}
+
+
+def boxcox_columns(y, lambdas, normalize=True):
+    """
+    Box-Cox transforms of one positive response for every lambda, as (n x L)
+
+    (y^l - 1) / l is evaluated as expm1(l log y) / l so lambdas near 0 join
+    the log transform smoothly. With normalize, columns are divided by
+    g^(l - 1) for the geometric mean g, which puts every lambda's residual sum
+    of squares on the same scale for the profile likelihood.
+    """
+    log_y = np.log(y)[:, None]
+    lambdas = np.asarray(lambdas, dtype=float)[None, :]
+    small = np.abs(lambdas) < 1e-12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Z = np.where(small, log_y, np.expm1(lambdas * log_y) / np.where(small, 1.0, lambdas))
+    if normalize:
+        Z = Z / np.exp((lambdas - 1.0) * log_y.mean())
+    return Z
+
+
+def inverse_boxcox(w, lam):
+    """Back-transform fitted values of (y^lam - 1) / lam to the response scale (the median)"""
+    if lam == 0:
+        return np.exp(w)
+    return np.maximum(lam * w + 1.0, 0.0) ** (1.0 / lam)
+
+
+def transform_name(lam):
+    return CONVENIENT_LAMBDAS.get(float(lam), f"power {lam:g}")
+
+
+def boxcox_search(fit, lambdas=DEFAULT_LAMBDAS, confidence_level=0.95):
+    """
+    Box-Cox profile likelihood of every response over a lambda grid from one QR
+
+    The normalized transforms of all responses and lambdas are stacked into one
+    n x (k * L) matrix and projected with the thin Q factor of the shared
+    design fit, so the whole grid costs one multi-column product. The response
+    stays untransformed when lambda = 1 lies inside the likelihood-ratio
+    confidence interval; otherwise the conventional power inside it closest to
+    the maximum is chosen, else the grid maximum. The model is then refit on the
+    chosen transform with the same R factor, giving term LogWorths on the
+    transformed scale and back-transformed predictions.
+
+    Returns {response: report}; responses with non-positive values get an error.
+    """
+    lambdas = np.asarray(lambdas, dtype=float)
+    Y = fit["Y"]
+    n, k = Y.shape
+    q = fit["q"][:, :fit["rank"]]
+    positive = [j for j in range(k) if (Y[:, j] > 0).all()]
+    out = {fit["responses"][j]: {"error": "Box-Cox needs strictly positive response values"}
+           for j in range(k) if j not in positive}
+    if not positive:
+        return out
+
+    Z = np.hstack([boxcox_columns(Y[:, j], lambdas) for j in positive])
+    residuals = Z - q @ (q.T @ Z)
+    sse = (residuals ** 2).sum(axis=0).reshape(len(positive), len(lambdas))
+    log_likelihood = -0.5 * n * np.log(np.maximum(sse, 1e-300) / n)
+    cutoff = 0.5 * chi2.ppf(confidence_level, 1)
+
+    chosen = []
+    for row, j in enumerate(positive):
+        profile = log_likelihood[row]
+        best = int(np.argmax(profile))
+        inside = lambdas[profile >= profile[best] - cutoff]
+        candidates = [lam for lam in CONVENIENT_LAMBDAS if inside.min() <= lam <= inside.max()]
+        if 1.0 in candidates:
+            lam = 1.0
+        elif candidates:
+            lam = min(candidates, key=lambda c: abs(c - lambdas[best]))
+        else:
+            lam = float(lambdas[best])
+        chosen.append(lam)
+        out[fit["responses"][j]] = {
+            "lambdas": lambdas.tolist(),
+            "log_likelihood": profile.tolist(),
+            "lambda_max_likelihood": float(lambdas[best]),
+            "confidence_interval": [float(inside.min()), float(inside.max())],
+            "lambda": float(lam),
+            "transform": transform_name(lam)
+        }
+
+    # Refit every response on its chosen transform with the shared factorization
+    W = np.column_stack([boxcox_columns(Y[:, j], [lam], normalize=False)[:, 0] for j, lam in zip(positive, chosen)])
+    qtw = q.T @ W
+    fitted = q @ qtw
+    refit = {"r": fit["r"], "df_resid": fit["df_resid"], "sse": ((W - fitted) ** 2).sum(axis=0)}
+    tests = None
+    if fit["rank"] == fit["r"].shape[1]:
+        refit["coefficients"] = solve_triangular(fit["r"], qtw)
+        tests = coefficient_tests(refit)
+
+    for row, (j, lam) in enumerate(zip(positive, chosen)):
+        report = out[fit["responses"][j]]
+        predicted = inverse_boxcox(fitted[:, row], lam)
+        tss = ((Y[:, j] - Y[:, j].mean()) ** 2).sum()
+        w_tss = ((W[:, row] - W[:, row].mean()) ** 2).sum()
+        report.update({
+            "r_squared_transformed": float(1.0 - refit["sse"][row] / w_tss) if w_tss > 0 else None,
+            "r_squared_original": float(1.0 - ((Y[:, j] - predicted) ** 2).sum() / tss) if tss > 0 else None,
+            "predicted_values": predicted.tolist()
+        })
+        if tests is not None:
+            report["logworth"] = {col: float(tests["logworth"][i, row]) for i, col in enumerate(fit["columns"])}
+    return out
@@ -0,0 +1,95 @@
+from itertools import product
+
+import numpy as np
+from scipy.special import comb
+
+from .regression import quote_term
+
+
+def column_structure(design_info, term_table, continuous):
+    """
+    Factor structure of every column of a patsy design matrix
+
+    Each model term is looked up in the term table (see model_term_table), so
+    nothing is read off the column names. Returns one (level, exponents) pair
+    per column: level is (categorical factor, contrast column) for columns
+    that multiply a contrast and None otherwise, and exponents is the power
+    of every continuous predictor. Raises KeyError for a term not in the table.
+    """
+    position = {p: i for i, p in enumerate(continuous)}
+    structure = []
+    for term, columns in design_info.term_name_slices.items():
+        exponents = np.zeros(len(continuous), dtype=int)
+        categorical = None
+        for factor in (() if term == "Intercept" else term_table[term]):
+            if factor in position:
+                exponents[position[factor]] += 1
+            else:
+                categorical = factor
+        for j in range(columns.stop - columns.start):
+            structure.append(((categorical, j) if categorical is not None else None, tuple(exponents)))
+    return structure
+
+
+def monomial_name(exponents, continuous, level_name=None):
+    """Patsy-style name of a product of continuous powers, after a contrast column name if any"""
+    parts = [level_name] if level_name else []
+    for p, e in zip(continuous, exponents):
+        if e == 1:
+            parts.append(quote_term(p))
+        elif e > 1:
+            parts.append(f"I({quote_term(p)} ** {e})")
+    return ":".join(parts) if parts else "Intercept"
+
+
+def uncoding_transform(columns, structure, continuous, means, scales):
+    """
+    Linear map from coded to uncoded coefficients
+
+    The continuous predictors enter the coded model standardized,
+    z = (x - mean) / scale, and contrast columns unchanged. Expanding every
+    coded column, contrast * prod (x_i - m_i)^e_i / s_i^e_i, binomially over
+    the monomials prod x_i^f_i with f <= e gives its contribution to each
+    uncoded coefficient: to its own term, and as cross-term corrections to
+    the lower-order terms, the intercept and (for interactions with a
+    categorical factor) the contrast columns. Returns (T, names) with T of
+    shape (uncoded terms x coded columns); uncoded terms keep the order and
+    names of the coded columns, followed by any lower-order terms the model
+    implies without containing them.
+    """
+    means = np.asarray(means, dtype=float)
+    scales = np.asarray(scales, dtype=float)
+    index = {key: i for i, key in enumerate(structure)}
+    names = list(columns)
+    level_names = {level: name for name, (level, e) in zip(columns, structure) if level and not any(e)}
+    entries = []
+    for j, (level, e) in enumerate(structure):
+        e = np.array(e, dtype=int)
+        divisor = np.prod(scales ** e)
+        for f in product(*(range(k + 1) for k in e)):
+            f = np.array(f, dtype=int)
+            key = (level, tuple(f))
+            if key not in index:
+                index[key] = len(names)
+                level_name = level_names.get(level, f"{level[0]}[{level[1]}]") if level else None
+                names.append(monomial_name(f, continuous, level_name))
+            weight = np.prod(comb(e, f) * (-means) ** (e - f)) / divisor
+            entries.append((index[key], j, weight))
+    T = np.zeros((len(names), len(columns)))
+    for i, j, weight in entries:
+        T[i, j] += weight
+    return T, names
+
+
+def fitted_design_info(model_fit):
+    """Patsy DesignInfo of a statsmodels formula fit (model_spec from statsmodels 0.15 on)"""
+    data = model_fit.model.data
+    return data.model_spec if hasattr(data, "model_spec") else data.design_info
+
+
+def coded_to_uncoded(design_info, term_table, continuous, scaler):
+    """Coded-to-uncoded map (T, names) of a model, from its patsy design and the fitted scaler"""
+    structure = column_structure(design_info, term_table, continuous)
+    means = scaler.mean_ if continuous else []
+    scales = scaler.scale_ if continuous else []
+    return uncoding_transform(design_info.column_names, structure, continuous, means, scales)
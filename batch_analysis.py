@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Offline batch re-analysis of archived DOE files across all cores
+
+Scans a directory for CSV, Parquet, Arrow or .npy files (or reads a manifest
+listing files and URLs, one per line), reads each memory-mapped and projected
+to the predictor and response columns, runs perform_doe_analysis on every
+dataset in a process pool and writes four columnar tables under the output
+directory, one part file per dataset:
+
+    effects/       source, factor, response, logworth, in_simplified_model
+    fits/          source, response, r_squared, adjusted_r_squared, rmse, ...
+    coefficients/  source, response, term, coefficient, std_error, p_value, ...
+    runs/          source, key, status, error, rows, seconds
+
+Each directory reads back as one frame with pd.read_parquet(directory).
+A dataset's runs/ part is written last, so --resume skips every dataset
+that completed with the same file size, modification time and options
+(URLs: the same options). A rerun with a changed file or options replaces
+the dataset's earlier parts.
+
+Usage:
+    python batch_analysis.py archive/ -o results/ --responses Lvalue,Avalue,Bvalue --resume
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+
+import pandas as pd
+
+from DoeAnalysis import get_data_from_source, perform_doe_analysis, smart_sample_large_dataset
+from DoeAnalysis.ingestion import LOCAL_FORMATS, local_columns, local_format, read_local_frame
+from DoeAnalysis.profiling import get_column_profile, has_variation
+
+DATA_SUFFIXES = tuple(LOCAL_FORMATS)
+
+# Fixed column types, so the part files of every dataset read back as one table
+FIT_STATISTICS = ("r_squared", "adjusted_r_squared", "rmse", "mean_response", "observations",
+                  "press", "predicted_r_squared", "loo_rmse", "lack_of_fit_p_value")
+COEFFICIENT_STATISTICS = ("coefficient", "std_error", "t_value", "p_value", "logworth", "uncoded_estimate")
+SCHEMAS = {
+    "effects": {"source": "string", "factor": "string", "response": "string", "logworth": "float64",
+                "in_simplified_model": "boolean"},
+    "fits": {"source": "string", "response": "string", "error": "string",
+             **{name: "float64" for name in FIT_STATISTICS}},
+    "coefficients": {"source": "string", "response": "string", "term": "string",
+                     **{name: "float64" for name in COEFFICIENT_STATISTICS}},
+    "runs": {"source": "string", "key": "string", "status": "string", "error": "string", "rows": "Int64",
+             "seconds": "float64"}
+}
+
+# Resident memory of one worker process before it loads any data
+WORKER_BASE_MB = 300
+
+# In-memory size of a parsed dataset, and of its analysis, per MB of file
+EXPANSION = {".csv": 6, ".gz": 30, ".parquet": 12, ".pq": 12, ".arrow": 2, ".feather": 2, ".ipc": 2, ".npy": 2}
+
+# Datasets behind URLs have no size until downloaded; assume the download cap
+URL_ESTIMATE_MB = 10
+
+
+def discover_sources(target):
+    """Data files under a directory (sorted), or the entries of a manifest file"""
+    path = Path(target)
+    if path.is_dir():
+        return sorted(str(p) for p in path.rglob("*") if p.is_file() and p.name.lower().endswith(DATA_SUFFIXES))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    base = path.parent
+    sources = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        sources.append(line if line.startswith("http") or Path(line).is_absolute() else str(base / line))
+    return sources
+
+
+def source_stamp(source):
+    """Size and modification time of a local file (empty for URLs)"""
+    if source.startswith("http"):
+        return {}
+    stat = os.stat(source)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def run_key(source, options):
+    """
+    Part-file name of a dataset: changes with the analysis options or the file's stamp
+
+    The stamp is the file size and modification time, not a digest of the
+    contents, so resuming never rereads the archive. A file rewritten with
+    the same size within the filesystem's mtime resolution keeps its key,
+    as does every URL; delete its runs/ part to force a rerun.
+    """
+    payload = json.dumps({"source": source, "stamp": source_stamp(source), "options": options}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_memory_mb(source):
+    """Peak memory of a worker analyzing one dataset, from the file size"""
+    if source.startswith("http"):
+        return WORKER_BASE_MB + URL_ESTIMATE_MB * EXPANSION[".csv"]
+    size_mb = os.path.getsize(source) / 2 ** 20
+    return WORKER_BASE_MB + size_mb * EXPANSION.get(Path(source).suffix.lower(), EXPANSION[".csv"])
+
+
+def available_memory_mb():
+    """Three quarters of physical memory, or 4 GB where it cannot be read"""
+    try:
+        return 0.75 * os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2 ** 20
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+
+def load_dataset(source, columns=None, max_file_size_mb=1024):
+    """Read one dataset: URLs through get_data_from_source, local files memory-mapped and
+    projected to the named columns they have"""
+    if source.startswith("http"):
+        return get_data_from_source(source, max_file_size_mb=max_file_size_mb)
+    fmt = local_format(source)
+    if columns is not None:
+        wanted = set(columns)
+        columns = [c for c in local_columns(source, fmt) if c in wanted]
+    return read_local_frame(source, fmt, columns)
+
+
+def result_tables(source, result, responses):
+    """Long-format effects, fit summary and coefficient rows of one analysis"""
+    simplified = set(result["summary"]["simplified_factors"])
+    effects = [
+        {"source": source, "factor": row["Factor"], "response": y, "logworth": row.get(y),
+         "in_simplified_model": row["Factor"] in simplified}
+        for row in result["summary"]["full_model_effects"] for y in responses
+    ]
+    fits, coefficients = [], []
+    for y in responses:
+        model = result["models"].get(y, {})
+        if "error" in model or "summary_of_fit" not in model:
+            fits.append({"source": source, "response": y, "error": model.get("error", "not fitted")})
+            continue
+        lack_of_fit = model.get("lack_of_fit") or {}
+        fits.append({
+            "source": source, "response": y, "error": None, **model["summary_of_fit"],
+            "lack_of_fit_p_value": lack_of_fit.get("prob_f")
+        })
+        uncoded = {row["term"]: row["estimate"] for row in model.get("uncoded_parameters", [])}
+        for term, row in model["coded_parameters"].items():
+            coefficients.append({"source": source, "response": y, "term": term, **row,
+                                 "uncoded_estimate": uncoded.get(term)})
+    return {"effects": effects, "fits": fits, "coefficients": coefficients}
+
+
+def analyze_source(source, key, options):
+    """
+    Analyze one dataset in a worker process; never raises
+
+    Returns ({table: rows}, run record). Failures give empty tables and a run
+    record with status "error", so one bad file does not stop the batch.
+    """
+    start = time.perf_counter()
+    record = {"source": source, "key": key, "status": "ok", "error": None, "rows": None, "seconds": None}
+    tables = {"effects": [], "fits": [], "coefficients": []}
+    try:
+        df = load_dataset(source, options["predictors"] + options["responses"])
+        responses = [y for y in options["responses"] if y in df.columns]
+        if not responses:
+            raise ValueError(f"None of the responses {options['responses']} are in the file")
+        profile = get_column_profile(df)
+        predictors = [p for p in options["predictors"] if has_variation(profile, p)]
+        if len(predictors) < 2:
+            raise ValueError(f"Need at least 2 predictors with variation, found {predictors}")
+        if options["max_rows"] and len(df) > options["max_rows"]:
+            df, _ = smart_sample_large_dataset(df, options["max_rows"], factor_cols=predictors)
+        result = perform_doe_analysis(
+            df, responses, predictors, options["threshold"], options["min_significant"],
+            model_selection=options["model_selection"], residual_detail="summary"
+        )
+        if "error" in result:
+            raise ValueError(result["error"])
+        tables = result_tables(source, result, responses)
+        record["rows"] = len(df)
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return tables, record
+
+
+def write_part(output, table, key, rows, fmt):
+    """Write one part file of a table atomically (temporary file, then rename)"""
+    directory = Path(output) / table
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{key}.{fmt}"
+    tmp = directory / f".{key}.{fmt}.tmp"
+    schema = SCHEMAS[table]
+    frame = pd.DataFrame(rows).reindex(columns=list(schema)).astype(schema)
+    if fmt == "parquet":
+        frame.to_parquet(tmp, index=False)
+    else:
+        frame.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def previous_runs(output, fmt):
+    """{key: (source, status)} of the runs already written to the output directory"""
+    runs = {}
+    for path in (Path(output) / "runs").glob(f"*.{fmt}"):
+        record = (pd.read_parquet(path) if fmt == "parquet" else pd.read_csv(path)).iloc[0]
+        runs[path.stem] = (record["source"], record["status"])
+    return runs
+
+
+def remove_parts(output, key, fmt):
+    """Drop a superseded run of a dataset from every table"""
+    for name in SCHEMAS:
+        (Path(output) / name / f"{key}.{fmt}").unlink(missing_ok=True)
+
+
+def run_batch(sources, output, options, workers=None, memory_mb=None, resume=False, fmt="parquet"):
+    """
+    Analyze every source in a process pool and write the result tables
+
+    Datasets are started largest first while the summed memory estimate of
+    the running ones stays within memory_mb (one always runs), with at most
+    workers processes. Each worker's BLAS is pinned to one thread so the
+    pool, not the linear algebra, uses the cores. Returns a summary dict.
+    """
+    output = Path(output)
+    workers = workers or os.cpu_count() or 1
+    memory_mb = memory_mb or available_memory_mb()
+    keys = {source: run_key(source, options) for source in sources}
+    previous = previous_runs(output, fmt)
+    done = {key for key, (_, status) in previous.items() if status == "ok"} if resume else set()
+    pending = sorted(((s, estimate_memory_mb(s)) for s in sources if keys[s] not in done), key=lambda item: -item[1])
+    summary = {"sources": len(sources), "skipped": len(sources) - len(pending), "ok": 0, "error": 0}
+
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(pending), 1)), mp_context=get_context("spawn")) as pool:
+        running = {}
+        used = 0.0
+        while pending or running:
+            i = 0
+            while i < len(pending) and len(running) < workers:
+                source, mb = pending[i]
+                if running and used + mb > memory_mb:
+                    i += 1
+                    continue
+                pending.pop(i)
+                running[pool.submit(analyze_source, source, keys[source], options)] = (source, mb)
+                used += mb
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source, mb = running.pop(future)
+                used -= mb
+                tables, record = future.result()
+                for name, rows in tables.items():
+                    write_part(output, name, keys[source], rows, fmt)
+                write_part(output, "runs", keys[source], [record], fmt)
+                for key, (previous_source, _) in previous.items():
+                    if previous_source == source and key != keys[source]:
+                        remove_parts(output, key, fmt)
+                summary[record["status"]] += 1
+                logging.info(f"[{summary['ok'] + summary['error']}/{len(sources) - summary['skipped']}] "
+                             f"{source}: {record['status']} in {record['seconds']} s"
+                             + (f" ({record['error']})" if record["error"] else ""))
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-analyze a directory or manifest of DOE files")
+    parser.add_argument("target", help="directory of CSV/Parquet files, or a manifest with one path or URL per line")
+    parser.add_argument("-o", "--output", required=True, help="directory for the result tables")
+    parser.add_argument("--responses", required=True, help="comma-separated response columns")
+    parser.add_argument("--predictors", required=True, help="comma-separated predictors")
+    parser.add_argument("--threshold", type=float, default=1.3)
+    parser.add_argument("--min-significant", type=int, default=2)
+    parser.add_argument("--model-selection", default="auto")
+    parser.add_argument("--max-rows", type=int, help="sample larger datasets down to this many rows")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--memory-mb", type=float, help="memory budget for concurrent datasets (default: 75%% of RAM)")
+    parser.add_argument("--format", choices=("parquet", "csv"),
+                        default="parquet" if importlib.util.find_spec("pyarrow") else "csv")
+    parser.add_argument("--resume", action="store_true", help="skip datasets already analyzed with the same options")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    options = {
+        "responses": [c.strip() for c in args.responses.split(",")],
+        "predictors": [c.strip() for c in args.predictors.split(",")],
+        "threshold": args.threshold,
+        "min_significant": args.min_significant,
+        "model_selection": args.model_selection,
+        "max_rows": args.max_rows
+    }
+    sources = discover_sources(args.target)
+    summary = run_batch(sources, args.output, options, args.workers, args.memory_mb, args.resume, args.format)
+    print(json.dumps(summary))
+    return 1 if summary["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
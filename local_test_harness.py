@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+In-process test harness for the DOE Analysis function
+
+Builds func.HttpRequest objects and calls DoeAnalysis.main directly, and runs a
+local HTTP fixture server that stands in for SharePoint/GitHub so the URL branch
+of get_data_from_source can be exercised without any network access.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import azure.functions as func
+
+from DoeAnalysis import main
+
+FUNCTION_URL = "/api/doeanalysis"
+
+
+def build_request(payload, method="POST", url=FUNCTION_URL, params=None):
+    """Build a func.HttpRequest carrying a JSON payload, as the Functions host would"""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    return func.HttpRequest(
+        method=method,
+        url=url,
+        headers={"Content-Type": "application/json"},
+        params=params or {},
+        body=body
+    )
+
+
+def call_main(payload):
+    """
+    Call main in-process and return (status_code, parsed_json_body, elapsed_seconds)
+    """
+    req = build_request(payload)
+    start_time = time.perf_counter()
+    response = main(req)
+    elapsed = time.perf_counter() - start_time
+    body = response.get_body()
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        parsed = body.decode("utf-8", errors="replace")
+    return response.status_code, parsed, elapsed
+
+
+def csv_bytes(df):
+    """Encode a DataFrame as CSV bytes"""
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def gzip_bytes(df):
+    """Encode a DataFrame as gzip-compressed CSV bytes"""
+    return gzip.compress(csv_bytes(df))
+
+
+def parquet_bytes(df):
+    """Encode a DataFrame as Parquet bytes (needs pyarrow or fastparquet)"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+class FixtureServer:
+    """
+    Local HTTP server serving registered fixture files
+
+    Each file can be served with a configurable latency, without a content-length
+    header, with chunked transfer encoding and with an ETag (honouring
+    If-None-Match with 304 responses). Every request is recorded in `requests_log`
+    so download and caching behavior can be asserted deterministically.
+
+    Usage:
+        with FixtureServer() as server:
+            url = server.add_file("doe.csv", csv_bytes(df), latency=0.05)
+            status, body, elapsed = call_main({"data": url, ...})
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.files = {}
+        self.requests_log = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    def add_file(self, name, content, latency=0.0, content_length=True, chunked=False,
+                 chunk_size=8192, etag=True, content_type=None, status=200):
+        """Register a fixture file and return its URL"""
+        name = name.lstrip("/")
+        if content_type is None:
+            if name.endswith(".gz"):
+                content_type = "application/gzip"
+            elif name.endswith(".parquet"):
+                content_type = "application/octet-stream"
+            else:
+                content_type = "text/csv"
+        self.files[name] = {
+            "content": content,
+            "latency": latency,
+            "content_length": content_length,
+            "chunked": chunked,
+            "chunk_size": chunk_size,
+            "etag": f'"{hashlib.sha1(content).hexdigest()}"' if etag else None,
+            "content_type": content_type,
+            "status": status
+        }
+        return self.url(name)
+
+    def url(self, name):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{name.lstrip('/')}"
+
+    def hits(self, name=None):
+        """Number of GET requests received, optionally for one file"""
+        with self._lock:
+            if name is None:
+                return len(self.requests_log)
+            return sum(1 for entry in self.requests_log if entry["path"] == name.lstrip("/"))
+
+    def reset_log(self):
+        with self._lock:
+            self.requests_log.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _serve(self, send_body):
+                path = self.path.split("?", 1)[0].lstrip("/")
+                spec = server.files.get(path)
+                with server._lock:
+                    server.requests_log.append({
+                        "path": path,
+                        "method": self.command,
+                        "if_none_match": self.headers.get("If-None-Match"),
+                        "time": time.time()
+                    })
+
+                if spec is None:
+                    self._send_empty(404)
+                    return
+
+                if spec["latency"]:
+                    time.sleep(spec["latency"])
+
+                if spec["etag"] and self.headers.get("If-None-Match") == spec["etag"]:
+                    self.send_response(304)
+                    self.send_header("ETag", spec["etag"])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                content = spec["content"]
+                self.send_response(spec["status"])
+                self.send_header("Content-Type", spec["content_type"])
+                if spec["etag"]:
+                    self.send_header("ETag", spec["etag"])
+
+                if spec["chunked"]:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    if send_body:
+                        step = max(1, spec["chunk_size"])
+                        for start in range(0, len(content), step):
+                            chunk = content[start:start + step]
+                            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+                        self.wfile.write(b"0\r\n\r\n")
+                    return
+
+                if spec["content_length"]:
+                    self.send_header("Content-Length", str(len(content)))
+                else:
+                    # Without a length the body is delimited by closing the connection
+                    self.send_header("Connection", "close")
+                    self.close_connection = True
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(content)
+
+            def _send_empty(self, status):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return FixtureHandler
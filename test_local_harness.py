@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+End-to-end tests of the DOE function against the local fixture server (no network)
+
+Run with: python -m pytest -q test_local_harness.py
+"""
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from local_test_harness import FixtureServer, call_main, csv_bytes, gzip_bytes, parquet_bytes
+
+
+def make_doe_frame(replicates=3, seed=7):
+    """Face-centred 3-factor design with replicates and two responses"""
+    rng = np.random.default_rng(seed)
+    levels = [-1.0, 0.0, 1.0]
+    grid = np.array([(a, b, c) for a in levels for b in levels for c in levels])
+    grid = np.repeat(grid, replicates, axis=0)
+    df = pd.DataFrame({
+        "dye1": 0.3 + 0.1 * grid[:, 0],
+        "dye2": 0.05 + 0.02 * grid[:, 1],
+        "Temp": 60 + 10 * grid[:, 2]
+    })
+    df["Lvalue"] = 80 - 3 * grid[:, 0] + 1.5 * grid[:, 1] + 0.8 * grid[:, 0] * grid[:, 2] + rng.normal(0, 0.2, len(df))
+    df["Avalue"] = 5 + 2 * grid[:, 1] - 0.5 * grid[:, 2] + rng.normal(0, 0.1, len(df))
+    return df
+
+
+@pytest.fixture(scope="module")
+def doe_frame():
+    return make_doe_frame()
+
+
+@pytest.fixture(autouse=True)
+def model_registry(tmp_path, monkeypatch):
+    """Keep registered models in a per-test SQLite file"""
+    path = tmp_path / "models.sqlite"
+    monkeypatch.setenv("DOE_MODEL_REGISTRY", str(path))
+    return path
+
+
+@pytest.fixture
+def server():
+    with FixtureServer() as fixture_server:
+        yield fixture_server
+
+
+def analysis_payload(data):
+    return {
+        "data": data,
+        "response_column": "Lvalue,Avalue",
+        "predictors": ["dye1", "dye2", "Temp"],
+        "force_full_dataset": True,
+        "threshold": 1.3
+    }
+
+
+def assert_models_ok(status, body, rows):
+    assert status == 200, body
+    assert body["data_info"]["analysis_rows"] == rows
+    for response in ("Lvalue", "Avalue"):
+        assert "error" not in body["models"][response]
+        assert body["models"][response]["summary_of_fit"]["observations"] == rows
+
+
+def test_raw_csv_payload(doe_frame):
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    assert_models_ok(status, body, len(doe_frame))
+
+
+def test_sampling_resolves_ai_foundry_predictors(doe_frame):
+    payload = {"data": doe_frame.to_csv(index=False), "response_column": "Lvalue,Avalue",
+               "predictors": ["Dye Concentration", "Temperature"], "max_rows": 40}
+    status, body, _ = call_main(payload)
+    assert status == 200, body
+    sampling = body["data_info"]["sampling_info"]
+    assert sampling["sampling_method"] == "design" and sampling["factor_columns"] == ["dye1", "Temp"]
+    assert body["data_info"]["predictors_used"] == ["dye1", "Temp"]
+
+
+def test_csv_url(server, doe_frame):
+    url = server.add_file("doe.csv", csv_bytes(doe_frame))
+    status, body, _ = call_main(analysis_payload(url))
+    assert_models_ok(status, body, len(doe_frame))
+    assert server.hits("doe.csv") == 1
+
+
+def test_gzip_url(server, doe_frame):
+    url = server.add_file("doe.csv.gz", gzip_bytes(doe_frame))
+    status, body, _ = call_main(analysis_payload(url))
+    assert_models_ok(status, body, len(doe_frame))
+
+
+def test_parquet_url(server, doe_frame):
+    pytest.importorskip("pyarrow")
+    url = server.add_file("doe.parquet", parquet_bytes(doe_frame))
+    status, body, _ = call_main(analysis_payload(url))
+    assert_models_ok(status, body, len(doe_frame))
+
+
+@pytest.mark.parametrize("options", [
+    {"content_length": False},
+    {"chunked": True, "chunk_size": 256},
+    {"latency": 0.05, "etag": False},
+])
+def test_transfer_variants(server, doe_frame, options):
+    url = server.add_file("variant.csv", csv_bytes(doe_frame), **options)
+    status, body, elapsed = call_main(analysis_payload(url))
+    assert_models_ok(status, body, len(doe_frame))
+    assert elapsed >= options.get("latency", 0.0)
+
+
+def test_etag_revalidation(server, doe_frame):
+    import requests
+
+    url = server.add_file("etag.csv", csv_bytes(doe_frame))
+    first = requests.get(url, timeout=5)
+    assert first.headers["ETag"]
+    second = requests.get(url, headers={"If-None-Match": first.headers["ETag"]}, timeout=5)
+    assert second.status_code == 304
+    assert server.hits("etag.csv") == 2
+
+
+def test_identical_concurrent_requests_share_one_analysis(server, doe_frame):
+    from concurrent.futures import ThreadPoolExecutor
+
+    url = server.add_file("burst.csv", csv_bytes(doe_frame), latency=0.3)
+    payloads = [analysis_payload(url), dict(analysis_payload(url), model_selection="auto")] * 2
+    with ThreadPoolExecutor(len(payloads)) as pool:
+        results = list(pool.map(call_main, payloads))
+    assert server.hits("burst.csv") == 1
+    for status, body, _ in results:
+        assert_models_ok(status, body, len(doe_frame))
+        assert body == results[0][1]
+
+    # Nothing is cached once the shared analysis has finished
+    call_main(analysis_payload(url))
+    assert server.hits("burst.csv") == 2
+
+
+def test_partitioned_sources_fetch_concurrently(server, doe_frame):
+    parts = [doe_frame.iloc[i::4] for i in range(4)]
+    for i, part in enumerate(parts[:2]):
+        server.add_file(f"batch_{i + 1}.csv", csv_bytes(part.assign(Operator=i)), latency=0.3)
+    for i, part in enumerate(parts[2:], start=2):
+        server.add_file(f"batch_{i + 1}.parquet", parquet_bytes(part), latency=0.3)
+    urls = [server.url("batch_{1..2}.csv"), server.url("batch_{3,4}.parquet")]
+    status, body, elapsed = call_main(analysis_payload(urls))
+    assert_models_ok(status, body, len(doe_frame))
+    ingestion = body["data_info"]["ingestion"]
+    assert ingestion["rows_per_source"] == [len(part) for part in parts]
+    assert ingestion["columns_dropped"] == ["Operator"]
+    assert elapsed < 0.3 * len(parts)
+
+    server.add_file("short.csv", csv_bytes(doe_frame.drop(columns="Avalue")))
+    status, body, _ = call_main(analysis_payload([server.url("batch_1.csv"), server.url("short.csv")]))
+    assert status == 400
+    assert "missing column(s) ['Avalue']" in body["error"]
+
+
+@pytest.mark.parametrize("options", [{}, {"content_length": False}, {"chunked": True, "chunk_size": 256}])
+def test_oversized_sources_are_rejected_while_streaming(server, doe_frame, options):
+    from DoeAnalysis.ingestion import fetch_frame
+
+    content = csv_bytes(doe_frame)
+    url = server.add_file("large.csv", content, **options)
+    with pytest.raises(ValueError, match="File too large"):
+        fetch_frame(url, max_file_size_mb=(len(content) - 1) / (1024 * 1024))
+    assert len(fetch_frame(url, max_file_size_mb=len(content) / (1024 * 1024))) == len(doe_frame)
+
+
+def test_transient_errors_are_retried(server, doe_frame):
+    url = server.add_file("flaky.csv", csv_bytes(doe_frame), status=503)
+    status, body, _ = call_main(analysis_payload([url, server.add_file("ok.csv", csv_bytes(doe_frame))]))
+    assert status == 400
+    assert server.hits("flaky.csv") == 4
+
+
+def test_missing_file_is_client_error(server):
+    status, body, _ = call_main(analysis_payload(server.url("missing.csv")))
+    assert status == 400
+    assert "Failed to fetch data from URL" in body["error"]
+
+
+def test_failed_collapsed_fit_is_client_error(monkeypatch):
+    # 12 replicated settings with b identical to a: admitted for the collapsed path, but singular
+    monkeypatch.setenv("DOE_MAX_SECONDS", "0.2")
+    rng = np.random.default_rng(6)
+    settings = pd.DataFrame({"a": np.linspace(0.0, 1.0, 12), "c": np.tile([0.0, 1.0, 2.0], 4)})
+    settings["b"] = settings["a"]
+    df = settings.loc[np.repeat(settings.index, 500)].reset_index(drop=True)
+    df["y"] = df["a"] + rng.normal(0, 0.1, len(df))
+    df["z"] = df["c"] + rng.normal(0, 0.1, len(df))
+    status, body, _ = call_main({"data": df.to_csv(index=False), "response_column": "y,z",
+                                 "predictors": ["a", "b", "c"], "force_full_dataset": True})
+    assert status == 400
+    assert body["admission"]["options"]["collapse"] and "distinct factor settings" in body["error"]
+
+
+@pytest.mark.parametrize("name", ["history.csv", "history.parquet", "history.arrow", "history.npy"])
+def test_mounted_file_is_read_projected(tmp_path, monkeypatch, doe_frame, name):
+    import pyarrow as pa
+
+    mount = tmp_path / "mount"
+    mount.mkdir()
+    frame = doe_frame.assign(Notes="unused", Batch=np.arange(len(doe_frame)))
+    path = mount / name
+    if name.endswith(".csv"):
+        frame.to_csv(path, index=False)
+    elif name.endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    elif name.endswith(".arrow"):
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, pa.Schema.from_pandas(frame, preserve_index=False)) as writer:
+            writer.write_table(pa.Table.from_pandas(frame, preserve_index=False))
+    else:
+        np.save(path, frame.drop(columns="Notes").to_records(index=False))
+    monkeypatch.setenv("DOE_DATA_ROOTS", str(mount))
+
+    status, body, _ = call_main(analysis_payload(str(path)))
+    assert_models_ok(status, body, len(doe_frame))
+    assert body["data_info"]["ingestion"]["columns_read"] == 5
+    assert body["data_info"]["analysis_columns"] == 5
+
+    (tmp_path / "secret.csv").write_text("a,b\n1,2\n")
+    (mount / "link.csv").symlink_to(tmp_path / "secret.csv")
+    for outside in (str(tmp_path / "secret.csv"), str(mount / "link.csv"), f"file://{mount}/../secret.csv"):
+        status, body, _ = call_main(analysis_payload(outside))
+        assert status == 400
+        assert "outside the permitted data roots" in body["error"]
+
+
+def test_mounted_file_matches_inline_data(tmp_path, monkeypatch, doe_frame):
+    df = doe_frame.copy()
+    df["Part"] = np.where(np.arange(len(df)) % 3 == 0, "Bucket", "Kickstand")
+    df["Lvalue"] += np.where(df["Part"] == "Bucket", 2.0, 0.0)
+    path = tmp_path / "runs.parquet"
+    df.to_parquet(path, index=False)
+    monkeypatch.setenv("DOE_DATA_ROOTS", str(tmp_path))
+
+    # "Temperature" is an AI Foundry alias, "Missing" is not in the file and Part is only named as categorical
+    payload = dict(analysis_payload(None), predictors=["dye1", "dye2", "Temperature", "Missing"],
+                   categorical_factors=["Part"])
+    inline_status, inline, _ = call_main(dict(payload, data=df.to_csv(index=False)))
+    status, body, _ = call_main(dict(payload, data=str(path)))
+    assert_models_ok(inline_status, inline, len(df))
+    assert_models_ok(status, body, len(df))
+    assert body["data_info"]["predictors_used"] == inline["data_info"]["predictors_used"] == ["dye1", "dye2", "Temp", "Part"]
+    assert body["summary"]["simplified_factors"] == inline["summary"]["simplified_factors"]
+    for response in ("Lvalue", "Avalue"):
+        coded, expected = body["models"][response]["coded_parameters"], inline["models"][response]["coded_parameters"]
+        assert coded.keys() == expected.keys()
+        for term, row in expected.items():
+            assert coded[term]["coefficient"] == pytest.approx(row["coefficient"])
+
+
+def test_predict_from_registered_model(doe_frame, model_registry):
+    import statsmodels.formula.api as smf
+    from sklearn.preprocessing import StandardScaler
+    from DoeAnalysis import registry
+
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    assert status == 200
+    model_id = body["summary"]["model_id"]
+    assert model_id and model_registry.exists()
+
+    predictors = ["dye1", "dye2", "Temp"]
+    settings = doe_frame[predictors].sample(50, replace=True, random_state=2).reset_index(drop=True)
+    # Drop the in-memory copy so the record is read back from SQLite
+    registry._MODEL_CACHE.clear()
+    status, prediction, _ = call_main({"operation": "predict", "model_id": model_id, "settings": settings.to_dict("records")})
+    assert status == 200 and prediction["n_settings"] == 50
+
+    scaler = StandardScaler().fit(doe_frame[predictors])
+    coded = doe_frame.copy()
+    coded[predictors] = scaler.transform(doe_frame[predictors])
+    new = settings.copy()
+    new[predictors] = scaler.transform(settings[predictors])
+    for response in ("Lvalue", "Avalue"):
+        fit = smf.ols(f"{response} ~ " + " + ".join(body["summary"]["simplified_factors"]), data=coded).fit()
+        expected = fit.get_prediction(new).summary_frame(alpha=0.05)
+        got = prediction["predictions"][response]
+        np.testing.assert_allclose(got["predicted"], expected["mean"], rtol=1e-9)
+        np.testing.assert_allclose(got["ci_lower"], expected["mean_ci_lower"], rtol=1e-9)
+        np.testing.assert_allclose(got["pi_upper"], expected["obs_ci_upper"], rtol=1e-9)
+
+
+def test_predict_errors(doe_frame):
+    status, _, _ = call_main({"operation": "predict", "model_id": "0000", "settings": [{"dye1": 0.3}]})
+    assert status == 404
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    status, error, _ = call_main({"operation": "predict", "model_id": body["summary"]["model_id"], "settings": [{"dye1": 0.3}]})
+    assert status == 400 and "Missing factor setting" in error["error"]
+
+
+def test_registered_models_expire(doe_frame, model_registry, monkeypatch):
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    model_id = body["summary"]["model_id"]
+    setting = [{"dye1": 0.3, "dye2": 0.05, "Temp": 60}]
+
+    monkeypatch.setenv("DOE_MODEL_TTL_HOURS", "0")
+    # Saving another model purges the expired one from SQLite and the cache
+    status, other, _ = call_main(analysis_payload(doe_frame.iloc[:60].to_csv(index=False)))
+    status, _, _ = call_main({"operation": "predict", "model_id": model_id, "settings": setting})
+    assert status == 404
+    conn = sqlite3.connect(model_registry)
+    try:
+        assert conn.execute("SELECT model_id FROM models").fetchall() == [(other["summary"]["model_id"],)]
+    finally:
+        conn.close()
+
+
+def test_optimize_beats_dense_grid(doe_frame):
+    from DoeAnalysis.optimization import overall_desirability, parse_goals
+    from DoeAnalysis.registry import load_model
+
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    model_id = body["summary"]["model_id"]
+    goals = {"Lvalue": {"goal": "target", "target": 80.5}, "Avalue": {"goal": "maximize", "weight": 2}}
+    status, optimum, elapsed = call_main({"operation": "optimize", "model_id": model_id, "goals": goals})
+    assert status == 200, optimum
+    assert elapsed < 1.0
+
+    record = load_model(model_id)
+    axes = [np.linspace(lo, hi, 41) for lo, hi in (record["factor_ranges"][p] for p in record["predictors"])]
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes))
+    grid_best = overall_desirability(record, parse_goals(record, goals), grid)[0].max()
+    assert optimum["desirability"] >= grid_best - 1e-6
+    for predictor, (lo, hi) in record["factor_ranges"].items():
+        assert lo <= optimum["optimum"][predictor] <= hi
+    assert optimum["predictions"]["Lvalue"]["pi_lower"] < optimum["predictions"]["Lvalue"]["predicted"]
+
+    status, error, _ = call_main({"operation": "optimize", "model_id": model_id, "goals": {"Bvalue": {"goal": "maximize"}}})
+    assert status == 400 and "Unknown response" in error["error"]
+    for options in ({"seed": "abc"}, {"seed": -1}, {"seed": None}, {"starts": "many"}, {"confidence_level": [0.9]}):
+        status, error, _ = call_main({"operation": "optimize", "model_id": model_id, "goals": goals, **options})
+        assert status == 400 and "error" in error, options
+
+
+def test_profile_grids_match_point_predictions(doe_frame):
+    payload = dict(analysis_payload(doe_frame.to_csv(index=False)), surfaces={"pairs": [["dye1", "Temp"]], "resolution": 7})
+    status, body, _ = call_main(payload)
+    assert status == 200
+    surfaces = body["surfaces"]
+    contour = surfaces["contours"][0]
+    assert (contour["x_factor"], contour["y_factor"]) == ("dye1", "Temp")
+    assert np.array(contour["z"]["Lvalue"]).shape == (7, 7)
+
+    i, j = 2, 5
+    setting = dict(surfaces["hold"], dye1=contour["x"][j], Temp=contour["y"][i])
+    status, prediction, _ = call_main({"operation": "predict", "model_id": body["summary"]["model_id"], "settings": [setting]})
+    assert prediction["predictions"]["Lvalue"]["predicted"][0] == pytest.approx(contour["z"]["Lvalue"][i][j])
+    trace = surfaces["profiler"]["dye2"]
+    setting = dict(surfaces["hold"], dye2=trace["x"][-1])
+    status, prediction, _ = call_main({"operation": "predict", "model_id": body["summary"]["model_id"], "settings": [setting]})
+    assert prediction["predictions"]["Avalue"]["ci_upper"][0] == pytest.approx(trace["responses"]["Avalue"]["ci_upper"][-1])
+
+    status, profile, _ = call_main({"operation": "profile", "model_id": body["summary"]["model_id"], "resolution": 11})
+    assert status == 200 and len(profile["contours"]) == 3 and len(profile["profiler"]["Temp"]["x"]) == 11
+    status, _, _ = call_main({"operation": "profile", "model_id": body["summary"]["model_id"], "pairs": [["dye1", "dye1"]]})
+    assert status == 400
+
+
+def test_design_operation_augments_existing_runs():
+    factors = {"dye1": [0.2, 0.4], "dye2": [0.03, 0.07], "Temp": [50, 70]}
+    existing = [{"dye1": 0.3, "dye2": 0.05, "Temp": 60}] * 3
+    status, body, elapsed = call_main({"operation": "design", "factors": factors, "runs": 12, "existing_runs": existing})
+    assert status == 200, body
+    assert len(body["design"]) == 12 and body["existing_runs"] == 3
+    assert body["model_terms"] == ["dye1", "dye2", "Temp", "dye1:dye2", "dye1:Temp", "dye2:Temp"]
+    for row in body["design"]:
+        for factor, (low, high) in factors.items():
+            assert low <= row[factor] <= high
+    assert body["efficiency"]["d_efficiency"] > 50
+    status, _, _ = call_main({"operation": "design", "factors": factors, "runs": 2})
+    assert status == 400
+    # Squared terms cannot be estimated from two levels
+    status, body, _ = call_main({"operation": "design", "factors": factors, "runs": 12, "model": "quadratic", "levels": 2})
+    assert status == 400 and "levels" in body["error"]
+
+
+def test_append_matches_full_refit(doe_frame):
+    import statsmodels.formula.api as smf
+
+    first, rest = doe_frame.iloc[:60], doe_frame.iloc[60:]
+    status, body, _ = call_main(dict(analysis_payload(first.to_csv(index=False)), open_session=True))
+    assert status == 200
+    terms = body["summary"]["simplified_factors"]
+    new_rows = rest.to_dict("records") + [{"dye1": 0.3, "dye2": 0.05, "Temp": 60, "Lvalue": None, "Avalue": 5.0}]
+    status, appended, _ = call_main({"operation": "append", "session_id": body["summary"]["session_id"], "rows": new_rows})
+    assert status == 200, appended
+    assert appended["appended_rows"] == len(rest) and appended["dropped_rows"] == 1
+    assert appended["observations"] == len(doe_frame)
+
+    predictors = ["dye1", "dye2", "Temp"]
+    for response in ("Lvalue", "Avalue"):
+        refit = smf.ols(f"{response} ~ " + " + ".join(terms), data=doe_frame).fit()
+        fit_block = appended["models"][response]["summary_of_fit"]
+        assert fit_block["r_squared"] == pytest.approx(refit.rsquared, rel=1e-9)
+        assert fit_block["rmse"] == pytest.approx(np.sqrt(refit.mse_resid), rel=1e-9)
+        lack_of_fit = appended["models"][response]["lack_of_fit"]
+        assert lack_of_fit["total_error"]["ss"] == pytest.approx(refit.ssr, rel=1e-9)
+        assert lack_of_fit["pure_error"]["df"] == len(doe_frame) - len(doe_frame[predictors].drop_duplicates())
+        pure_error = doe_frame.groupby(predictors)[response].transform(lambda y: y - y.mean())
+        assert lack_of_fit["pure_error"]["ss"] == pytest.approx((pure_error ** 2).sum(), rel=1e-9)
+
+    # The updated model is registered for predictions
+    settings = doe_frame[predictors].iloc[:5]
+    status, prediction, _ = call_main({"operation": "predict", "model_id": appended["model_id"], "settings": settings.to_dict("records")})
+    refit = smf.ols("Lvalue ~ " + " + ".join(terms), data=doe_frame).fit()
+    np.testing.assert_allclose(prediction["predictions"]["Lvalue"]["predicted"], refit.predict(settings), rtol=1e-9)
+
+    status, _, _ = call_main({"operation": "append", "session_id": "missing", "rows": new_rows})
+    assert status == 404
+
+
+def test_sessions_are_opt_in_and_expire(doe_frame, monkeypatch):
+    status, body, _ = call_main(analysis_payload(doe_frame.to_csv(index=False)))
+    assert status == 200 and body["summary"]["model_id"] and body["summary"]["session_id"] is None
+
+    status, body, _ = call_main(dict(analysis_payload(doe_frame.to_csv(index=False)), open_session=True))
+    session_id = body["summary"]["session_id"]
+    rows = doe_frame.iloc[:3].to_dict("records")
+    status, _, _ = call_main({"operation": "append", "session_id": session_id, "rows": rows})
+    assert status == 200
+
+    monkeypatch.setenv("DOE_SESSION_TTL_HOURS", "0")
+    status, _, _ = call_main({"operation": "append", "session_id": session_id, "rows": rows})
+    assert status == 404
+    # Opening another session purges the expired one and its group table
+    status, body, _ = call_main(dict(analysis_payload(doe_frame.to_csv(index=False)), open_session=True))
+    conn = sqlite3.connect(os.environ["DOE_MODEL_REGISTRY"])
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM session_groups WHERE session_id = ?", (session_id,)).fetchone()[0] == 0
+        assert conn.execute("SELECT session_id FROM sessions").fetchall() == [(body["summary"]["session_id"],)]
+    finally:
+        conn.close()
+
+
+def test_categorical_factor_analysis(doe_frame):
+    df = doe_frame.copy()
+    df["Part"] = np.where(np.arange(len(df)) % 3 == 0, "Bucket", "Kickstand")
+    df["Lvalue"] += np.where(df["Part"] == "Bucket", 2.0, 0.0)
+    payload = dict(analysis_payload(df.to_csv(index=False)), predictors=["dye1", "dye2", "Temp", "Part"])
+    status, body, _ = call_main(payload)
+    assert_models_ok(status, body, len(df))
+
+    summary = body["summary"]
+    assert summary["parameters"]["categorical_factors"] == ["Part"]
+    assert summary["model_selection"]["method"] == "threshold"
+    assert summary["model_id"] is None
+    effects = {row["Factor"]: row for row in summary["full_model_effects"]}
+    assert effects["C(Part, Sum)"]["Lvalue"] > 10
+    assert "C(Part, Sum)" in summary["simplified_factors"]
+    coded = body["models"]["Lvalue"]["coded_parameters"]
+    assert coded["C(Part, Sum)[S.Bucket]"]["coefficient"] == pytest.approx(1.0, abs=0.15)
+
+    status, body, _ = call_main(dict(payload, categorical_coding="dummy"))
+    assert status == 400
+
+
+def test_batch_runner_writes_tables_and_resumes(tmp_path, doe_frame):
+    from batch_analysis import discover_sources, run_batch
+
+    archive = tmp_path / "archive"
+    (archive / "2024").mkdir(parents=True)
+    doe_frame.to_csv(archive / "day1.csv", index=False)
+    doe_frame.iloc[::2].to_parquet(archive / "2024" / "day2.parquet")
+    (archive / "broken.csv").write_text("x,y\n1,2\n")
+    output = tmp_path / "results"
+    options = {"responses": ["Lvalue", "Avalue"], "predictors": ["dye1", "dye2", "Temp"], "threshold": 1.3,
+               "min_significant": 1, "model_selection": "auto", "max_rows": None}
+
+    sources = discover_sources(archive)
+    assert len(sources) == 3
+    summary = run_batch(sources, output, options, workers=2)
+    assert (summary["ok"], summary["error"]) == (2, 1)
+    fits = pd.read_parquet(output / "fits")
+    assert len(fits) == 4 and fits["r_squared"].gt(0.9).all()
+    coefficients = pd.read_parquet(output / "coefficients")
+    day1 = coefficients[coefficients["source"].str.endswith("day1.csv")].set_index(["response", "term"])
+    assert day1.loc[("Lvalue", "dye1"), "coefficient"] < -2
+
+    # Finished datasets are skipped; failures and changed files run again
+    doe_frame.iloc[::3].to_csv(archive / "day1.csv", index=False)
+    summary = run_batch(sources, output, options, workers=2, resume=True)
+    assert (summary["skipped"], summary["ok"], summary["error"]) == (1, 1, 1)
+    runs = pd.read_parquet(output / "runs")
+    assert len(runs) == 3
+    assert runs.loc[runs["source"].str.endswith("day1.csv"), "rows"].item() == len(doe_frame.iloc[::3])
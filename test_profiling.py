@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests of the single-pass column profiler and its per-frame cache (no network)
+
+Run with: python -m pytest -q test_profiling.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from DoeAnalysis.profiling import build_column_profile, get_column_profile, numeric_columns
+
+
+def make_profile_frame():
+    return pd.DataFrame({
+        "dye1": [0.2, 0.4, np.nan, 0.2, 0.4, np.nan],
+        "Temp": [50, 60, 70, 50, 60, 70],
+        "Lvalue": np.linspace(80.0, 85.0, 6),
+        "Part": ["Bucket", None, "Kickstand", "Bucket", "Bucket", None]
+    })
+
+
+def test_profile_counts_distinct_values_without_nans():
+    df = make_profile_frame()
+    profile = build_column_profile(df)
+    assert profile["dye1"]["nunique"] == df["dye1"].nunique() == 2
+    assert profile["dye1"]["null_count"] == 2
+    assert profile["Part"]["nunique"] == df["Part"].nunique() == 2
+    assert profile["Part"]["null_count"] == 2
+    assert profile["dye1"]["min"] == 0.2 and profile["dye1"]["max"] == 0.4
+    assert profile["dye1"]["mean"] == df["dye1"].mean()
+    assert profile["dye1"]["std"] == df["dye1"].std()
+    assert not profile["Part"]["is_numeric"] and profile["Part"]["is_categorical"]
+    assert numeric_columns(profile) == ["dye1", "Temp", "Lvalue"]
+
+
+def test_profile_level_tables():
+    df = make_profile_frame()
+    profile = build_column_profile(df, max_levels=3)
+    assert profile["dye1"]["levels"] == {0.2: 2, 0.4: 2}
+    assert profile["Temp"]["levels"] == {50.0: 2, 60.0: 2, 70.0: 2}
+    assert profile["Part"]["levels"] == {"Bucket": 3, "Kickstand": 1}
+    # More distinct values than max_levels: no level table
+    assert profile["Lvalue"]["levels"] is None
+
+    empty = build_column_profile(pd.DataFrame({"x": [np.nan, np.nan]}))
+    assert empty["x"]["nunique"] == 0 and empty["x"]["levels"] is None and empty["x"]["min"] is None
+
+
+def test_profile_cache_is_reused_and_invalidated():
+    df = make_profile_frame()
+    profile = get_column_profile(df)
+    assert get_column_profile(df) is profile
+    # An equal copy is a different frame with its own entry
+    assert get_column_profile(df.copy()) is not profile
+
+    df.loc[1, "Temp"] = 90
+    edited = get_column_profile(df)
+    assert edited is not profile and edited["Temp"]["max"] == 90.0
+    assert get_column_profile(df) is edited
+
+    df.loc[0, "Part"] = "Lid"
+    assert get_column_profile(df)["Part"]["nunique"] == 3
+
+    df["Extra"] = 1.0
+    assert "Extra" in get_column_profile(df)
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Tests of the shared regression engine behind perform_doe_analysis (no network)
+
+Run with: python -m pytest -q test_regression_engine.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from DoeAnalysis import perform_doe_analysis
+from DoeAnalysis.model_selection import screen_rsm_terms
+
+
+def make_screening_frame(n_factors=12, n_runs=60, seed=1):
+    """Many-factor design where only x0, x1, x0:x1, x2^2 (y) and x3 (z) are active"""
+    rng = np.random.default_rng(seed)
+    coded = rng.choice([-1.0, 0.0, 1.0], size=(n_runs, n_factors))
+    df = pd.DataFrame(coded * 2 + 10, columns=[f"x{i}" for i in range(n_factors)])
+    df["y"] = (3 * coded[:, 0] - 2 * coded[:, 1] + 1.5 * coded[:, 0] * coded[:, 1]
+               + 2 * coded[:, 2] ** 2 + rng.normal(0, 0.5, n_runs))
+    df["z"] = coded[:, 3] + rng.normal(0, 0.5, n_runs)
+    return df
+
+
+@pytest.fixture(scope="module")
+def screening_frame():
+    return make_screening_frame()
+
+
+@pytest.mark.parametrize("heredity", ["weak", "strong"])
+def test_screening_recovers_active_terms(screening_frame, heredity):
+    predictors = [c for c in screening_frame.columns if c.startswith("x")]
+    effects, info = screen_rsm_terms(screening_frame, predictors, ["y", "z"], 1.3, heredity=heredity)
+    selected = set(info["selected_terms"])
+    assert {"x0", "x1", "x3", "x0:x1"} <= selected
+    if heredity == "weak":
+        assert "I(x2 ** 2)" in selected
+    # Every selected second-order term keeps its parents
+    for term in selected:
+        for parent in term.replace("I(", "").replace(" ** 2)", "").split(":"):
+            assert parent in selected
+    assert list(effects.columns) == ["Factor", "y", "z"]
+
+
+def test_screening_respects_budget(screening_frame):
+    predictors = [c for c in screening_frame.columns if c.startswith("x")]
+    _, info = screen_rsm_terms(screening_frame, predictors, ["y", "z"], 0.0, max_terms=5)
+    assert len(info["selected_terms"]) <= 5
+
+
+def test_auto_selection_screens_many_predictors(screening_frame):
+    predictors = [c for c in screening_frame.columns if c.startswith("x")]
+    result = perform_doe_analysis(screening_frame.copy(), ["y", "z"], predictors, 1.3, 1)
+    assert result["summary"]["model_selection"]["method"] == "screening"
+    assert "I(x2 ** 2)" in result["summary"]["simplified_factors"]
+    assert result["models"]["y"]["summary_of_fit"]["r_squared"] > 0.9
+
+
+def test_stepwise_downdates_match_refit(screening_frame):
+    import statsmodels.formula.api as smf
+    from DoeAnalysis.model_selection import backward_eliminate
+
+    predictors = ["x0", "x1", "x2", "x3", "x4"]
+    _, info = backward_eliminate(screening_frame, predictors, ["y", "z"], 1.3)
+    for y in ("y", "z"):
+        summary = info["responses"][y]
+        assert summary["removal_path"]
+        final_terms = summary["final_terms"]
+        refit = smf.ols(f"{y} ~ " + " + ".join(final_terms), data=screening_frame).fit()
+        expected = -np.log10(np.maximum(refit.pvalues[final_terms].to_numpy(), 1e-16))
+        got = np.array([summary["final_logworth"][t] for t in final_terms])
+        np.testing.assert_allclose(got, expected, rtol=1e-6, atol=1e-8)
+    assert {"x0", "x1", "x0:x1", "I(x2 ** 2)", "x2"} <= set(info["simplified_factors"])
+
+
+def test_stepwise_drops_aliased_squares_of_two_level_factors():
+    from itertools import product
+
+    df = pd.DataFrame(list(product([-1.0, 1.0], repeat=5)) * 2, columns=list("abcde"))
+    df["y"] = 3 + df["a"] - 2 * df["b"] + 1.5 * df["a"] * df["c"] + np.random.default_rng(2).normal(0, 0.3, len(df))
+    result = perform_doe_analysis(df, ["y"], list("abcde"), 1.3, 1, model_selection="stepwise")
+    assert "error" not in result
+    assert result["summary"]["model_selection"]["aliased_terms"] == [f"I({x} ** 2)" for x in "abcde"]
+    assert {"a", "b", "c", "a:c"} <= set(result["summary"]["simplified_factors"])
+
+
+def test_all_subsets_matches_exhaustive_refits():
+    import statsmodels.formula.api as smf
+    from DoeAnalysis.model_selection import all_subsets_search
+
+    df = make_screening_frame(n_factors=4, n_runs=40, seed=3)
+    predictors = ["x0", "x1", "x2", "x3"]
+    _, info = all_subsets_search(df, predictors, ["y", "z"], criterion="bic", top_models=3)
+    best = info["best_models"][0]
+    assert {"x0", "x1", "x0:x1"} <= set(best["terms"])
+    for y in ("y", "z"):
+        refit = smf.ols(f"{y} ~ " + " + ".join(best["terms"]), data=df).fit()
+        assert abs(refit.ssr - best["responses"][y]["rss"]) < 1e-8 * max(refit.ssr, 1.0)
+    criteria = [model["criterion"] for model in info["best_models"]]
+    assert criteria == sorted(criteria)
+
+
+def test_influence_diagnostics_match_statsmodels(screening_frame):
+    import statsmodels.formula.api as smf
+    from statsmodels.stats.outliers_influence import OLSInfluence
+    from DoeAnalysis.regression import influence_diagnostics, shared_design_fit, top_outliers
+
+    terms = ["x0", "x1", "x0:x1", "I(x2 ** 2)"]
+    fit = shared_design_fit(screening_frame, terms, ["y", "z"])
+    diagnostics = influence_diagnostics(fit)
+    for k, y in enumerate(("y", "z")):
+        influence = OLSInfluence(smf.ols(f"{y} ~ " + " + ".join(terms), data=screening_frame).fit())
+        np.testing.assert_allclose(diagnostics["leverage"], influence.hat_matrix_diag, atol=1e-10)
+        np.testing.assert_allclose(diagnostics["studentized_residuals"][:, k], influence.resid_studentized_internal, atol=1e-8)
+        np.testing.assert_allclose(diagnostics["externally_studentized_residuals"][:, k], influence.resid_studentized_external, atol=1e-8)
+        np.testing.assert_allclose(diagnostics["cooks_distance"][:, k], influence.cooks_distance[0], atol=1e-10)
+        np.testing.assert_allclose(diagnostics["dffits"][:, k], influence.dffits[0], atol=1e-8)
+    outliers = top_outliers(diagnostics, 0, fit["index"], fit["rank"], 3)
+    extremes = np.abs([row["externally_studentized_residual"] for row in outliers])
+    assert len(outliers) == 3 and np.all(np.diff(extremes) <= 0)
+
+
+@pytest.mark.filterwarnings("ignore:The design matrix is rank-deficient")
+def test_influence_diagnostics_with_an_aliased_leading_column():
+    import statsmodels.formula.api as smf
+    from DoeAnalysis.regression import influence_diagnostics, press_statistics, shared_design_fit
+
+    settings = [(a, b, c) for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1)]
+    df = pd.DataFrame(settings, columns=["a", "b", "c"])
+    df["aa"] = 2 * df["a"] + 5
+    df["y"] = 1 + df["a"] + 2 * df["b"] - df["c"] + np.random.default_rng(0).normal(0, 0.8, len(df))
+    fit = shared_design_fit(df, ["a", "aa", "b", "c"], ["y"])
+    diagnostics = influence_diagnostics(fit)
+    reference = smf.ols("y ~ a + aa + b + c", data=df).fit()
+    leverage = reference.get_influence().hat_matrix_diag
+    assert fit["rank"] == 4
+    np.testing.assert_allclose(diagnostics["leverage"], leverage, atol=1e-10)
+    np.testing.assert_allclose(fit["sse"], reference.ssr, rtol=1e-10)
+    press = press_statistics(fit, diagnostics)["press"][0]
+    assert press == pytest.approx(((reference.resid / (1 - leverage)) ** 2).sum(), rel=1e-10)
+
+
+def test_press_and_kfold_match_refits(screening_frame):
+    import statsmodels.formula.api as smf
+    from DoeAnalysis.regression import (
+        influence_diagnostics, kfold_cross_validation, press_statistics, shared_design_fit
+    )
+
+    terms = ["x0", "x1", "x0:x1", "I(x2 ** 2)"]
+    fit = shared_design_fit(screening_frame, terms, ["y"])
+    press = press_statistics(fit, influence_diagnostics(fit))
+    cv = kfold_cross_validation(fit, 5, seed=4)
+
+    folds = np.array_split(np.random.default_rng(4).permutation(len(screening_frame)), 5)
+    formula = "y ~ " + " + ".join(terms)
+    loo_sse = 0.0
+    for i in range(len(screening_frame)):
+        refit = smf.ols(formula, data=screening_frame.drop(index=i)).fit()
+        loo_sse += float((screening_frame["y"].iloc[i] - refit.predict(screening_frame.iloc[[i]]).iloc[0]) ** 2)
+    cv_sse = 0.0
+    for rows in folds:
+        held_out = screening_frame.iloc[rows]
+        refit = smf.ols(formula, data=screening_frame.drop(index=held_out.index)).fit()
+        cv_sse += float(((held_out["y"] - refit.predict(held_out)) ** 2).sum())
+    np.testing.assert_allclose(press["press"][0], loo_sse, rtol=1e-8)
+    np.testing.assert_allclose(cv["rmse"][0], np.sqrt(cv_sse / len(screening_frame)), rtol=1e-8)
+    assert press["predicted_r_squared"][0] < 1.0
+
+
+@pytest.mark.parametrize("method", ["case", "residual"])
+def test_batched_bootstrap_matches_replicate_refits(screening_frame, method):
+    from DoeAnalysis.bootstrap import bootstrap_fits, bootstrap_logworth, percentile_interval
+    from DoeAnalysis.regression import coefficient_tests, qr_fit, shared_design_fit
+
+    fit = shared_design_fit(screening_frame, ["x0", "x1", "x0:x1", "I(x2 ** 2)"], ["y", "z"])
+    boot = bootstrap_fits(fit, method=method, replicates=20, seed=11)
+    logworth = bootstrap_logworth(boot)
+
+    rng = np.random.default_rng(11)
+    n = len(fit["Y"])
+    if method == "residual":
+        leverage = (fit["q"] ** 2).sum(axis=1)
+        adjusted = fit["residuals"] / np.sqrt(1 - leverage)[:, None]
+        adjusted -= adjusted.mean(axis=0)
+        draws = rng.integers(0, n, size=(20, n))
+    else:
+        counts = rng.multinomial(n, np.full(n, 1.0 / n), size=20)
+    for b in range(20):
+        if method == "residual":
+            replicate = qr_fit(fit["X"], fit["fitted"] + adjusted[draws[b]])
+        else:
+            rows = np.repeat(np.arange(n), counts[b])
+            replicate = qr_fit(fit["X"][rows], fit["Y"][rows])
+        np.testing.assert_allclose(boot["coefficients"][b], replicate["coefficients"], atol=1e-8)
+        # coefficient_tests floors p at 1e-16; the bootstrap LogWorths are not capped
+        np.testing.assert_allclose(np.minimum(logworth[b], 16), coefficient_tests(replicate)["logworth"], rtol=1e-6, atol=1e-8)
+
+    lower, upper = percentile_interval(boot["coefficients"], 0.9)
+    assert np.all(lower <= upper)
+
+
+def test_collinearity_report_matches_direct_vifs(screening_frame):
+    from statsmodels.stats.outliers_influence import variance_inflation_factor
+    from DoeAnalysis.regression import collinearity_diagnostics, shared_design_fit
+
+    frame = screening_frame.copy()
+    frame["x12"] = frame["x0"] + 0.05 * frame["x1"] + 0.01 * np.random.default_rng(0).normal(size=len(frame))
+    fit = shared_design_fit(frame, ["x0", "x1", "x2", "x12"], ["y"])
+    report = collinearity_diagnostics(fit["X"], fit["columns"])
+
+    scaled = fit["X"] / np.sqrt((fit["X"] ** 2).sum(axis=0))
+    assert report["condition_number"] == pytest.approx(np.linalg.cond(scaled), rel=1e-8)
+    for j, term in enumerate(fit["columns"][1:], start=1):
+        assert report["vif"][term] == pytest.approx(variance_inflation_factor(fit["X"], j), rel=1e-6)
+    worst = report["dimensions"][-1]
+    assert {"x0", "x12"} <= set(worst["collinear_terms"])
+    proportions = np.array([list(d["variance_proportions"].values()) for d in report["dimensions"]])
+    np.testing.assert_allclose(proportions.sum(axis=0), 1.0)
+
+    aliased = collinearity_diagnostics(np.column_stack([fit["X"], fit["X"][:, 1]]), fit["columns"] + ["copy"])
+    assert aliased["rank"] == fit["X"].shape[1]
+    assert aliased["vif"]["copy"] is None and aliased["dimensions"][-1]["condition_index"] is None
+
+
+@pytest.mark.parametrize("criterion", ["D", "I"])
+def test_coordinate_exchange_reaches_a_local_optimum(criterion):
+    from DoeAnalysis.design import coordinate_exchange, design_model_terms, model_expansion, region_moments
+
+    _, index_lists = design_model_terms(["a", "b", "c", "d"], "quadratic")
+    existing = np.zeros((2, 4))
+    coded, info = coordinate_exchange(index_lists, 4, 18, criterion=criterion, existing=existing, starts=4, seed=5)
+    assert not info["timed_out"] and coded.shape == (18, 4)
+
+    moments = region_moments(index_lists, 4)
+    def score(design):
+        F = model_expansion(np.vstack([existing, design]), index_lists)
+        if criterion == "D":
+            return np.linalg.slogdet(F.T @ F)[1]
+        return -np.trace(np.linalg.inv(F.T @ F) @ moments)
+
+    # The tracked rank-one updates must agree with a brute-force rescoring
+    best = score(coded)
+    expected = info["log_determinant"] if criterion == "D" else -info["average_prediction_variance"]
+    assert best == pytest.approx(expected, rel=1e-9)
+    for i in range(len(coded)):
+        for j in range(4):
+            for level in (-1.0, 0.0, 1.0):
+                trial = coded.copy()
+                trial[i, j] = level
+                assert score(trial) <= best + 1e-8 * abs(best)
+
+
+def test_design_preserving_sample_keeps_every_design_point():
+    from DoeAnalysis.sampling import design_point_groups, design_preserving_sample
+
+    rng = np.random.default_rng(11)
+    levels = np.array(np.meshgrid([-1, 0, 1], [-1, 0, 1], [10, 20, 30])).reshape(3, -1).T
+    reps = rng.integers(1, 40, size=len(levels))
+    rows = np.repeat(levels, reps, axis=0)
+    df = pd.DataFrame(rows, columns=["a", "b", "c"]).assign(y=rng.normal(size=len(rows)))
+    factors = ["a", "b", "c"]
+    groups = design_point_groups(df, factors)
+    counts = np.bincount(groups)
+
+    efficiency = {}
+    for method in ("design", "d_optimal"):
+        keep, info = design_preserving_sample(df, factors, 120, method=method)
+        assert len(keep) == 120 and len(np.unique(keep)) == 120
+        assert info["design_points_kept"] == info["design_points"] == len(levels)
+        kept = np.bincount(groups[keep], minlength=len(counts))
+        assert (kept >= 1).all() and (kept <= counts).all()
+        efficiency[method] = info["d_efficiency"]
+        if method == "design":
+            # Replicates beyond the first follow each point's share of the spare rows
+            share = (counts - 1) / (counts - 1).sum() * (120 - len(levels))
+            assert np.abs(kept - 1 - share).max() < 1.0
+    assert efficiency["d_optimal"] >= efficiency["design"]
+
+
+@pytest.mark.parametrize("coding", ["effect", "reference"])
+def test_blocked_categorical_fit_matches_statsmodels_type3(coding):
+    import statsmodels.formula.api as smf
+    from statsmodels.stats.anova import anova_lm
+    from DoeAnalysis.categorical import blocked_fit, categorical_term_table, type3_tests
+    from DoeAnalysis.regression import create_rsm_terms
+
+    rng = np.random.default_rng(4)
+    n = 300
+    df = pd.DataFrame({
+        "x1": rng.normal(size=n),
+        "x2": rng.normal(size=n),
+        "Part": rng.choice(["Bucket", "Kickstand", "Lid"], n),
+        "Lot No": rng.integers(0, 25, n).astype(str)
+    })
+    df["y"] = df["x1"] + 0.8 * (df["Part"] == "Lid") * df["x2"] + rng.normal(size=n)
+    df["z"] = rng.normal(size=n)
+    categorical = ["Part", "Lot No"]
+    table = categorical_term_table(categorical, ["x1", "x2"], coding, {"Part": 3, "Lot No": 25})
+    # The 25-level lot enters as a main effect only
+    assert [t for t in table if "Lot" in t] == [f"C(Q('Lot No'), {'Sum' if coding == 'effect' else 'Treatment'})"]
+    terms = create_rsm_terms(["x1", "x2"]) + list(table)
+
+    fit = blocked_fit(df, terms, categorical, ["x1", "x2"], ["y", "z"], coding)
+    tests = type3_tests(fit)
+    for k, y in enumerate(["y", "z"]):
+        model = smf.ols(f"{y} ~ " + " + ".join(terms), data=df).fit()
+        np.testing.assert_allclose(fit["coefficients"][:, k], model.params[fit["columns"]], atol=1e-10)
+        expected = anova_lm(model, typ=3).loc[tests["terms"]]
+        np.testing.assert_allclose(tests["df"], expected["df"])
+        np.testing.assert_allclose(tests["F"][:, k], expected["F"], rtol=1e-8)
+        np.testing.assert_allclose(tests["p_values"][:, k], expected["PR(>F)"], rtol=1e-6, atol=1e-300)
+
+
+def test_boxcox_grid_matches_per_lambda_refits():
+    import statsmodels.formula.api as smf
+    from DoeAnalysis.regression import shared_design_fit
+    from DoeAnalysis.transforms import boxcox_search
+
+    rng = np.random.default_rng(8)
+    n = 120
+    df = pd.DataFrame({"a": rng.choice([-1.0, 0.0, 1.0], n), "b": rng.choice([-1.0, 0.0, 1.0], n)})
+    df["skewed"] = np.exp(1.0 + 0.6 * df["a"] - 0.3 * df["b"] + rng.normal(0, 0.2, n))
+    df["flat"] = 50 + df["a"] + rng.normal(0, 0.5, n)
+    df["signed"] = df["a"] + rng.normal(0, 1, n)
+    terms = ["a", "b", "a:b"]
+    fit = shared_design_fit(df, terms, ["skewed", "flat", "signed"])
+    lambdas = [-1.0, -0.5, 0.0, 0.3, 0.5, 1.0, 1.5]
+    reports = boxcox_search(fit, lambdas)
+
+    assert "error" in reports["signed"]
+    assert reports["skewed"]["transform"] == "log"
+    assert reports["flat"]["transform"] == "none"
+
+    y = df["skewed"].to_numpy()
+    g = np.exp(np.log(y).mean())
+    for lam, log_likelihood in zip(lambdas, reports["skewed"]["log_likelihood"]):
+        z = g * np.log(y) if lam == 0 else (y ** lam - 1) / (lam * g ** (lam - 1))
+        sse = smf.ols("z ~ " + " + ".join(terms), data=df.assign(z=z)).fit().ssr
+        assert log_likelihood == pytest.approx(-0.5 * n * np.log(sse / n), rel=1e-9)
+
+    refit = smf.ols("np.log(skewed) ~ " + " + ".join(terms), data=df).fit()
+    np.testing.assert_allclose(reports["skewed"]["predicted_values"], np.exp(refit.fittedvalues), rtol=1e-9)
+
+
+@pytest.mark.parametrize("method", ["huber", "tukey"])
+def test_batched_irls_matches_statsmodels_rlm(method):
+    import statsmodels.api as sm
+    from DoeAnalysis.regression import shared_design_fit
+    from DoeAnalysis.robust import robust_fit
+
+    rng = np.random.default_rng(2)
+    n = 150
+    df = pd.DataFrame({"a": rng.normal(size=n), "b": rng.normal(size=n)})
+    df["y"] = 1 + df["a"] - 0.5 * df["b"] + rng.standard_t(2, n)
+    df["z"] = 2 * df["b"] + rng.normal(size=n)
+    df.loc[:5, "z"] += 15
+    fit = shared_design_fit(df, ["a", "b", "a:b"], ["y", "z"])
+    robust = robust_fit(fit, method)
+    assert robust["converged"]
+
+    norm = sm.robust.norms.HuberT() if method == "huber" else sm.robust.norms.TukeyBiweight()
+    for k in range(2):
+        expected = sm.RLM(fit["Y"][:, k], fit["X"], M=norm).fit(tol=1e-12, maxiter=200)
+        np.testing.assert_allclose(robust["coefficients"][:, k], expected.params, atol=1e-6)
+        np.testing.assert_allclose(robust["std_errors"][:, k], expected.bse, rtol=1e-6)
+        assert robust["scale"][k] == pytest.approx(expected.scale, rel=1e-6)
+    # The planted outliers are the rows the fit trusts least
+    assert set(np.argsort(robust["weights"][:, 1])[:6]) == set(range(6))
+
+
+def test_admission_downgrades_then_rejects():
+    from DoeAnalysis.admission import plan_admission
+
+    limits = {"seconds": 5.0, "memory_mb": 1024.0, "payload_mb": 4.0}
+    plan = plan_admission(2000, 4, 2, 15, settings=30, limits=limits)
+    assert plan["decision"] == "accept"
+
+    plan = plan_admission(20000, 4, 2, 15, settings=30, limits=limits)
+    assert plan["decision"] == "downgrade"
+    assert plan["options"]["residual_detail"] == "summary" and not plan["options"]["collapse"]
+
+    plan = plan_admission(400000, 4, 2, 15, settings=30, limits=limits)
+    assert plan["options"]["collapse"]
+    assert plan["estimate"]["seconds"] < 1
+
+    # Fewer settings than candidate parameters: the collapsed fit is not estimable, so screen instead
+    plan = plan_admission(40000, 15, 2, 136, settings=100, limits=dict(limits, seconds=2.0))
+    assert not plan["options"]["collapse"] and plan["options"]["max_terms"] is not None
+
+    plan = plan_admission(400000, 4, 2, 15, settings=30, collapsible=False, limits=limits)
+    assert plan["decision"] == "reject" and "time" in plan["reason"]
+    plan = plan_admission(20000, 4, 2, 15, allow_downgrade=False, limits=limits)
+    assert plan["decision"] == "reject" and "payload" in plan["reason"]
+
+
+def test_collapsed_analysis_matches_full_fit():
+    from DoeAnalysis import perform_collapsed_analysis
+
+    rng = np.random.default_rng(4)
+    levels = np.array([-1.0, 0.0, 1.0])
+    settings = pd.DataFrame([(a, b, c) for a in levels for b in levels for c in levels], columns=["a", "b", "c"])
+    df = settings.loc[np.repeat(settings.index, 12)].reset_index(drop=True)
+    df["y"] = 5 + 2 * df["a"] - df["b"] + 1.5 * df["a"] * df["c"] + df["b"] ** 2 + rng.normal(0, 0.5, len(df))
+    df["z"] = 1 + df["c"] + rng.normal(0, 0.3, len(df))
+
+    full = perform_doe_analysis(df, ["y", "z"], ["a", "b", "c"], 1.3, 2)
+    collapsed = perform_collapsed_analysis(df, ["y", "z"], ["a", "b", "c"], 1.3, 2)
+    assert collapsed["summary"]["model_selection"] == {"method": "collapsed", "settings": 27}
+    assert collapsed["summary"]["simplified_factors"] == full["summary"]["simplified_factors"]
+    for y in ("y", "z"):
+        for term, row in full["models"][y]["coded_parameters"].items():
+            assert collapsed["models"][y]["coded_parameters"][term]["coefficient"] == pytest.approx(row["coefficient"], abs=1e-9)
+        assert collapsed["models"][y]["summary_of_fit"]["r_squared"] == pytest.approx(
+            full["models"][y]["summary_of_fit"]["r_squared"], rel=1e-9)
+
+
+def test_missing_values_share_one_mask_per_policy(screening_frame):
+    import statsmodels.formula.api as smf
+
+    df = screening_frame[["x1", "x2", "x3", "y"]].copy()
+    df["z"] = df["x2"] - df["x3"] + np.random.default_rng(5).normal(0, 0.3, len(df))
+    df.loc[[3, 17], "y"] = np.nan
+    df.loc[[8], "z"] = np.nan
+    df.loc[[21], "x1"] = np.nan
+
+    per = perform_doe_analysis(df, ["y", "z"], ["x1", "x2", "x3"], 1.3, 1, missing="per_response")
+    assert per["summary"]["missing_data"]["dropped_rows"] == {"y": 3, "z": 2}
+    assert per["summary"]["missing_data"]["shared_rows"] == len(df) - 4
+    for y in ("y", "z"):
+        model = per["models"][y]
+        residuals = model["residuals"]
+        assert np.allclose(np.subtract(residuals["actual_values"], residuals["predicted_values"]),
+                           residuals["raw_residuals"])
+        reference = smf.ols(f"{y} ~ x1 + x2 + x3", data=df, missing="drop").fit()
+        assert residuals["row_index"] == reference.model.data.row_labels.tolist()
+        assert model["summary_of_fit"]["observations"] == int(reference.nobs)
+
+    shared = perform_doe_analysis(df, ["y", "z"], ["x1", "x2", "x3"], 1.3, 1)
+    assert shared["summary"]["missing_data"]["dropped_rows"] == {"y": 4, "z": 4}
+    for y in ("y", "z"):
+        assert len(shared["models"][y]["residuals"]["row_index"]) == len(df) - 4
+        assert "leverage" in shared["models"][y]["residuals"]
+
+
+def test_uncoded_estimates_match_raw_unit_fit():
+    import statsmodels.formula.api as smf
+
+    from DoeAnalysis import get_simplified_factors
+    from DoeAnalysis.regression import model_term_table
+
+    rng = np.random.default_rng(6)
+    n = 120
+    df = pd.DataFrame({
+        "dye 1": rng.uniform(0.5, 2.5, n), "Temp": rng.uniform(60, 90, n), "Time": rng.uniform(10, 40, n),
+        "pH": rng.uniform(4, 8, n), "Speed": rng.uniform(100, 300, n), "Shade": rng.choice(["dark", "light", "mid"], n)
+    })
+    shade = df["Shade"].map({"dark": 1.0, "light": -1.0, "mid": 0.0})
+    df["y"] = (3 + 2 * df["dye 1"] + 0.05 * df["Temp"] + 3 * df["dye 1"] ** 2 + 0.2 * df["dye 1"] * df["Temp"]
+               + 0.1 * df["Time"] + shade * (1 + 0.1 * df["Temp"]) + rng.normal(0, 0.1, n))
+    predictors = ["dye 1", "Temp", "Time", "pH", "Speed", "Shade"]
+
+    result = perform_doe_analysis(df, ["y"], predictors, 1.3, 1, model_selection="threshold")
+    terms = result["summary"]["simplified_factors"]
+    assert {"I(Q('dye 1') ** 2)", "Q('dye 1'):Temp", "C(Shade, Sum):Temp"} <= set(terms)
+
+    reference = smf.ols("y ~ " + " + ".join(terms), data=df).fit()
+    uncoded = {row["term"]: row for row in result["models"]["y"]["uncoded_parameters"]}
+    assert len(uncoded) == len(reference.params)
+    for term, estimate in reference.params.items():
+        assert uncoded[term]["estimate"] == pytest.approx(estimate, rel=1e-6, abs=1e-9)
+        assert uncoded[term]["std_error"] == pytest.approx(reference.bse[term], rel=1e-6)
+
+    table = model_term_table(["a b", "c"])
+    effects = pd.DataFrame({"Factor": ["I(Q('a b') ** 2)", "Q('a b'):c"], "Max_LogWorth": [3.0, 2.0],
+                            "Appears_Significant": [1, 1]})
+    assert get_simplified_factors(effects, 1.3, 1, table) == sorted(["I(Q('a b') ** 2)", "Q('a b')", "Q('a b'):c", "c"])